@@ -1,10 +1,393 @@
-from typing import Iterable, Dict, Any
-from engine.schemas import TradeDecision, NoTrade
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Dict, Any, Iterator, Mapping, Optional, Union
+import numpy as np
+from connectors.sim_broker import SimBroker
+from engine.schemas import TradeDecisionEvent, NoTradeEvent
+from engine.indicators import (ATR, atr, calc_cpr, calc_vwap, session_starts,
+                               session_vwap, session_hlc)
+from engine import signal_cpr_vwap, signal_oi_momentum
+from engine.signal_cpr_vwap import detect as sig_cpr, detect_batch as sig_cpr_batch
+from engine.signal_oi_momentum import detect as sig_oi, detect_batch as sig_oi_batch
+from engine.position_sizer import lots_for_risk, lots_for_risk_batch
+from risk.risk_guard import (check_time_guards, pretrade_blockers,
+                             check_time_guards_batch, pretrade_blockers_batch)
+from utils.instruments import IST, get_instrument
 from utils.logger import log
 
-def run_backtest(bars: Iterable[Dict[str, Any]], cfg: Dict[str, Any]) -> None:
-    # TODO: implement reuse of signal/risk logic; keep same output contract
-    for bar in bars:
-        # produce NoTrade for now
-        nt = NoTrade(reason="backtest_stub", timestamp=bar["ts"], backtest=True).dict()
-        log.info("no_trade", extra={"_extra": nt})
+# Columns understood by the engine. ts is epoch seconds (UTC); sessions are IST days.
+# Optional: "oi_trend" (str labels as in the live option-chain snapshot) and
+# "day_pnl_pct" (per-bar running day PnL used for the loss block; 0.0 if absent).
+BAR_COLUMNS = ("ts", "open", "high", "low", "close", "volume", "oi")
+_IST_OFFSET = 5 * 3600 + 30 * 60
+_DAY = 86400
+
+Bars = Union[Iterable[Dict[str, Any]], Mapping[str, np.ndarray]]
+
+
+def _to_epoch(v: Any) -> float:
+    if isinstance(v, str):
+        v = datetime.fromisoformat(v)
+    if isinstance(v, datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=IST)
+        return v.timestamp()
+    return float(v)
+
+
+def to_columns(bars: Bars) -> Dict[str, np.ndarray]:
+    """Normalize row dicts or a mapping of sequences into float64/str NumPy columns."""
+    if isinstance(bars, Mapping):
+        cols = {k: np.asarray(v) for k, v in bars.items()}
+    else:
+        rows = list(bars)
+        keys = rows[0].keys() if rows else BAR_COLUMNS
+        cols = {k: np.asarray([r.get(k) for r in rows]) for k in keys}
+    if cols["ts"].dtype.kind not in "iuf":
+        cols["ts"] = np.fromiter((_to_epoch(v) for v in cols["ts"]), dtype=np.float64,
+                                 count=len(cols["ts"]))
+    for k in BAR_COLUMNS:
+        if k in cols:
+            cols[k] = cols[k].astype(np.float64, copy=False)
+    if "oi_trend" in cols:
+        cols["oi_trend"] = cols["oi_trend"].astype(str)
+    return cols
+
+
+def _oi_lookback(cfg: Dict[str, Any]) -> int:
+    return max(1, 5 // int(cfg.get("bar_minutes", 1)))
+
+
+def oi_trend_labels(oi: np.ndarray, min_oi_delta_pct: float,
+                    lookback: int) -> np.ndarray:
+    """
+    Derive the snapshot-style `oi_trend` label from a bar OI column:
+    OI falling by >= min_oi_delta_pct over `lookback` bars -> "CE_unwind".
+    """
+    prev = (np.r_[np.full(lookback, np.nan), oi[:-lookback]] if len(oi) > lookback
+            else np.full(len(oi), np.nan))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chg = (oi - prev) / prev * 100.0
+    return np.where(chg <= -min_oi_delta_pct, "CE_unwind", "flat")
+
+
+def _oi_trend_at(oi: np.ndarray, i: int, min_oi_delta_pct: float, lookback: int) -> str:
+    if i < lookback or not oi[i - lookback]:
+        return "flat"
+    chg = (oi[i] - oi[i - lookback]) / oi[i - lookback] * 100.0
+    return "CE_unwind" if chg <= -min_oi_delta_pct else "flat"
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(IST).isoformat()
+
+
+@dataclass
+class BacktestResult:
+    """Per-bar outcome arrays. reason is None where a TradeDecision was produced."""
+    index: str
+    ts: np.ndarray
+    ltp: np.ndarray
+    reason: np.ndarray
+    lots: np.ndarray
+    stop_pts: np.ndarray
+    strength: np.ndarray
+    vwap: np.ndarray
+    tc: np.ndarray
+    oi_trend: np.ndarray
+    broker: str
+    params: Dict[str, Any]
+
+    @property
+    def trade_mask(self) -> np.ndarray:
+        return np.equal(self.reason, None)
+
+    def reason_counts(self) -> Dict[str, int]:
+        r = self.reason[~self.trade_mask].astype(str)
+        keys, counts = np.unique(r, return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    def decisions(self, include_no_trade: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Materialize the live output contract lazily (TradeDecision / NoTrade dicts).
+        """
+        idx = (range(len(self.ts)) if include_no_trade
+               else np.flatnonzero(self.trade_mask))
+        for i in idx:
+            ts = _iso(self.ts[i])
+            if self.reason[i] is not None:
+                yield {"no_trade": NoTradeEvent(self.reason[i], ts,
+                                                backtest=True).as_dict()}
+                continue
+            ltp, stop_pts = float(self.ltp[i]), float(self.stop_pts[i])
+            signals = self.params.get("signals", {})
+            s1 = sig_oi(self.index, {"oi_trend": str(self.oi_trend[i])},
+                        signals.get("oi_momentum", {}))
+            s2 = sig_cpr(self.index, ltp, float(self.vwap[i]),
+                         {"tc": float(self.tc[i])}, signals.get("cpr_vwap", {}))
+            td = TradeDecisionEvent(
+                index=self.index, action="BUY_CE", strike=int(round(ltp / 50) * 50),
+                option_type="CE", expiry="2099-12-31", entry_type="LIMIT", entry=ltp,
+                stop_loss=ltp - stop_pts, tsl=f"ATR({_tsl(self.params)[0]})x",
+                target=None, r_multiple=1.5, lots=int(self.lots[i]),
+                confidence_pct=min(int(self.strength[i]), 95),
+                signal_stack=[f"oi_momentum:{s1['explain']}",
+                              f"cpr_vwap:{s2['explain']}"], risk_check="passed",
+                broker=self.broker, reason="Confluence: OI momentum + CPR/VWAP",
+                timestamp=ts, backtest=True,
+            ).as_dict()
+            yield {"trade_decision": td}
+
+
+def _params(cfg: Dict[str, Any]):
+    signals = cfg.get("signals", {})
+    return (signals.get("oi_momentum", {}), signals.get("cpr_vwap", {}),
+            float(cfg.get("capital", 17000)),
+            cfg.get("execution", {}).get("primary_broker", "angel_one"))
+
+
+def _tsl(cfg: Dict[str, Any]):
+    tsl = cfg.get("tsl", {})
+    return float(tsl.get("atr_multiple", 1.5)), int(tsl.get("atr_period", 14))
+
+
+def simulate(bars: Bars, cfg: Dict[str, Any], index: str = "NIFTY50") -> BacktestResult:
+    """
+    Vectorized replay of the run_intraday decision path over columnar bars.
+    `cfg` is risk.yml merged with strategy.yml (plus optional `capital`, `bar_minutes`).
+    """
+    c = to_columns(bars)
+    ts, close = c["ts"], c["close"]
+    n = len(ts)
+    if n == 0:
+        return simulate_reference(c, cfg, index)
+    oi_p, cpr_p, capital, broker = _params(cfg)
+
+    local = ts + _IST_OFFSET
+    day = np.floor_divide(local, _DAY).astype(np.int64)
+    sod = local - day * _DAY
+    starts = session_starts(day)
+    sess = np.cumsum(np.r_[False, day[1:] != day[:-1]])
+
+    # CPR from previous session HLC; first session has none
+    ph, pl, pc = session_hlc(c["high"], c["low"], close, starts)
+    bc, pivot, tc = calc_cpr(np.r_[np.nan, ph[:-1]], np.r_[np.nan, pl[:-1]],
+                             np.r_[np.nan, pc[:-1]])
+    has_prev = sess > 0
+    vwap = session_vwap(close, c["volume"], starts)
+
+    if "oi_trend" in c:
+        trend = c["oi_trend"]
+    else:
+        trend = oi_trend_labels(c["oi"], float(oi_p.get("min_oi_delta_5m_pct", 5.0)),
+                                _oi_lookback(cfg))
+    long_ = sig_oi_batch(trend, oi_p) & sig_cpr_batch(close, vwap, tc[sess], cpr_p)
+
+    mult, period = _tsl(cfg)
+    stop_pts = mult * atr(c["high"], c["low"], close, period)   # NaN during ATR warm-up
+    lots, _ = lots_for_risk_batch(index, capital, cfg["per_trade_risk_pct"], stop_pts,
+                                  1.0)
+
+    # Reasons, applied lowest-precedence first (mirrors the live loop's order)
+    reason = np.full(n, None, dtype=object)
+    reason[long_ & (lots < 1)] = "under_min_size"
+    reason[long_ & np.isnan(stop_pts)] = "atr_warmup"
+    reason[~long_] = "mixed_signals"
+    reason[~has_prev] = "no_prev_session"
+    day_pnl = c["day_pnl_pct"] if "day_pnl_pct" in c else np.zeros(n)
+    blk = pretrade_blockers_batch(day_pnl, cfg, {"open_positions": 0})
+    reason = np.where(np.equal(blk, None), reason, blk)
+    tg = check_time_guards_batch(sod, cfg)
+    reason = np.where(np.equal(tg, None), reason, tg)
+
+    strength = np.where(long_, int((signal_oi_momentum.STRENGTH
+                                    + signal_cpr_vwap.STRENGTH) / 2), 0)
+    return BacktestResult(index=index, ts=ts, ltp=close, reason=reason, lots=lots,
+                          stop_pts=stop_pts, strength=strength, vwap=vwap, tc=tc[sess],
+                          oi_trend=trend, broker=broker, params=cfg)
+
+
+def simulate_reference(bars: Bars, cfg: Dict[str, Any],
+                       index: str = "NIFTY50") -> BacktestResult:
+    """
+    Bar-by-bar reference using the scalar live functions; used to check simulate()
+    parity.
+    """
+    c = to_columns(bars)
+    ts, close, vol, oi = c["ts"], c["close"], c["volume"], c["oi"]
+    n = len(ts)
+    oi_p, cpr_p, capital, broker = _params(cfg)
+    min_delta, lookback = float(oi_p.get("min_oi_delta_5m_pct", 5.0)), _oi_lookback(cfg)
+    mult, period = _tsl(cfg)
+    atr_s = ATR(period)
+    reason = np.full(n, None, dtype=object)
+    lots_a = np.zeros(n, dtype=np.int64)
+    stop_a = np.zeros(n)
+    strength_a = np.zeros(n, dtype=np.int64)
+    vwap_a = np.full(n, np.nan)
+    tc_a = np.full(n, np.nan)
+    trend_a = np.full(n, "flat", dtype=object)
+
+    cur_day, prev_hlc, hlc = None, None, None
+    prices, volumes = [], []
+    for i in range(n):
+        now = datetime.fromtimestamp(ts[i], tz=timezone.utc).astimezone(IST)
+        day = now.date()
+        if day != cur_day:
+            prev_hlc, cur_day = hlc, day
+            hlc = [c["high"][i], c["low"][i], close[i]]
+            prices, volumes = [], []
+        else:
+            hlc = [max(hlc[0], c["high"][i]), min(hlc[1], c["low"][i]), close[i]]
+        ltp = float(close[i])
+        prices.append(ltp)
+        volumes.append(float(vol[i]))
+        a = atr_s.update(float(c["high"][i]), float(c["low"][i]), ltp)
+        stop_a[i] = mult * a if a is not None else np.nan
+        lots_a[i] = lots_for_risk(index, capital, cfg["per_trade_risk_pct"], stop_a[i],
+                                  1.0)[0]
+
+        r = check_time_guards(now, cfg)
+        day_pnl = float(c["day_pnl_pct"][i]) if "day_pnl_pct" in c else 0.0
+        r = r or pretrade_blockers(day_pnl, cfg, {"open_positions": 0})
+        if not r and prev_hlc is None:
+            r = "no_prev_session"
+        if not r:
+            bc, pivot, tc = calc_cpr(*prev_hlc)
+            vwap = calc_vwap(prices, volumes)
+            trend = (str(c["oi_trend"][i]) if "oi_trend" in c
+                     else _oi_trend_at(oi, i, min_delta, lookback))
+            vwap_a[i], tc_a[i], trend_a[i] = vwap, tc, trend
+            s1 = sig_oi(index, {"oi_trend": trend}, oi_p)
+            s2 = sig_cpr(index, ltp, vwap, {"bc": bc, "pivot": pivot, "tc": tc}, cpr_p)
+            if s1["side"] == "LONG" and s2["side"] == "LONG":
+                strength_a[i] = int((s1["strength"] + s2["strength"]) / 2)
+                if a is None:
+                    r = "atr_warmup"
+                elif lots_a[i] < 1:
+                    r = "under_min_size"
+            else:
+                r = "mixed_signals"
+        reason[i] = r
+    return BacktestResult(index=index, ts=ts, ltp=close, reason=reason, lots=lots_a,
+                          stop_pts=stop_a, strength=strength_a, vwap=vwap_a, tc=tc_a,
+                          oi_trend=trend_a.astype(str), broker=broker, params=cfg)
+
+
+def trade_outcomes(res: BacktestResult, bars: Bars) -> Dict[str, np.ndarray]:
+    """
+    Simple fill model for scoring decisions: enter at the decision bar's close,
+    exit at the stop (entry - stop_pts) on the first later bar of the session
+    whose low touches it, else at the session's last close. With `tsl.enabled`
+    the stop trails each bar's close by that bar's stop_pts (atr_multiple x ATR)
+    from the next bar on, and is lifted to cost once a close is
+    `move_to_cost_after_r_multiple` R in profit. One position at a time; signals
+    while a position is open are skipped. PnL is in underlying points (delta-1
+    proxy for the option).
+    """
+    c = to_columns(bars)
+    low, close = c["low"], c["close"]
+    day = np.floor_divide(c["ts"] + _IST_OFFSET, _DAY).astype(np.int64)
+    starts = session_starts(day)
+    ends = np.r_[starts[1:], len(day)]
+    sess = np.cumsum(np.r_[False, day[1:] != day[:-1]]) if len(day) else day
+    tsl = res.params.get("tsl", {})
+    trail, to_cost = bool(tsl.get("enabled")), tsl.get("move_to_cost_after_r_multiple")
+    stop_pts = res.stop_pts
+    entry, exit_, pnl = [], [], []
+    busy_until = -1
+    for i in np.flatnonzero(res.trade_mask).tolist():
+        if i <= busy_until:
+            continue
+        px = close[i]
+        end = int(ends[sess[i]])
+        # stop level in force on bars i+1 .. end-1 (set at the previous bar's close)
+        if trail:
+            seen = slice(i, end - 1)
+            lvl = close[seen] - stop_pts[seen]
+            if to_cost:
+                lvl = np.where(close[seen] >= px + to_cost * stop_pts[i],
+                               np.maximum(lvl, px), lvl)
+            stops = np.maximum(px - stop_pts[i], np.maximum.accumulate(lvl))
+        else:
+            stops = np.full(end - i - 1, px - stop_pts[i])
+        hit = np.flatnonzero(low[i + 1:end] <= stops)
+        j = i + 1 + int(hit[0]) if len(hit) else end - 1
+        entry.append(i)
+        exit_.append(j)
+        pnl.append((stops[hit[0]] if len(hit) else close[j]) - px)
+        busy_until = j
+    entry_a, pnl_a = (np.asarray(entry, dtype=np.int64),
+                      np.asarray(pnl, dtype=np.float64))
+    lot = get_instrument(res.index).lot_size
+    return {"entry": entry_a, "exit": np.asarray(exit_, dtype=np.int64),
+            "pnl_pts": pnl_a, "r": pnl_a / res.stop_pts[entry_a],
+            "pnl_rupees": pnl_a * res.lots[entry_a] * lot}
+
+
+def entry_fills(res: BacktestResult, bars: Bars, entries: Optional[np.ndarray] = None,
+                broker: Optional[SimBroker] = None,
+                max_bars: int = 5) -> Dict[str, np.ndarray]:
+    """
+    Check trade_outcomes' "enter at the decision bar's close" against a SimBroker
+    book: each entry is a LIMIT buy of lots x lot size at that close, worked over
+    up to `max_bars` later bars of the session and then cancelled. Each bar is
+    replayed as four ticks (open, the nearer extreme, the other, close) that
+    share its volume, so fills are capped by traded volume and by the broker's
+    injected partials/rejections. Returns per entry the filled fraction and the
+    bars waited for the first fill (-1 = none).
+    """
+    c = to_columns(bars)
+    o, h, l, cl, v = c["open"], c["high"], c["low"], c["close"], c["volume"]
+    day = np.floor_divide(c["ts"] + _IST_OFFSET, _DAY).astype(np.int64)
+    if entries is None:
+        entries = trade_outcomes(res, bars)["entry"]
+    broker = broker or SimBroker(seed=0)
+    lot = get_instrument(res.index).lot_size
+    sym = res.index
+    frac = np.zeros(len(entries))
+    wait = np.full(len(entries), -1, dtype=np.int64)
+    cum = 0.0
+    for k, i in enumerate(np.asarray(entries, dtype=np.int64).tolist()):
+        broker.on_tick(sym, float(cl[i]), float(c["ts"][i]), cum)
+        qty = int(res.lots[i]) * lot
+        ack = broker.place_order(sym, "BUY", qty, float(cl[i]), "LIMIT")
+        if ack["status"] != "acknowledged":
+            continue
+        oid = ack["order_id"]
+        for j in range(i + 1, min(i + 1 + max_bars, len(cl))):
+            if day[j] != day[i]:
+                break
+            path = ((o[j], l[j], h[j], cl[j]) if abs(o[j] - l[j]) <= abs(h[j] - o[j])
+                    else (o[j], h[j], l[j], cl[j]))
+            for px in path:
+                cum += float(v[j]) / 4.0
+                broker.on_tick(sym, float(px), float(c["ts"][j]), cum)
+            filled = broker.order(oid)["filled_qty"]
+            if filled and wait[k] < 0:
+                wait[k] = j - i
+            if filled >= qty:
+                break
+        st = broker.order(oid)
+        frac[k] = st["filled_qty"] / qty if qty else 0.0
+        if st["status"] == "open":
+            broker.cancel_order(oid)
+    return {"entry": np.asarray(entries, dtype=np.int64), "filled_frac": frac,
+            "bars_to_fill": wait}
+
+
+def run_backtest(bars: Bars, cfg: Dict[str, Any], index: str = "NIFTY50",
+                 emit_no_trade: bool = False) -> BacktestResult:
+    """
+    Run the vectorized engine and log results with the live output contract.
+    Trade decisions are always logged; per-bar NoTrade records only when
+    emit_no_trade=True (a year of 1m bars is ~90k records per index).
+    """
+    res = simulate(bars, cfg, index)
+    for ev in res.decisions(include_no_trade=emit_no_trade):
+        log.info("trade_decision" if "trade_decision" in ev else "no_trade",
+                 extra={"_extra": ev})
+    log.info("backtest_summary", extra={"_extra": {"backtest_summary": {
+        "index": index, "bars": int(len(res.ts)), "trades": int(res.trade_mask.sum()),
+        "no_trade": res.reason_counts()}}})
+    return res
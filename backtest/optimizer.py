@@ -0,0 +1,228 @@
+# backtest/optimizer.py
+"""
+Parameter sweep / walk-forward optimizer over backtest_engine.simulate.
+
+    python -m backtest.optimizer config/optimize.yml
+
+Bars are written once as per-column .npy files and every worker process opens
+them with mmap_mode="r", so nothing but parameter dicts and metric dicts is
+pickled between processes.
+"""
+import copy
+import csv
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import yaml
+from backtest.backtest_engine import BAR_COLUMNS, simulate, trade_outcomes, to_columns
+from utils.logger import log
+
+_IST_OFFSET = 5 * 3600 + 30 * 60
+_BARS: Dict[str, np.ndarray] = {}   # per-worker memory-mapped columns
+
+
+# -- parameter space ------------------------------------------------------------------
+
+
+def set_path(cfg: Dict[str, Any], dotted: str, value: Any) -> None:
+    """cfg["a"]["b"]["c"] = value for dotted="a.b.c" (creates missing levels)."""
+    keys = dotted.split(".")
+    node = cfg
+    for k in keys[:-1]:
+        node = node.setdefault(k, {})
+    node[keys[-1]] = value
+
+
+def expand(params: Dict[str, List[Any]], search: str = "grid", samples: int = 100,
+           seed: int = 0) -> List[Dict[str, Any]]:
+    """Grid product of all value lists, or `samples` random draws from it."""
+    keys = list(params)
+    if search == "grid":
+        return [dict(zip(keys, vals))
+                for vals in itertools.product(*(params[k] for k in keys))]
+    rng = random.Random(seed)
+    return [{k: rng.choice(params[k]) for k in keys} for _ in range(samples)]
+
+
+# -- shared bar data -------------------------------------------------------------------
+
+
+def share_bars(bars: Dict[str, np.ndarray], path: str) -> str:
+    """Persist columns as .npy files for memory-mapped access from workers."""
+    os.makedirs(path, exist_ok=True)
+    for k, v in to_columns(bars).items():
+        if k in BAR_COLUMNS or k in ("oi_trend", "day_pnl_pct"):
+            np.save(os.path.join(path, f"{k}.npy"), v)
+    return path
+
+
+def load_bars(path: str) -> Dict[str, np.ndarray]:
+    if os.path.isdir(path):
+        return {f[:-4]: np.load(os.path.join(path, f), mmap_mode="r")
+                for f in os.listdir(path) if f.endswith(".npy")}
+    with np.load(path) as z:   # .npz
+        return {k: z[k] for k in z.files}
+
+
+def _init_worker(path: str) -> None:
+    _BARS.clear()
+    _BARS.update(load_bars(path))
+
+
+def session_bounds(ts: np.ndarray) -> np.ndarray:
+    """Start index of every IST session plus len(ts) as the final bound."""
+    day = np.floor_divide(ts + _IST_OFFSET, 86400).astype(np.int64)
+    return np.r_[np.flatnonzero(np.r_[True, day[1:] != day[:-1]]), len(ts)]
+
+
+Window = Tuple[int, int, int]   # (warm-up start, scored start, end) bar indices
+
+
+def walk_forward(bounds: np.ndarray, train_days: int,
+                 test_days: int) -> List[Tuple[Window, Window]]:
+    """
+    Session-aligned (train, test) windows rolling forward by `test_days`. Each
+    window starts one session early so CPR is defined on its first scored bar.
+    """
+    n_sess = len(bounds) - 1
+    folds = []
+    s = 1
+
+    def b(k: int) -> int:
+        return int(bounds[k])
+
+    while s + train_days + test_days <= n_sess:
+        folds.append(((b(s - 1), b(s), b(s + train_days)),
+                      (b(s + train_days - 1), b(s + train_days),
+                       b(s + train_days + test_days))))
+        s += test_days
+    return folds
+
+
+# -- evaluation ------------------------------------------------------------------------
+
+
+def metrics(out: Dict[str, np.ndarray]) -> Dict[str, float]:
+    r = out["r"]
+    eq = np.cumsum(r)
+    dd = (float(np.max(np.maximum.accumulate(np.r_[0.0, eq])[1:] - eq)) if len(r)
+          else 0.0)
+    return {"trades": int(len(r)), "total_r": float(r.sum()),
+            "avg_r": float(r.mean()) if len(r) else 0.0,
+            "win_rate": float((r > 0).mean()) if len(r) else 0.0, "max_dd_r": dd,
+            "pnl_rupees": float(out["pnl_rupees"].sum())}
+
+
+def evaluate(base_cfg: Dict[str, Any], params: Dict[str, Any], window: Window,
+             index: str) -> Dict[str, float]:
+    """
+    Backtest one parameter set on one window of the shared bars; runs inside a worker.
+    """
+    cfg = copy.deepcopy(base_cfg)
+    for k, v in params.items():
+        set_path(cfg, k, v)
+    warm, a, b = window
+    cols = {k: v[warm:b] for k, v in _BARS.items()}   # memmap views, no copy
+    res = simulate(cols, cfg, index)
+    res.reason[:a - warm] = "warmup"
+    return metrics(trade_outcomes(res, cols))
+
+
+def _run(args: Tuple[Dict[str, Any], Dict[str, Any], Window, str]) -> Dict[str, float]:
+    return evaluate(*args)
+
+
+# -- driver ----------------------------------------------------------------------------
+
+
+def rank(train_m: List[Dict[str, float]], objective: str, min_trades: int) -> List[int]:
+    """
+    Indices best-first by `objective`; sets with fewer than `min_trades` training trades
+    rank after every eligible one (a 2-trade 100% win rate is noise, not an optimum).
+    """
+    return sorted(range(len(train_m)),
+                  key=lambda i: (train_m[i]["trades"] >= min_trades,
+                                 train_m[i][objective]), reverse=True)
+
+
+def optimize(spec: Dict[str, Any], base_cfg: Dict[str, Any],
+             workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    index = spec.get("index", "NIFTY50")
+    combos = expand(spec["params"], spec.get("search", "grid"),
+                    int(spec.get("samples", 100)), int(spec.get("seed", 0)))
+    objective = spec.get("objective", "total_r")
+    min_trades = int(spec.get("min_trades", 30))
+    src = spec["bars"]
+    tmp = None
+    rows: List[Dict[str, Any]] = []
+    try:
+        if not os.path.isdir(src):
+            tmp = tempfile.mkdtemp(prefix="kp5-bars-")
+            src = share_bars(load_bars(src), tmp)
+        ts = np.load(os.path.join(src, "ts.npy"), mmap_mode="r")
+        bounds = session_bounds(np.asarray(ts))
+        wf = spec.get("walk_forward")
+        folds = (walk_forward(bounds, int(wf["train_days"]), int(wf["test_days"])) if wf
+                 else [((0, int(bounds[1]) if len(bounds) > 2 else 0, len(ts)), None)])
+
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(src,)) as pool:
+            for f, (train, test) in enumerate(folds):
+                jobs = [(base_cfg, p, train, index) for p in combos]
+                chunk = max(1, len(jobs) // (4 * (workers or os.cpu_count())))
+                train_m = list(pool.map(_run, jobs, chunksize=chunk))
+                ranked = rank(train_m, objective, min_trades)
+                best = ranked[0] if train_m[ranked[0]]["trades"] >= min_trades else None
+                if best is None:
+                    log.info("optimizer_no_eligible_params", extra={"_extra": {
+                        "fold": f, "min_trades": min_trades,
+                        "max_trades": max(m["trades"] for m in train_m)}})
+                test_m = (pool.submit(_run, (base_cfg, combos[best], test, index))
+                          .result()
+                          if test and best is not None else None)
+                for r, i in enumerate(ranked, 1):
+                    row = {"fold": f, "rank": r,
+                           "eligible": train_m[i]["trades"] >= min_trades,
+                           **{f"param:{k}": v for k, v in combos[i].items()},
+                           **{f"train:{k}": v for k, v in train_m[i].items()}}
+                    if i == best and test_m:
+                        row.update({f"test:{k}": v for k, v in test_m.items()})
+                    rows.append(row)
+        elapsed = round(time.perf_counter() - t0, 2)
+        log.info("optimizer_done", extra={"_extra": {
+            "combos": len(combos), "folds": len(folds), "seconds": elapsed}})
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return rows
+
+
+def write_table(rows: List[Dict[str, Any]], path: str) -> None:
+    keys: List[str] = []
+    for r in rows:
+        keys += [k for k in r if k not in keys]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=keys)
+        w.writeheader()
+        w.writerows(rows)
+
+
+def _load_yaml(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+if __name__ == "__main__":
+    spec = _load_yaml(sys.argv[1] if len(sys.argv) > 1 else "config/optimize.yml")
+    base = {**_load_yaml("config/risk.yml"), **_load_yaml("config/strategy.yml"),
+            **spec.get("base", {})}
+    rows = optimize(spec, base, spec.get("workers"))
+    write_table(rows, spec.get("output", "optimizer_results.csv"))
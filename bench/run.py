@@ -0,0 +1,429 @@
+# bench/run.py
+"""
+Hot-path benchmark suite with JSON baselines and a regression gate.
+
+    python -m bench.run                          # run, compare with baseline if present
+    python -m bench.run --save                   # run and (re)write the baseline
+    python -m bench.run --only detect,schema     # substring filter
+    python -m bench.run --size large --threshold 0.15
+
+Every case reports ops/s plus per-call p50/p99/mean (us). Each run also times
+a fixed pure-Python `calibration` case, and the gate compares every p50 as a
+multiple of that run's calibration p50, so a slower or busier host moves both
+sides of the ratio. It exits 1 when a case's ratio is more than `--threshold`
+(fraction) above the baseline's. Cases under MIN_GATE_US in the baseline are
+reported but not gated: at that scale timer resolution and cache state swamp
+the code under test. Every case runs ROUNDS times and keeps its fastest round,
+so a burst of load on a shared runner has to last the whole case to count.
+Baselines are best recorded per host (default
+bench/baselines/<hostname>.json) on an idle machine.
+
+CI gates on the committed bench/baselines/ci.json with --threshold 1.0, so only
+a 2x normalized slowdown fails the build. Re-record it with --save when a
+change is knowingly slower.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+from bench.synthetic import SPOTS, StaticChainProvider, SyntheticFeed, SyntheticMarket
+from utils.latency import Histogram, Latency
+from utils.logger import log
+
+SIZES = {"small": 1, "medium": 4, "large": 16}
+CALIBRATION = "calibration"
+MIN_GATE_US = 1.0
+ROUNDS = 3
+TS = "2024-09-02T10:00:00+05:30"
+
+
+def _quiet_logs() -> None:
+    """Keep JSON formatting on the measured path but send output nowhere."""
+    for h in log.handlers:
+        if (isinstance(h, logging.StreamHandler)
+                and h.stream in (sys.stdout, sys.stderr)):
+            h.setStream(open(os.devnull, "w"))
+
+
+def measure(fn: Callable[[], Any], n: int, warmup: int = 100,
+            per_call_ops: int = 1) -> Dict[str, float]:
+    """Time n calls one by one; `per_call_ops` scales ops/s for batch kernels."""
+    for _ in range(min(warmup, n)):
+        fn()
+    h = Histogram()
+    clock = time.perf_counter_ns
+    t_start = clock()
+    for _ in range(n):
+        t0 = clock()
+        fn()
+        h.record(clock() - t0)
+    wall = (clock() - t_start) / 1e9
+    return _stats(h, n * per_call_ops / wall)
+
+
+def best_of(run_once: Callable[[], Dict[str, float]],
+            rounds: int = ROUNDS) -> Dict[str, float]:
+    """The round with the lowest p50 (interference only ever adds time)."""
+    return min((run_once() for _ in range(rounds)), key=lambda r: r["p50_us"])
+
+
+def _stats(h: Histogram, ops_per_s: float) -> Dict[str, float]:
+    s = h.summary()
+    return {"ops_per_s": round(ops_per_s, 1), "p50_us": s["p50_us"],
+            "p99_us": s["p99_us"], "mean_us": s["mean_us"], "n": h.count}
+
+
+# -- cases -----------------------------------------------------------------------------
+
+
+def calibration() -> Callable[[], Any]:
+    """Fixed dict build + sort: tracks interpreter speed, touches no repo code."""
+    data = [((k * 7919) % 1009) / 7.0 for k in range(500)]
+
+    def work() -> List[float]:
+        d = {k: v for k, v in enumerate(data)}
+        return sorted(d.values())
+    return work
+
+
+def micro_cases(m: SyntheticMarket,
+                scale: int) -> Dict[str, Tuple[Callable[[], Any], int, int]]:
+    """name -> (fn, calls, ops per call)."""
+    from engine.indicators import (ATR, RunningVWAP, SuperTrend, atr, calc_cpr,
+                                   calc_vwap, session_hlc, session_starts, session_vwap,
+                                   supertrend)
+    from engine.signal_cpr_vwap import detect as sig_cpr
+    from engine.signal_oi_momentum import detect as sig_oi
+    from engine.position_sizer import lots_for_risk
+    from engine.schemas import NoTradeEvent, TradeDecision, TradeDecisionEvent
+    from engine.greeks import chain_greeks
+    from risk.audit import emit_audit_snapshot
+    from marketdata.sentiment_news import get_breadth
+    from marketdata.oi_store import OIStore
+    from risk.risk_engine import RiskEngine
+    from risk.position_book import PositionBook
+    from connectors.sim_broker import SimBroker
+
+    bars = m.bars(20 * scale)
+    day = np.floor_divide(bars["ts"] + 19800, 86400)
+    starts = session_starts(day)
+    px, vol = bars["close"], bars["volume"]
+    px_l, vol_l = px[:375].tolist(), vol[:375].tolist()
+    rv = RunningVWAP()
+    atr_s, st_s = ATR(14), SuperTrend(10, 3.0)
+    for h, l, c in zip(bars["high"][:50].tolist(), bars["low"][:50].tolist(),
+                       px[:50].tolist()):
+        atr_s.update(h, l, c)
+        st_s.update(h, l, c)
+    now = datetime.fromisoformat(TS)
+    oc = m.chain("NIFTY50", SPOTS["NIFTY50"], now)
+    ch = m.chain_arrays("NIFTY50", SPOTS["NIFTY50"], now)
+    cpr = {"bc": 24400.0, "pivot": 24420.0, "tc": 24440.0}
+    oi_p = {"min_oi_delta_5m_pct": 5.0}
+    cpr_p = {"require_above_vwap_for_longs": True}
+    td_kwargs = dict(index="NIFTY50", action="BUY_CE", strike=24500, option_type="CE",
+                     expiry="2024-09-03", entry_type="LIMIT", entry=24510.5,
+                     stop_loss=24265.4, tsl="ATR(1.5)x", r_multiple=1.5, lots=1,
+                     confidence_pct=72, signal_stack=["oi_momentum", "cpr_vwap"],
+                     greeks={"delta": 0.5, "iv": 0.13}, risk_check="passed",
+                     broker="angel_one", reason="Confluence", timestamp=TS)
+    oi_store = OIStore()
+    rows = ch["strike"][:len(ch["strike"]) // 2]
+    for k in range(6):   # 6 one-minute snapshots so 5m deltas exist
+        oi_store.update("NIFTY50", now.timestamp() + 60 * k,
+                        [(("2024-09-03", float(s), "CE" if j % 2 else "PE"),
+                          1e5 * (1 - 0.01 * k))
+                         for j, s in enumerate(rows)])
+    oi_stats = oi_store.stats("NIFTY50")
+    breadth = get_breadth()
+    risk_state = {"open_positions": 0, "vol_spike_halt": False,
+                  "cooldown_active": False}
+    risk = RiskEngine.from_file("config/risk.yml")
+    tick_ts = now.timestamp()
+    book = PositionBook(1e7)
+    # dozens of legs across both indices, half marked by each index's ticks
+    for k in range(48):
+        book.open(f"LEG{k}", "NIFTY50" if k % 2 else "BANKNIFTY", 75, 24500.0, 23500.0,
+                  tick_ts, trail=900.0, to_cost_r=1.0)
+    sim = SimBroker(seed=0)
+    sim.on_tick("NIFTY50", 24500.0, tick_ts)
+    # 200 resting orders on 20 levels a side, none marketable at 24500
+    for k in range(100):
+        sim.place_order("NIFTY50", "BUY", 75, 24490.0 - 5 * (k % 20), "LIMIT")
+        sim.place_order("NIFTY50", "SELL", 75, 24510.0 + 5 * (k % 20), "LIMIT")
+
+    def sim_place_cancel() -> None:
+        sim.cancel_order(sim.place_order("NIFTY50", "BUY", 75, 24480.0,
+                                         "LIMIT")["order_id"])
+
+    def sim_cross() -> None:   # rest a bid, then sweep it with a sell
+        sim.place_order("NIFTY50", "BUY", 75, 24495.0, "LIMIT")
+        sim.place_order("NIFTY50", "SELL", 75, 24495.0, "LIMIT")
+
+    n = 2000 * scale
+    return {
+        "indicators.calc_vwap[375]": (lambda: calc_vwap(px_l, vol_l), n, 375),
+        "indicators.calc_cpr": (lambda: calc_cpr(24600.0, 24300.0, 24450.0), n * 5, 1),
+        "indicators.RunningVWAP.update": (lambda: rv.update(24500.0, 120.0), n * 5, 1),
+        f"indicators.session_vwap[{len(px)}]": (
+            lambda: session_vwap(px, vol, starts), 50, len(px)),
+        f"indicators.session_hlc[{len(px)}]": (
+            lambda: session_hlc(bars["high"], bars["low"], px, starts), 50, len(px)),
+        "indicators.ATR.update": (
+            lambda: atr_s.update(24520.0, 24490.0, 24505.0), n * 5, 1),
+        "indicators.SuperTrend.update": (
+            lambda: st_s.update(24520.0, 24490.0, 24505.0), n * 5, 1),
+        f"indicators.atr[{len(px)}]": (
+            lambda: atr(bars["high"], bars["low"], px, 14), 50, len(px)),
+        f"indicators.supertrend[{len(px)}]": (
+            lambda: supertrend(bars["high"], bars["low"], px, 10, 3.0), 20, len(px)),
+        "signal_oi_momentum.detect": (
+            lambda: sig_oi("NIFTY50", oc, oi_p, oi_stats), n * 5, 1),
+        "oi_store.observe(cached)": (
+            lambda: oi_store.observe("NIFTY50", now.timestamp() + 300,
+                                     oi_store.books["NIFTY50"].snap), n * 5, 1),
+        f"oi_store.chain[{len(rows)}]": (
+            lambda: oi_store.chain("NIFTY50"), 200, len(rows)),
+        "signal_cpr_vwap.detect": (
+            lambda: sig_cpr("NIFTY50", 24510.0, 24480.0, cpr, cpr_p), n * 5, 1),
+        "risk_engine.check_time+check": (
+            lambda: risk.check_time(tick_ts) or risk.check(tick_ts, "CE"), n * 5, 1),
+        "position_book.on_tick[24 legs]": (
+            lambda: book.on_tick("NIFTY50", 24510.0, tick_ts), n * 2, 24),
+        "sim_broker.place+cancel": (sim_place_cancel, n * 5, 2),
+        "sim_broker.place(cross)": (sim_cross, n * 5, 2),
+        "sim_broker.on_tick[200 resting]": (
+            lambda: sim.on_tick("NIFTY50", 24500.0, tick_ts), n * 5, 1),
+        "position_sizer.lots_for_risk": (
+            lambda: lots_for_risk("NIFTY50", 1e6, 0.02, 245.0, 1.0), n * 5, 1),
+        "schemas.NoTradeEvent.as_dict": (
+            lambda: NoTradeEvent("mixed_signals", TS).as_dict(), n * 5, 1),
+        "schemas.TradeDecision.model_dump": (
+            lambda: TradeDecision(**td_kwargs).model_dump(), n, 1),
+        "schemas.TradeDecisionEvent.validated": (
+            lambda: TradeDecisionEvent(**td_kwargs).validated().model_dump(), n, 1),
+        "audit.emit_audit_snapshot": (
+            lambda: emit_audit_snapshot("NIFTY50", 24510.0, oc, breadth, [], {},
+                                        risk_state, TS), n, 1),
+        f"greeks.chain_greeks[{len(ch['strike'])}]": (
+            lambda: chain_greeks(SPOTS["NIFTY50"], ch["strike"], ch["T"], ch["price"],
+                                 ch["is_call"]), 20, len(ch["strike"])),
+    }
+
+
+def full_loop(m: SyntheticMarket, scale: int) -> Dict[str, float]:
+    """
+    run_intraday's pump -> run_index -> handle_tick path over a synthetic feed (no
+    network).
+    """
+    import yaml
+    import run_intraday as ri
+    from marketdata.bar_aggregator import BarAggregator
+    from marketdata.oi_store import OIStore
+    from risk.risk_engine import RiskEngine
+    from risk.position_book import PositionBook
+
+    ticks = m.ticks(20000 * scale)
+    indices = m.symbols
+    now = datetime.fromtimestamp(ticks[0]["ts"], tz=ri.IST)
+    with open("config/strategy.yml", "r", encoding="utf-8") as f:
+        strat_cfg = yaml.safe_load(f)
+    lat = Latency(enabled=True)
+    ctx = {"risk": RiskEngine.from_file("config/risk.yml"), "strat_cfg": strat_cfg,
+           "primary": strat_cfg["execution"]["primary_broker"],
+           "ocp": StaticChainProvider({i: m.chain(i, SPOTS[i], now) for i in indices}),
+           "capital": 1e6, "instruments": None, "latency": lat, "oi_store": OIStore(),
+           "positions": PositionBook(1e6), "paper": True}
+    bars = {i: BarAggregator(i) for i in indices}
+    # previous session below spot: CPR defined and the long path is reachable
+    for i in indices:
+        bars[i].seed_prev_session(SPOTS[i] * 0.99, SPOTS[i] * 0.98, SPOTS[i] * 0.985)
+
+    async def go() -> float:
+        queues = {i: asyncio.Queue(maxsize=1) for i in indices}
+        tasks = [asyncio.create_task(ri.run_index(i, queues[i], bars[i], ctx))
+                 for i in indices]
+        t0 = time.perf_counter()
+        await ri.pump(SyntheticFeed(ticks), queues, bars, {i: 0 for i in indices},
+                      conflate=False, lat=lat, risk=ctx["risk"], book=ctx["positions"])
+        await asyncio.gather(*(q.join() for q in queues.values()))
+        wall = time.perf_counter() - t0
+        for t in tasks:
+            t.cancel()
+        return wall
+
+    wall = asyncio.run(go())
+    total = Histogram()
+    for (stage, _), h in lat.hists.items():
+        if stage == "tick_to_decision":
+            total.counts = [a + b for a, b in zip(total.counts, h.counts)]
+            total.count += h.count
+            total.total += h.total
+            total.max = max(total.max, h.max)
+    return _stats(total, len(ticks) / wall)
+
+
+def execution_pipeline(m: SyntheticMarket, scale: int,
+                       window: int = 32) -> Dict[str, float]:
+    """
+    ExecutionEngine over a SimBroker: place, then modify or cancel every order, with
+    up to `window` requests in flight while synthetic ticks trade the book.
+    Reports requests/s and per-request submit -> result latency.
+    """
+    from connectors.execution import ExecutionEngine, OrderRequest
+    from connectors.sim_broker import SimBroker, SimFeed
+
+    n = 2000 * scale
+    ticks = m.ticks(n, interval=1.0)
+    sim = SimBroker(seed=0)
+    sim.on_tick("NIFTY50", SPOTS["NIFTY50"], ticks[0]["ts"])
+    h = Histogram()
+
+    async def go() -> float:
+        ex = ExecutionEngine({"sim": sim}, primary="sim", queue_size=window * 2,
+                             workers=2)
+        await ex.start()
+        gate = asyncio.Semaphore(window)
+
+        async def one(req: OrderRequest) -> Dict[str, Any]:
+            async with gate:
+                t0 = time.perf_counter_ns()
+                res = await ex.submit(req)
+                h.record(time.perf_counter_ns() - t0)
+                return res
+
+        async def order(k: int) -> None:
+            px = round(SPOTS["NIFTY50"] + ((k % 41) - 20) * 0.5, 1)
+            res = await one(OrderRequest(symbol="NIFTY50",
+                                         side="BUY" if k % 2 else "SELL", qty=75,
+                                         price=px))
+            if res["status"] == "acknowledged":
+                if k % 3:
+                    await one(OrderRequest(stage="cancel", order_id=res["order_id"],
+                                           broker="sim"))
+                else:
+                    await one(OrderRequest(stage="modify", order_id=res["order_id"],
+                                           price=px - 1.0, broker="sim"))
+
+        async def market() -> None:
+            async for _ in SimFeed(SyntheticFeed(ticks, chunk=16), sim).ticks():
+                pass
+
+        feed = asyncio.create_task(market())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(order(k) for k in range(n)))
+        wall = time.perf_counter() - t0
+        feed.cancel()
+        await ex.stop()
+        return wall
+
+    wall = asyncio.run(go())
+    return _stats(h, h.count / wall)
+
+
+# -- driver ----------------------------------------------------------------------------
+
+
+def run(only: List[str], size: str, seed: int) -> Dict[str, Dict[str, float]]:
+    scale = SIZES[size]
+    m = SyntheticMarket(seed=seed)
+    cal = calibration()
+    results: Dict[str, Dict[str, float]] = {
+        CALIBRATION: best_of(lambda: measure(cal, 2000 * scale))}
+    for name, (fn, n, ops) in micro_cases(m, scale).items():
+        if not only or any(o in name for o in only):
+            results[name] = best_of(lambda: measure(fn, n, per_call_ops=ops))
+    if not only or any(o in "run_intraday.full_loop" for o in only):
+        results["run_intraday.full_loop"] = best_of(lambda: full_loop(m, scale))
+    if not only or any(o in "execution.sim_pipeline" for o in only):
+        results["execution.sim_pipeline"] = best_of(
+            lambda: execution_pipeline(m, scale))
+    return results
+
+
+def ratios(results: Dict[str, Dict[str, float]],
+           baseline: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """
+    Gated cases -> p50 vs baseline, each side divided by its own calibration p50
+    (absolute when either run has no calibration case).
+    """
+    cal_r = results.get(CALIBRATION, {}).get("p50_us")
+    cal_b = baseline.get(CALIBRATION, {}).get("p50_us")
+    scale = cal_b / cal_r if cal_r and cal_b else 1.0
+    out = {}
+    for name, r in results.items():
+        b = baseline.get(name)
+        if name == CALIBRATION or not b or b["p50_us"] < MIN_GATE_US:
+            continue
+        out[name] = r["p50_us"] * scale / b["p50_us"]
+    return out
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """
+    Names of gated cases whose normalized p50 regressed past `threshold` (missing
+    baselines are skipped).
+    """
+    return [name for name, x in ratios(results, baseline).items()
+            if x > 1.0 + threshold]
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--baseline",
+                    default=os.path.join("bench", "baselines",
+                                         f"{platform.node() or 'local'}.json"))
+    ap.add_argument("--save", action="store_true",
+                    help="write results as the new baseline")
+    ap.add_argument("--only", default="",
+                    help="comma-separated substrings of case names")
+    ap.add_argument("--size", choices=sorted(SIZES), default="small")
+    ap.add_argument("--threshold", type=float, default=0.25)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--output", help="also write this run's results here (JSON)")
+    args = ap.parse_args(argv)
+
+    _quiet_logs()
+    results = run([o for o in args.only.split(",") if o], args.size, args.seed)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    bad = compare(results, baseline, args.threshold)
+    norm = ratios(results, baseline)
+
+    print(f"{'case':46s} {'ops/s':>14s} {'p50 us':>10s} {'p99 us':>10s} "
+          f"{'base p50':>10s} {'ratio':>7s}")
+    for name, r in results.items():
+        b = baseline.get(name, {}).get("p50_us")
+        flag = "  REGRESSED" if name in bad else ""
+        base = f"{b:.2f}" if b is not None else "-"
+        x = f"{norm[name]:.2f}" if name in norm else "-"
+        print(f"{name:46s} {r['ops_per_s']:14,.0f} {r['p50_us']:10.2f} "
+              f"{r['p99_us']:10.2f} {base:>10s} {x:>7s}{flag}")
+
+    doc = {"meta": {"host": platform.node(), "python": platform.python_version(),
+                    "size": args.size, "seed": args.seed,
+                    "created": datetime.now().isoformat(timespec="seconds")},
+           "results": results}
+    for path in filter(None, [args.output, args.baseline if args.save else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+    if bad and not args.save:
+        print(f"{len(bad)} case(s) regressed by more than {args.threshold:.0%} "
+              f"vs {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
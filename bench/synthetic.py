@@ -0,0 +1,149 @@
+# bench/synthetic.py
+"""
+Deterministic synthetic market data for benchmarks and dry runs.
+
+SyntheticMarket produces
+  - ticks:  run_intraday tick dicts (ts, symbol, ltp, cumulative volume), GBM
+            prices inside 09:20-15:10 IST so time guards pass
+  - bars:   backtest columns (ts, open, high, low, close, volume, oi)
+  - chains: option_chain_provider snapshots, plus flat strike/expiry arrays
+            priced off a smile for the greeks engine
+SyntheticFeed / StaticChainProvider are network-free drop-ins for FeedWS and
+AsyncOptionChainProvider.
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+import numpy as np
+from engine.greeks import RISK_FREE_RATE, bs_price, years_to_expiry
+from utils.instruments import IST
+
+SPOTS = {"NIFTY50": 24500.0, "BANKNIFTY": 51000.0}
+STRIKE_STEP = {"NIFTY50": 50.0, "BANKNIFTY": 100.0}
+_OPEN = 9 * 3600 + 20 * 60      # first tradable second (IST)
+_CLOSE = 15 * 3600 + 10 * 60
+
+
+class SyntheticMarket:
+    def __init__(self, symbols: Sequence[str] = ("NIFTY50", "BANKNIFTY"), seed: int = 0,
+                 start: date = date(2024, 9, 2), vol: float = 0.14):
+        self.symbols = list(symbols)
+        self.rng = np.random.default_rng(seed)
+        self.start = start
+        self.vol = vol
+
+    def _session_open(self, day: int) -> float:
+        d = self.start + timedelta(days=day)
+        return datetime(d.year, d.month, d.day, tzinfo=IST).timestamp() + _OPEN
+
+    def _path(self, spot: float, n: int, dt_s: float) -> np.ndarray:
+        sigma = self.vol * np.sqrt(dt_s / (365.0 * 86400))
+        return spot * np.exp(np.cumsum(self.rng.normal(0.0, sigma, n)))
+
+    def ticks(self, n: int, interval: float = 0.25,
+              day: int = 0) -> List[Dict[str, Any]]:
+        """n ticks round-robin over symbols, `interval` seconds apart per symbol."""
+        per = -(-n // len(self.symbols))
+        span = _CLOSE - _OPEN
+        t = (np.arange(per) * interval) % span + self._session_open(day)
+        out: List[Dict[str, Any]] = []
+        cols = []
+        for s in self.symbols:
+            px = self._path(SPOTS.get(s, 20000.0), per, interval)
+            vol = np.cumsum(self.rng.integers(0, 500, per)).astype(float)
+            cols.append((s, px.tolist(), vol.tolist()))
+        for i, ts in enumerate(t.tolist()):
+            for s, px, vol in cols:
+                out.append({"ts": ts, "symbol": s, "ltp": px[i], "volume": vol[i]})
+        return out[:n]
+
+    def bars(self, days: int, symbol: str = "NIFTY50",
+             bar_minutes: int = 1) -> Dict[str, np.ndarray]:
+        """Columnar bars for `days` consecutive sessions (09:15-15:30)."""
+        per = 375 // bar_minutes
+        ts = np.concatenate([self._session_open(d) - 300
+                             + np.arange(per) * 60.0 * bar_minutes
+                             for d in range(days)])
+        n = len(ts)
+        close = self._path(SPOTS.get(symbol, 20000.0), n, 60.0 * bar_minutes)
+        wick = close * self.vol * np.sqrt(60.0 * bar_minutes / (365.0 * 86400))
+        open_ = np.r_[close[0], close[:-1]]
+        high = np.maximum(open_, close) + np.abs(self.rng.normal(0.0, 1.0, n)) * wick
+        low = np.minimum(open_, close) - np.abs(self.rng.normal(0.0, 1.0, n)) * wick
+        # OI with regime drift so both build-up and unwinding windows occur
+        drift = np.repeat(self.rng.normal(0.0, 0.004, n // 30 + 1), 30)[:n]
+        oi = 1e7 * np.exp(np.cumsum(drift + self.rng.normal(0.0, 0.002, n)))
+        return {"ts": ts, "open": open_, "high": high, "low": low, "close": close,
+                "volume": self.rng.integers(100, 5000, n).astype(float), "oi": oi}
+
+    def chain_arrays(self, index: str, spot: float, now: datetime, n_strikes: int = 101,
+                     expiries: int = 4) -> Dict[str, np.ndarray]:
+        """
+        Flat CE+PE rows over `n_strikes` x `expiries` weekly expiries, priced off a
+        smile.
+        """
+        step = STRIKE_STEP.get(index, 50.0)
+        atm = round(spot / step) * step
+        strikes = atm + (np.arange(n_strikes) - n_strikes // 2) * step
+        # next Tuesday
+        first = now.date() + timedelta(days=(1 - now.weekday()) % 7 or 7)
+        exps = np.array([first + timedelta(weeks=w) for w in range(expiries)],
+                        dtype="datetime64[D]")
+        K, E, C = (a.ravel()
+                   for a in np.meshgrid(strikes, exps, [True, False], indexing="ij"))
+        T = years_to_expiry(E, now)
+        iv = self.vol + 0.8 * np.log(K / spot) ** 2
+        return {"strike": K, "expiry": E, "is_call": C, "T": T,
+                "price": bs_price(spot, K, T, RISK_FREE_RATE, iv, C), "iv": iv}
+
+    def chain(self, index: str, spot: float, now: datetime,
+              oi_trend: str = "CE_unwind PE_build") -> Dict[str, Any]:
+        """Provider-shaped snapshot (pcr, max_pain, oi_trend, atm legs)."""
+        step = STRIKE_STEP.get(index, 50.0)
+        atm = round(spot / step) * step
+        exp = np.array([now.date() + timedelta(days=(1 - now.weekday()) % 7 or 7)],
+                       dtype="datetime64[D]")
+        T = years_to_expiry(exp, now)
+        ce, pe = (float(bs_price(spot, atm, T, RISK_FREE_RATE, self.vol, c)[0])
+                  for c in (True, False))
+        return {"pcr": round(float(self.rng.uniform(0.7, 1.3)), 2), "max_pain": atm,
+                "oi_trend": oi_trend,
+                "atm": {"strike": atm, "CE": {"ltp": round(ce, 2)},
+                        "PE": {"ltp": round(pe, 2)}}}
+
+
+class SyntheticFeed:
+    """FeedWS stand-in replaying pre-built ticks as fast as the consumer allows."""
+
+    def __init__(self, ticks: List[Dict[str, Any]], chunk: int = 1024):
+        self._ticks = ticks
+        self.chunk = chunk
+        self.symbols = sorted({t["symbol"] for t in ticks})
+
+    async def connect(self) -> None:
+        pass
+
+    async def ticks(self) -> AsyncIterator[Dict[str, Any]]:
+        for i, tick in enumerate(self._ticks):
+            yield dict(tick)
+            if i % self.chunk == 0:
+                await asyncio.sleep(0)
+
+    async def close(self) -> None:
+        pass
+
+
+class StaticChainProvider:
+    """AsyncOptionChainProvider stand-in serving fixed per-index snapshots."""
+
+    def __init__(self, snapshots: Dict[str, Dict[str, Any]]):
+        self.snapshots = snapshots
+
+    def peek(self, index: str) -> Optional[Dict[str, Any]]:
+        return self.snapshots.get(index)
+
+    async def get_snapshot(self, index: str) -> Dict[str, Any]:
+        return self.snapshots[index]
+
+    async def close(self) -> None:
+        pass
@@ -1,40 +1,186 @@
 # connectors/angel_one.py
+import json
 import os
-from typing import Dict, Any
-from connectors.base import BrokerConnector
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from connectors.base import BrokerConnector, OrderNotSent
+from utils.instrument_master import InstrumentMaster
+from utils.instruments import IST
 from utils.logger import log
 
-from SmartApi import SmartConnect  # pip install smartapi-python
-import pyotp
+# getCandleData interval names by bar length in seconds
+CANDLE_INTERVALS = {60: "ONE_MINUTE", 180: "THREE_MINUTE", 300: "FIVE_MINUTE",
+                    600: "TEN_MINUTE", 900: "FIFTEEN_MINUTE", 1800: "THIRTY_MINUTE",
+                    3600: "ONE_HOUR", 86400: "ONE_DAY"}
+_CANDLE_GAP = 0.35   # historical API allows ~3 requests/s
+
+# Public scrip master (all segments, ~40 MB JSON); filtered to one exchange segment
+# on load.
+SCRIP_MASTER_URL = ("https://margincalculator.angelbroking.com/OpenAPI_File/files/"
+                    "OpenAPIScripMaster.json")
+
+
+def fetch_scrip_master(exchange: str = "NFO",
+                       url: str = SCRIP_MASTER_URL) -> List[Dict[str, Any]]:
+    import requests
+    resp = requests.get(url, timeout=60)
+    resp.raise_for_status()
+    return [r for r in resp.json() if r.get("exch_seg") == exchange]
 
 class AngelOneConnector(BrokerConnector):
-    def __init__(self) -> None:
-        api_key = os.environ["ANGEL_API_KEY"]
-        client = os.environ["ANGEL_CLIENT_CODE"]
-        password = os.environ["ANGEL_PASSWORD"]
-        totp_secret = os.environ["ANGEL_TOTP_SECRET"]
-
-        self.smart = SmartConnect(api_key=api_key)
-        totp = pyotp.TOTP(totp_secret).now()
-        login = self.smart.generateSession(client, password, totp)
-        self.feed_token = self.smart.getfeedToken()
-        log.info("angelone_login_ok", extra={"_extra": {"client": client}})
-
-        # cache instruments (once)
-        self._nfo = self.smart.getInstruments("NFO")
-        self._token_map = {row["tradingsymbol"]: row["token"] for row in self._nfo}
+    """
+    SmartAPI connector. The SDK is imported on construction, not at module import
+    (importing SmartApi also probes the public IP over the network).
+
+    The session (JWT, refresh and feed tokens) is cached per IST day under
+    `session_dir` (0600), so a restart skips TOTP + generateSession + getfeedToken;
+    verify_session() checks a cached session off the hot path and logs in again if
+    it was revoked.
+    """
+
+    def __init__(self, load_instruments: bool = True,
+                 session_dir: Optional[str] = "data/session") -> None:
+        from SmartApi import SmartConnect  # pip install smartapi-python
+        self.api_key = os.environ["ANGEL_API_KEY"]
+        self.client = os.environ["ANGEL_CLIENT_CODE"]
+        self._session_path = (os.path.join(session_dir, f"angel-{self.client}.json")
+                              if session_dir else None)
+        cached = self._load_session()
+        if cached:
+            self.smart = SmartConnect(
+                api_key=self.api_key,
+                access_token=cached["jwt"].removeprefix("Bearer "),
+                refresh_token=cached["refresh"], feed_token=cached["feed"],
+                userId=self.client)
+            self._set_session(cached)
+            log.info("angelone_session_cached",
+                     extra={"_extra": {"client": self.client}})
+        else:
+            self.smart = SmartConnect(api_key=self.api_key)
+            self.login()
+
+        # daily on-disk instrument master (memory-mapped); downloads only on the first
+        # start of the day
+        self.instruments = (InstrumentMaster.load(fetch_scrip_master, exchange="NFO")
+                            if load_instruments else None)
+        # order_id -> last payload (for modify)
+        self._orders: Dict[str, Dict[str, Any]] = {}
+        self._last_candles = 0.0
+
+    def login(self) -> None:
+        import pyotp
+        totp = pyotp.TOTP(os.environ["ANGEL_TOTP_SECRET"]).now()
+        login = self.smart.generateSession(self.client, os.environ["ANGEL_PASSWORD"],
+                                           totp)
+        data = login.get("data") or {}
+        session = {"day": datetime.now(IST).date().isoformat(),
+                   "jwt": data.get("jwtToken", ""),
+                   "refresh": data.get("refreshToken", ""),
+                   "feed": self.smart.getfeedToken()}
+        self._set_session(session)
+        self._save_session(session)
+        log.info("angelone_login_ok", extra={"_extra": {"client": self.client}})
+
+    def _set_session(self, session: Dict[str, str]) -> None:
+        self.feed_token = session["feed"]
+        self._refresh_token = session["refresh"]
+        self._feed_auth = {"Authorization": session["jwt"], "x-api-key": self.api_key,
+                           "x-client-code": self.client,
+                           "x-feed-token": self.feed_token}
+
+    def _load_session(self) -> Optional[Dict[str, str]]:
+        if not self._session_path or not os.path.exists(self._session_path):
+            return None
+        try:
+            with open(self._session_path, "r", encoding="utf-8") as f:
+                s = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (s.get("day") != datetime.now(IST).date().isoformat()
+                or not all(s.get(k) for k in ("jwt", "refresh", "feed"))):
+            return None
+        return s
+
+    def _save_session(self, session: Dict[str, str]) -> None:
+        if not self._session_path:
+            return
+        os.makedirs(os.path.dirname(self._session_path), exist_ok=True)
+        tmp = self._session_path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        os.replace(tmp, self._session_path)
+
+    def verify_session(self) -> bool:
+        """
+        True if the current session is accepted; otherwise logs in again (blocking) and
+        returns False.
+        """
+        try:
+            ok = bool((self.smart.getProfile(self._refresh_token) or {}).get("status"))
+        except Exception:
+            ok = False
+        if not ok:
+            log.info("angelone_session_invalid",
+                     extra={"_extra": {"client": self.client}})
+            self.login()
+        return ok
+
+    def candles(self, token: str, seconds: int, start: datetime, end: datetime,
+                exchange: str = "NSE") -> List[Tuple[float, ...]]:
+        """
+        Historical OHLCV bars of `seconds` as (epoch ts, o, h, l, c, v), oldest first.
+        """
+        wait = self._last_candles + _CANDLE_GAP - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_candles = time.monotonic()
+        res = self.smart.getCandleData({
+            "exchange": exchange, "symboltoken": token,
+            "interval": CANDLE_INTERVALS[seconds],
+            "fromdate": start.strftime("%Y-%m-%d %H:%M"),
+            "todate": end.strftime("%Y-%m-%d %H:%M"),
+        }) or {}
+        if not res.get("status"):
+            raise RuntimeError(f"getCandleData failed: {res.get('message', res)}")
+        return [(datetime.fromisoformat(r[0]).timestamp(), *(float(x) for x in r[1:6]))
+                for r in res.get("data") or []]
+
+    def feed_headers(self) -> Dict[str, str]:
+        """Handshake headers for the SmartAPI WebSocket 2.0 tick stream."""
+        return dict(self._feed_auth)
 
     def _resolve_token(self, tradingsymbol: str) -> str:
-        token = self._token_map.get(tradingsymbol)
+        """Raises OrderNotSent: nothing has been sent yet, so failing over is safe."""
+        token = (self.instruments.token(tradingsymbol)
+                 if self.instruments is not None else None)
         if not token:
-            raise ValueError(f"Symbol token not found for {tradingsymbol}")
+            raise OrderNotSent(f"Symbol token not found for {tradingsymbol}")
         return token
 
-    def place_order(self, symbol: str, side: str, qty: int, price: float | None, order_type: str) -> Dict[str, Any]:
+    @staticmethod
+    def _not_sent(e: Exception) -> bool:
+        """
+        requests errors raised before the connection was established (nothing reached
+        the broker).
+        """
+        import requests
+        from urllib3.exceptions import NewConnectionError
+        if isinstance(e, requests.exceptions.ConnectTimeout):
+            return True
+        return bool(isinstance(e, requests.exceptions.ConnectionError) and e.args
+                    and isinstance(getattr(e.args[0], "reason", None),
+                                   NewConnectionError))
+
+    def place_order(self, symbol: str, side: str, qty: int, price: Optional[float],
+                    order_type: str, tag: Optional[str] = None) -> Dict[str, Any]:
         """
         symbol: tradingsymbol e.g., NIFTY25SEP24700CE
         side: "BUY" or "SELL"
         order_type: "MARKET" or "LIMIT"
+        tag: client order id, sent as SmartAPI `ordertag` (<= 20 chars) for
+        order_by_tag()
         """
         token = self._resolve_token(symbol)
         payload = {
@@ -50,25 +196,69 @@ class AngelOneConnector(BrokerConnector):
         }
         if order_type == "LIMIT" and price is not None:
             payload["price"] = float(price)
+        if tag:
+            payload["ordertag"] = tag[:20]
 
         try:
-            res = self.smart.placeOrder(**payload)
-            log.info("broker_event", extra={"_extra": {"broker_event": {
-                "stage": "place", "broker": "angel_one", "client_order_id": res.get("orderid"),
-                "status": "acknowledged", "details": "", "timestamp": ""}}})
-            return {"status": "acknowledged", "order_id": res.get("orderid")}
+            res = self.smart.placeOrderFullResponse(dict(payload)) or {}
         except Exception as e:
-            log.info("broker_event", extra={"_extra": {"broker_event": {
-                "stage": "place", "broker": "angel_one", "status": "rejected", "details": str(e)}}})
+            if self._not_sent(e):
+                raise OrderNotSent(str(e)) from e
             raise
+        order_id = (res.get("data") or {}).get("orderid")
+        if not res.get("status") or not order_id:
+            log.info("broker_event", extra={"_extra": {"broker_event": {
+                "stage": "place", "broker": "angel_one", "client_order_id": tag,
+                "status": "rejected", "details": res.get("message", "")}}})
+            return {"status": "rejected", "order_id": None,
+                    "details": res.get("message", "no orderid")}
+        self._orders[order_id] = payload
+        log.info("broker_event", extra={"_extra": {"broker_event": {
+            "stage": "place", "broker": "angel_one", "client_order_id": tag,
+            "order_id": order_id, "status": "acknowledged", "details": ""}}})
+        return {"status": "acknowledged", "order_id": order_id}
 
-    def modify_order(self, order_id: str, price: float | None = None, qty: int | None = None) -> Dict[str, Any]:
-        # implement when needed; SmartAPI uses modifyOrder(variety, orderid, ...)
-        return {"status": "noop", "order_id": order_id}
+    def modify_order(self, order_id: str, price: Optional[float] = None,
+                     qty: Optional[int] = None) -> Dict[str, Any]:
+        placed = self._orders.get(order_id)
+        if placed is None:
+            return {"status": "rejected", "order_id": order_id,
+                    "details": "unknown order_id"}
+        params = {k: v for k, v in placed.items() if k != "ordertag"}
+        params["orderid"] = order_id
+        if qty is not None:
+            params["quantity"] = int(qty)
+        if price is not None:
+            params["price"] = float(price)
+        try:
+            res = self.smart.modifyOrder(dict(params)) or {}
+        except Exception as e:
+            return {"status": "rejected", "order_id": order_id, "details": str(e)}
+        if not res.get("status"):
+            return {"status": "rejected", "order_id": order_id,
+                    "details": res.get("message", "")}
+        self._orders[order_id] = dict(placed, **{k: v for k, v in params.items()
+                                                 if k != "orderid"})
+        return {"status": "acknowledged", "order_id": order_id}
 
     def cancel_order(self, order_id: str) -> Dict[str, Any]:
+        variety = self._orders.get(order_id, {}).get("variety", "NORMAL")
         try:
-            res = self.smart.cancelOrder(variety="NORMAL", orderid=order_id)
-            return {"status": "acknowledged", "order_id": order_id}
+            res = self.smart.cancelOrder(order_id, variety) or {}
         except Exception as e:
-            return {"status": "rejected", "details": str(e)}
+            return {"status": "rejected", "order_id": order_id, "details": str(e)}
+        if not res.get("status"):
+            return {"status": "rejected", "order_id": order_id,
+                    "details": res.get("message", "")}
+        return {"status": "acknowledged", "order_id": order_id}
+
+    def order_by_tag(self, tag: str) -> Optional[Dict[str, Any]]:
+        """Look the order up in today's order book by `ordertag`."""
+        book = (self.smart.orderBook() or {}).get("data") or []
+        for row in book:
+            if row.get("ordertag") == tag[:20]:
+                status = ("rejected" if row.get("status") == "rejected"
+                          else "acknowledged")
+                return {"status": status, "order_id": row.get("orderid"),
+                        "details": row.get("text") or row.get("status", "")}
+        return None
@@ -1,15 +1,35 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+
+class OrderNotSent(Exception):
+    """
+    The request provably never reached the broker (connect refused or timed
+    out, no session), so sending it again cannot duplicate an order.
+    """
+
 
 class BrokerConnector(ABC):
     @abstractmethod
-    def place_order(self, symbol: str, side: str, qty: int, price: float | None, order_type: str) -> Dict[str, Any]:
+    def place_order(self, symbol: str, side: str, qty: int, price: Optional[float],
+                    order_type: str, tag: Optional[str] = None) -> Dict[str, Any]:
+        """
+        `tag` is the caller's client order id, stored with the order for order_by_tag().
+        """
         ...
 
     @abstractmethod
-    def modify_order(self, order_id: str, price: float | None = None, qty: int | None = None) -> Dict[str, Any]:
+    def modify_order(self, order_id: str, price: Optional[float] = None,
+                     qty: Optional[int] = None) -> Dict[str, Any]:
         ...
 
     @abstractmethod
     def cancel_order(self, order_id: str) -> Dict[str, Any]:
         ...
+
+    def order_by_tag(self, tag: str) -> Optional[Dict[str, Any]]:
+        """
+        The order placed with `tag` as {"status", "order_id", ...}, or None when it
+        is not in the broker's order book (or the connector cannot look it up).
+        """
+        return None
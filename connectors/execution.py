@@ -0,0 +1,367 @@
+# connectors/execution.py
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from connectors.base import BrokerConnector, OrderNotSent
+from engine.schemas import BrokerEvent
+from utils.instruments import IST
+from utils.logger import log
+
+
+@dataclass
+class OrderRequest:
+    """One place/modify/cancel request. `order_id` is the broker id (modify/cancel)."""
+    stage: str = "place"
+    symbol: str = ""
+    side: str = "BUY"
+    qty: int = 0
+    price: Optional[float] = None
+    order_type: str = "LIMIT"
+    order_id: Optional[str] = None
+    # pin to a broker (modify/cancel must go where the order lives)
+    broker: Optional[str] = None
+    client_order_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+
+
+@dataclass
+class InFlight:
+    req: OrderRequest
+    future: asyncio.Future
+    brokers: List[str]
+    broker: str = ""
+    attempt: int = 0
+    t_submit: float = 0.0
+    t_dequeue: float = 0.0
+    status: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+
+
+class ExecutionEngine:
+    """
+    Async execution layer over synchronous BrokerConnector implementations.
+
+    - bounded submit queue feeding one dispatch task (submit never blocks the tick loop)
+    - per-broker queues, each drained by `workers` tasks that call the connector
+      in that broker's own thread pool, so a slow broker only stalls itself
+    - every call is bounded by `timeout`
+    - in-flight orders tracked by client_order_id, which is also sent as the
+      broker order tag
+    - one BrokerEvent per outcome with per-stage latency (queue / call / total, ms)
+
+    A place is not idempotent, so it is only sent again (up to `max_retries`
+    on the same broker, then along `failover`) when the connector raised
+    OrderNotSent. A broker rejection goes straight back to the caller. When
+    the outcome is unknown (timeout, or an error after sending), the order is
+    reconciled instead: wait up to `reconcile_timeout` for the late reply,
+    then look it up with order_by_tag(client_order_id), `reconcile_lookups`
+    times `reconcile_interval` apart (the order book can lag the place). If
+    none finds it the result is "timeout", never "rejected": the order may be
+    live. The tag is then re-checked for `reconcile_window` seconds and an
+    order that shows up (or a late reply that lands) is cancelled.
+    Modify and cancel stay on the order's broker and are retried after
+    timeouts and errors (setting a price or cancelling twice is harmless).
+    stop() resolves every pending future: "cancelled" if it was never sent,
+    else "timeout".
+    """
+
+    def __init__(self, connectors: Dict[str, BrokerConnector], primary: str,
+                 failover: Optional[List[str]] = None, max_retries: int = 1,
+                 timeout: float = 2.0, queue_size: int = 256, workers: int = 2,
+                 reconcile_timeout: float = 5.0, reconcile_lookups: int = 3,
+                 reconcile_interval: float = 1.0, reconcile_window: float = 60.0):
+        if primary not in connectors:
+            raise ValueError(f"primary broker {primary!r} has no connector")
+        self.connectors = connectors
+        self.primary = primary
+        self.failover = [b for b in (failover or [])
+                         if b in connectors and b != primary]
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.reconcile_timeout = reconcile_timeout
+        self.reconcile_lookups = max(1, reconcile_lookups)
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_window = reconcile_window
+        self.workers = workers
+        self.inflight: Dict[str, InFlight] = {}
+        self._submit_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._broker_q: Dict[str, asyncio.Queue] = {b: asyncio.Queue()
+                                                    for b in connectors}
+        self._pools = {b: ThreadPoolExecutor(max_workers=workers,
+                                             thread_name_prefix=f"broker-{b}")
+                       for b in connectors}
+        self._tasks: List[asyncio.Task] = []
+        self._side: Set[asyncio.Task] = set()   # reconciliations and late cancels
+
+    @classmethod
+    def from_config(cls, connectors: Dict[str, BrokerConnector],
+                    strat_cfg: Dict[str, Any], **kwargs) -> "ExecutionEngine":
+        ex = strat_cfg.get("execution", {})
+        return cls(connectors, primary=ex.get("primary_broker", "angel_one"),
+                   failover=ex.get("failover_brokers", ["zerodha_kite", "upstox"]),
+                   max_retries=int(ex.get("max_retries", 1)), **kwargs)
+
+    async def start(self) -> None:
+        self._tasks.append(asyncio.create_task(self._dispatch(), name="exec:dispatch"))
+        for b in self.connectors:
+            for i in range(self.workers):
+                self._tasks.append(asyncio.create_task(self._worker(b),
+                                                       name=f"exec:{b}:{i}"))
+
+    async def stop(self) -> None:
+        for t in self._tasks + list(self._side):
+            t.cancel()
+        await asyncio.gather(*self._tasks, *self._side, return_exceptions=True)
+        self._tasks.clear()
+        for q in (self._submit_q, *self._broker_q.values()):
+            while not q.empty():
+                q.get_nowait()
+        for inf in list(self.inflight.values()):
+            # a place that was sent (or is being reconciled) may be live at the broker
+            self._finish(inf, "cancelled" if inf.status == "queued" else "timeout",
+                         "engine_stopped", None)
+        for p in self._pools.values():
+            p.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, req: OrderRequest) -> asyncio.Future:
+        """Enqueue without waiting; the future resolves to the final result dict."""
+        fut = asyncio.get_running_loop().create_future()
+        if req.broker:
+            brokers = [req.broker]
+        elif req.stage == "place":
+            brokers = [self.primary] + self.failover
+        else:   # an order lives at one broker; modify/cancel never fail over
+            brokers = [self.primary]
+        inf = InFlight(req=req, future=fut, brokers=brokers,
+                       t_submit=time.perf_counter())
+        if brokers[0] not in self.connectors:
+            inf.broker = brokers[0]
+            self._finish(inf, "rejected", f"unknown broker {brokers[0]!r}", None)
+            return fut
+        try:
+            self._submit_q.put_nowait(inf)
+        except asyncio.QueueFull:
+            inf.broker = brokers[0]
+            self._finish(inf, "rejected", "queue_full", None)
+            return fut
+        self.inflight[req.client_order_id] = inf
+        return fut
+
+    def _spawn(self, coro: Any) -> None:
+        t = asyncio.create_task(coro)
+        self._side.add(t)
+        t.add_done_callback(self._side.discard)
+
+    async def _dispatch(self) -> None:
+        while True:
+            inf = await self._submit_q.get()
+            inf.broker = inf.brokers[0]
+            self._broker_q[inf.broker].put_nowait(inf)
+
+    async def _worker(self, broker: str) -> None:
+        q = self._broker_q[broker]
+        conn = self.connectors[broker]
+        while True:
+            inf = await q.get()
+            try:
+                await self._send(inf, broker, conn)
+            except Exception as e:   # a bug for one order must not stop the worker
+                log.info("execution_error", extra={"_extra": {
+                    "client_order_id": inf.req.client_order_id, "broker": broker,
+                    "error": repr(e)}})
+                self._finish(inf, "rejected", f"internal error: {e!r}", None)
+
+    async def _send(self, inf: InFlight, broker: str, conn: BrokerConnector) -> None:
+        loop = asyncio.get_running_loop()
+        inf.t_dequeue = time.perf_counter()
+        inf.status = "sending"
+        req = inf.req
+        t_call = time.perf_counter()
+        cf = loop.run_in_executor(self._pools[broker], self._call, conn, req)
+        try:
+            res = await asyncio.wait_for(asyncio.shield(cf), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            call_ms = (time.perf_counter() - t_call) * 1e3
+            if req.stage == "place":
+                self._event(inf, "timeout", "reconciling", call_ms)
+                self._spawn(self._reconcile(inf, cf, call_ms))
+            else:
+                cf.add_done_callback(
+                    lambda f, i=inf, b=broker: self._late_result(i, b, f))
+                self._retry_or_failover(inf, "timeout",
+                                        f"no response in {self.timeout}s", call_ms)
+            return
+        except OrderNotSent as e:
+            self._retry_or_failover(inf, "rejected", f"not sent: {e}",
+                                    (time.perf_counter() - t_call) * 1e3)
+            return
+        except Exception as e:
+            call_ms = (time.perf_counter() - t_call) * 1e3
+            # it may have reached the broker: look it up, don't resend
+            if req.stage == "place":
+                self._spawn(self._reconcile(inf, None, call_ms, str(e)))
+            else:
+                self._retry_or_failover(inf, "rejected", str(e), call_ms)
+            return
+        call_ms = (time.perf_counter() - t_call) * 1e3
+        if res.get("status") == "rejected":
+            self._finish(inf, "rejected", res.get("details", ""), res, call_ms)
+        else:
+            self._finish(inf, "acknowledged", "", res, call_ms)
+
+    @staticmethod
+    def _call(conn: BrokerConnector, req: OrderRequest) -> Dict[str, Any]:
+        if req.stage == "place":
+            return conn.place_order(req.symbol, req.side, req.qty, req.price,
+                                    req.order_type, tag=req.client_order_id)
+        if req.stage == "modify":
+            return conn.modify_order(req.order_id, price=req.price, qty=req.qty or None)
+        return conn.cancel_order(req.order_id)
+
+    async def _by_tag(self, broker: str, tag: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(
+            self._pools[broker], self.connectors[broker].order_by_tag, tag),
+            timeout=self.timeout)
+
+    async def _reconcile(self, inf: InFlight, cf: Optional[asyncio.Future],
+                         call_ms: float, error: str = "") -> None:
+        """
+        Settle a place whose outcome is unknown, without ever sending it again.
+        """
+        inf.status = "reconciling"
+        broker, tag = inf.broker, inf.req.client_order_id
+        if cf is not None:
+            try:
+                res = await asyncio.wait_for(asyncio.shield(cf),
+                                             timeout=self.reconcile_timeout)
+            except asyncio.TimeoutError:
+                res = None
+            except Exception as e:
+                res, error = None, str(e)
+            if res is not None:
+                status = ("rejected" if res.get("status") == "rejected"
+                          else "acknowledged")
+                self._finish(inf, status, res.get("details") or "late_reply", res,
+                             call_ms)
+                return
+        found = None
+        for k in range(self.reconcile_lookups):
+            if k:
+                await asyncio.sleep(self.reconcile_interval)
+            try:
+                found = await self._by_tag(broker, tag)
+            except Exception as e:
+                error = error or f"order_by_tag: {e!r}"
+            if found:
+                break
+        if found:
+            status = "rejected" if found.get("status") == "rejected" else "acknowledged"
+            self._finish(inf, status, "reconciled_by_tag", found, call_ms)
+            return
+        if cf is not None and not cf.done():
+            cf.add_done_callback(
+                lambda f, i=inf, b=broker: self._late_result(i, b, f, cancel=True))
+        self._spawn(self._recheck(broker, tag))
+        details = "unreconciled: a late order will be cancelled"
+        self._finish(inf, "timeout", f"{details} ({error})" if error else details,
+                     None, call_ms)
+
+    async def _recheck(self, broker: str, tag: str) -> None:
+        """Keep looking for an unreconciled place; cancel it if it shows up."""
+        deadline = time.monotonic() + self.reconcile_window
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                found = await self._by_tag(broker, tag)
+            except Exception:
+                continue
+            if found:
+                if found.get("status") != "rejected" and found.get("order_id"):
+                    await self._cancel_late(broker, found["order_id"], tag)
+                return
+
+    def _retry_or_failover(self, inf: InFlight, status: str, details: str,
+                           call_ms: float) -> None:
+        inf.attempt += 1
+        nxt = inf.brokers.index(inf.broker) + 1
+        if inf.attempt > self.max_retries and nxt >= len(inf.brokers):
+            self._finish(inf, status, details, None, call_ms)
+            return
+        self._event(inf, status, details, call_ms)
+        inf.status = "queued"
+        if inf.attempt <= self.max_retries:
+            self._broker_q[inf.broker].put_nowait(inf)
+        else:
+            self._event(inf, "failover_triggered", f"{inf.broker}->{inf.brokers[nxt]}",
+                        call_ms)
+            inf.broker, inf.attempt = inf.brokers[nxt], 0
+            self._broker_q[inf.broker].put_nowait(inf)
+
+    def _finish(self, inf: InFlight, status: str, details: str,
+                res: Optional[Dict[str, Any]], call_ms: float = 0.0) -> None:
+        inf.status = status
+        inf.result = {"status": status, "broker": inf.broker,
+                      "client_order_id": inf.req.client_order_id,
+                      "order_id": (res or {}).get("order_id"), "details": details}
+        self.inflight.pop(inf.req.client_order_id, None)
+        if not inf.future.done():
+            inf.future.set_result(inf.result)
+        self._event(inf, status, details, call_ms)
+
+    def _late_result(self, inf: InFlight, broker: str, f: Any,
+                     cancel: bool = False) -> None:
+        """
+        A reply that arrived after the caller got its result; with `cancel`, an order it
+        placed is cancelled.
+        """
+        if f.cancelled():
+            return
+        err = f.exception()
+        res = {"status": "rejected", "details": str(err)} if err else f.result()
+        order_id = res.get("order_id")
+        log.info("broker_event", extra={"_extra": {"broker_event": {
+            "stage": inf.req.stage, "broker": broker,
+            "client_order_id": inf.req.client_order_id,
+            "status": res.get("status", "acknowledged"), "details": "late_result",
+            "order_id": order_id, "timestamp": datetime.now(IST).isoformat()}}})
+        if cancel and order_id and res.get("status") != "rejected":
+            self._spawn(self._cancel_late(broker, order_id, inf.req.client_order_id))
+
+    async def _cancel_late(self, broker: str, order_id: str,
+                           client_order_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        for _ in range(self.max_retries + 1):
+            try:
+                res = await asyncio.wait_for(loop.run_in_executor(
+                    self._pools[broker], self.connectors[broker].cancel_order,
+                    order_id), timeout=self.timeout)
+            except Exception as e:
+                res = {"status": "rejected", "details": repr(e)}
+            if res.get("status") != "rejected":
+                break
+        log.info("late_order_cancel", extra={"_extra": {
+            "broker": broker, "order_id": order_id, "client_order_id": client_order_id,
+            "status": res.get("status"), "details": res.get("details")}})
+
+    def _event(self, inf: InFlight, status: str, details: str, call_ms: float) -> None:
+        """Log one BrokerEvent; never raises (it runs on the worker's error paths)."""
+        try:
+            now = time.perf_counter()
+            queue_ms = ((inf.t_dequeue or now) - inf.t_submit) * 1e3
+            ev = BrokerEvent(stage=inf.req.stage, broker=inf.broker,
+                             client_order_id=inf.req.client_order_id, status=status,
+                             details=details or None,
+                             timestamp=datetime.now(IST).isoformat(),
+                             latency_ms={"queue": round(queue_ms, 3),
+                                         "call": round(call_ms, 3),
+                                         "total": round((now - inf.t_submit) * 1e3, 3)})
+            log.info("broker_event",
+                     extra={"_extra": {"broker_event": ev.model_dump()}})
+        except Exception as e:
+            log.info("broker_event_error", extra={"_extra": {
+                "client_order_id": inf.req.client_order_id, "status": status,
+                "error": repr(e)}})
@@ -0,0 +1,391 @@
+# connectors/sim_broker.py
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+from connectors.base import BrokerConnector
+
+
+class _Order:
+    __slots__ = ("order_id", "symbol", "side", "price", "qty", "filled", "status",
+                 "seq", "ts", "tag")
+
+    def __init__(self, order_id: str, symbol: str, side: int, price: Optional[float],
+                 qty: int, filled: int, seq: int, ts: float) -> None:
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side            # +1 buy, -1 sell
+        self.price = price          # None = market
+        self.qty = qty
+        self.filled = filled
+        self.status = "open"        # open | complete | cancelled | replaced
+        self.seq = seq
+        self.ts = ts
+        self.tag: Optional[str] = None
+
+    @property
+    def remaining(self) -> int:
+        return self.qty - self.filled
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"order_id": self.order_id, "symbol": self.symbol,
+                "side": "BUY" if self.side > 0 else "SELL", "price": self.price,
+                "qty": self.qty, "filled_qty": self.filled, "status": self.status}
+
+
+class _Book:
+    """
+    One symbol: price level -> FIFO of resting orders; best prices from heaps with lazy
+    deletion.
+    """
+    __slots__ = ("levels", "heaps", "last", "volume")
+
+    def __init__(self) -> None:
+        self.levels: Dict[int, Dict[float, Deque[_Order]]] = {1: {}, -1: {}}
+        self.heaps: Dict[int, List[float]] = {1: [], -1: []}   # bids stored negated
+        self.last: Optional[float] = None
+        self.volume: Optional[float] = None                    # cumulative feed volume
+
+    def best(self, side: int) -> Optional[float]:
+        """
+        Best live price on `side`, dropping emptied levels and dead (cancelled/replaced)
+        heads.
+        """
+        levels, heap = self.levels[side], self.heaps[side]
+        while heap:
+            price = -heap[0] if side > 0 else heap[0]
+            q = levels.get(price)
+            while q and q[0].status != "open":
+                q.popleft()
+            if q:
+                return price
+            levels.pop(price, None)
+            heapq.heappop(heap)
+        return None
+
+    def rest(self, o: _Order) -> None:
+        q = self.levels[o.side].get(o.price)
+        if q is None:
+            q = self.levels[o.side][o.price] = deque()
+            heapq.heappush(self.heaps[o.side], -o.price if o.side > 0 else o.price)
+        q.append(o)
+
+
+class SimBroker(BrokerConnector):
+    """
+    In-process exchange + broker for load tests and dry runs (no network, no account).
+
+    Each symbol has a price-time-priority limit order book. An incoming order
+    first matches resting orders on the other side (best price, then oldest,
+    at the resting price); a LIMIT remainder rests, a MARKET remainder fills
+    against the outside market at the last traded price +/- `market_slippage`
+    (fraction), or is rejected before the first tick. Price changes and qty
+    increases lose time priority; a qty decrease keeps it.
+
+    Feed ticks (on_tick, or wrap a feed with SimFeed) are the outside market:
+    a trade at `ltp` fills resting buys priced >= ltp and sells <= ltp
+    (strictly through the price when fill_on_touch=False), best price and
+    time first, at the order's limit price. The traded qty per tick is the
+    cumulative-volume delta when the feed carries volume, else `tick_qty`
+    (None = unlimited).
+
+    Fault injection, per call: `latency` + U(0, `jitter`) seconds of blocking
+    delay (ExecutionEngine runs connectors in threads), rejection with
+    probability `reject_rate`, and a tick fill cut to a random part of the
+    order's remaining qty with probability `partial_rate`. `seed` makes runs
+    repeatable. Calls are thread-safe; fills go to on_fill(fill) outside the lock.
+
+    Finished (complete / cancelled) orders stay queryable by order() and
+    order_by_tag() for the newest `keep_done` of them; older ones are pruned
+    with their tags, so a long run keeps a bounded order map.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 reject_rate: float = 0.0, partial_rate: float = 0.0,
+                 market_slippage: float = 0.0, tick_qty: Optional[int] = None,
+                 fill_on_touch: bool = True, seed: Optional[int] = None,
+                 on_fill: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 keep_done: int = 10000) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.reject_rate = reject_rate
+        self.partial_rate = partial_rate
+        self.market_slippage = market_slippage
+        self.tick_qty = tick_qty
+        self.fill_on_touch = fill_on_touch
+        self.on_fill = on_fill
+        self.keep_done = keep_done
+        self.books: Dict[str, _Book] = {}
+        self.orders: Dict[str, _Order] = {}
+        self.tags: Dict[str, str] = {}            # client order id -> order_id
+        self._done: Deque[str] = deque()          # finished order ids, oldest first
+        self.clock: Optional[float] = None       # ts of the last tick
+        self.counts = {"placed": 0, "modified": 0, "cancelled": 0, "rejected": 0,
+                       "fills": 0, "filled_qty": 0}
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # -- helpers -----------------------------------------------------------------------
+
+    def _delay(self) -> None:
+        d = self.latency + (self._rng.uniform(0.0, self.jitter) if self.jitter else 0.0)
+        if d > 0:
+            time.sleep(d)
+
+    def _reject(self, details: str, order_id: Optional[str] = None) -> Dict[str, Any]:
+        self.counts["rejected"] += 1
+        return {"status": "rejected", "order_id": order_id, "details": details}
+
+    def _now(self) -> float:
+        return self.clock if self.clock is not None else time.time()
+
+    def _finish(self, o: _Order, status: str) -> None:
+        """
+        Mark `o` complete/cancelled and prune the oldest finished orders beyond
+        keep_done.
+        """
+        o.status = status
+        done = self._done
+        done.append(o.order_id)
+        while len(done) > self.keep_done:
+            old = self.orders.pop(done.popleft(), None)
+            if old is not None and old.tag is not None:
+                self.tags.pop(old.tag, None)
+
+    def _fill(self, o: _Order, qty: int, price: float, liquidity: str,
+              out: List[Dict[str, Any]]) -> None:
+        o.filled += qty
+        if o.filled >= o.qty:
+            self._finish(o, "complete")
+        self.counts["fills"] += 1
+        self.counts["filled_qty"] += qty
+        out.append({"order_id": o.order_id, "symbol": o.symbol,
+                    "side": "BUY" if o.side > 0 else "SELL", "qty": qty, "price": price,
+                    "liquidity": liquidity, "ts": self._now(), "filled_qty": o.filled,
+                    "status": o.status})
+
+    def _match(self, book: _Book, o: _Order, out: List[Dict[str, Any]]) -> None:
+        """
+        Cross `o` against the other side while prices overlap (resting order sets the
+        price).
+        """
+        other = -o.side
+        levels = book.levels[other]
+        while o.remaining > 0:
+            best = book.best(other)
+            if best is None or (o.price is not None and (best - o.price) * o.side > 0):
+                return
+            q = levels[best]
+            while q and o.remaining > 0:
+                r = q[0]
+                if r.status != "open":
+                    q.popleft()
+                    continue
+                n = min(o.remaining, r.remaining)
+                self._fill(r, n, best, "maker", out)
+                self._fill(o, n, best, "taker", out)
+                if r.status != "open":
+                    q.popleft()
+
+    def _emit(self, fills: List[Dict[str, Any]]) -> None:
+        if self.on_fill is not None:
+            for f in fills:
+                self.on_fill(f)
+
+    # -- BrokerConnector ---------------------------------------------------------------
+
+    def place_order(self, symbol: str, side: str, qty: int, price: Optional[float],
+                    order_type: str, tag: Optional[str] = None) -> Dict[str, Any]:
+        self._delay()
+        fills: List[Dict[str, Any]] = []
+        with self._lock:
+            if self.reject_rate and self._rng.random() < self.reject_rate:
+                return self._reject("sim_reject")
+            if side not in ("BUY", "SELL") or int(qty) <= 0:
+                return self._reject(f"bad order: side={side} qty={qty}")
+            if order_type == "LIMIT" and (price is None or price <= 0):
+                return self._reject("limit order without price")
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = _Book()
+            if (order_type == "MARKET" and book.last is None
+                    and book.best(-1 if side == "BUY" else 1) is None):
+                return self._reject("no market for symbol")
+            oid = f"SIM{next(self._ids)}"
+            o = _Order(oid, symbol, 1 if side == "BUY" else -1,
+                       float(price) if order_type == "LIMIT" else None, int(qty), 0,
+                       next(self._seq), self._now())
+            self.orders[oid] = o
+            if tag:
+                o.tag = tag
+                self.tags[tag] = oid
+            self.counts["placed"] += 1
+            self._match(book, o, fills)
+            if o.remaining > 0:
+                if o.price is None:
+                    if book.last is not None:
+                        self._fill(o, o.remaining,
+                                   book.last * (1.0 + self.market_slippage * o.side),
+                                   "market", fills)
+                    else:
+                        # book ran dry before any tick: what filled stands, the rest
+                        # is cancelled
+                        self._finish(o, "cancelled")
+                else:
+                    book.rest(o)
+        self._emit(fills)
+        return {"status": "acknowledged", "order_id": oid}
+
+    def modify_order(self, order_id: str, price: Optional[float] = None,
+                     qty: Optional[int] = None) -> Dict[str, Any]:
+        self._delay()
+        fills: List[Dict[str, Any]] = []
+        with self._lock:
+            o = self.orders.get(order_id)
+            if o is None:
+                return self._reject("unknown order_id", order_id)
+            if o.status != "open" or o.price is None:
+                return self._reject(f"order {o.status}", order_id)
+            if self.reject_rate and self._rng.random() < self.reject_rate:
+                return self._reject("sim_reject", order_id)
+            new_qty = o.qty if qty is None else int(qty)
+            new_price = o.price if price is None else float(price)
+            if new_qty <= o.filled or new_price <= 0:
+                return self._reject(
+                    f"bad modify: qty={qty} filled={o.filled} price={price}", order_id)
+            self.counts["modified"] += 1
+            if new_price == o.price and new_qty <= o.qty:
+                o.qty = new_qty     # reduce in place, keeps queue position
+            else:
+                o.status = "replaced"
+                tag = o.tag
+                o = self.orders[order_id] = _Order(order_id, o.symbol, o.side,
+                                                   new_price, new_qty, o.filled,
+                                                   next(self._seq), self._now())
+                o.tag = tag
+                book = self.books[o.symbol]
+                self._match(book, o, fills)
+                if o.remaining > 0:
+                    book.rest(o)
+        self._emit(fills)
+        return {"status": "acknowledged", "order_id": order_id}
+
+    def cancel_order(self, order_id: str) -> Dict[str, Any]:
+        self._delay()
+        with self._lock:
+            o = self.orders.get(order_id)
+            if o is None:
+                return self._reject("unknown order_id", order_id)
+            if o.status != "open":
+                return self._reject(f"order {o.status}", order_id)
+            if self.reject_rate and self._rng.random() < self.reject_rate:
+                return self._reject("sim_reject", order_id)
+            self._finish(o, "cancelled")      # unlinked from its level lazily
+            self.counts["cancelled"] += 1
+        return {"status": "acknowledged", "order_id": order_id}
+
+    # -- market data -------------------------------------------------------------------
+
+    def on_tick(self, symbol: str, ltp: float, ts: float,
+                volume: Optional[float] = None) -> int:
+        """Trade the book against one feed tick; returns the qty filled."""
+        fills: List[Dict[str, Any]] = []
+        done = 0
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = _Book()
+            self.clock = ts
+            book.last = ltp
+            if volume is not None:
+                avail = (max(volume - book.volume, 0.0) if book.volume is not None
+                         else 0.0)
+                book.volume = volume
+            else:
+                avail = self.tick_qty if self.tick_qty is not None else float("inf")
+            for side in (1, -1):
+                while avail - done >= 1:
+                    best = book.best(side)
+                    if best is None:
+                        break
+                    gap = (best - ltp) * side
+                    if gap < 0 or (gap == 0 and not self.fill_on_touch):
+                        break
+                    q = book.levels[side][best]
+                    for o in q:
+                        if avail - done < 1:
+                            break
+                        if o.status != "open":
+                            continue
+                        n = o.remaining
+                        if self.partial_rate and self._rng.random() < self.partial_rate:
+                            n = self._rng.randint(1, n)
+                        n = int(min(n, avail - done))
+                        self._fill(o, n, best, "tick", fills)
+                        done += n
+                    while q and q[0].status != "open":
+                        q.popleft()
+                    if q:
+                        # level not cleared (volume ran out or a fill was cut): worse
+                        # prices wait
+                        break
+        self._emit(fills)
+        return done
+
+    # -- views -------------------------------------------------------------------------
+
+    def order_by_tag(self, tag: str) -> Optional[Dict[str, Any]]:
+        oid = self.tags.get(tag)
+        return {"status": "acknowledged", "order_id": oid} if oid is not None else None
+
+    def order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        o = self.orders.get(order_id)
+        return o.as_dict() if o is not None else None
+
+    def depth(self, symbol: str, levels: int = 5) -> Dict[str, List[Tuple[float, int]]]:
+        """Top `levels` (price, open qty) per side."""
+        book = self.books.get(symbol)
+        out: Dict[str, List[Tuple[float, int]]] = {"bids": [], "asks": []}
+        if book is None:
+            return out
+        with self._lock:
+            for side, key in ((1, "bids"), (-1, "asks")):
+                prices = sorted(book.levels[side], reverse=side > 0)
+                for p in prices:
+                    qty = sum(o.remaining for o in book.levels[side][p]
+                              if o.status == "open")
+                    if qty:
+                        out[key].append((p, qty))
+                        if len(out[key]) == levels:
+                            break
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts,
+                    open=sum(1 for o in self.orders.values() if o.status == "open"))
+
+
+class SimFeed:
+    """
+    Feed wrapper that trades every tick through a SimBroker before handing it on (same
+    interface as the feed).
+    """
+
+    def __init__(self, feed: Any, broker: SimBroker) -> None:
+        self.feed = feed
+        self.broker = broker
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.feed, name)
+
+    async def ticks(self) -> AsyncIterator[Dict[str, Any]]:
+        on_tick = self.broker.on_tick
+        async for tick in self.feed.ticks():
+            on_tick(tick["symbol"], float(tick["ltp"]), float(tick["ts"]),
+                    tick.get("volume"))
+            yield tick
@@ -0,0 +1,166 @@
+from datetime import datetime, time
+from typing import Dict, Any, Optional, Union
+import numpy as np
+from utils.instruments import IST
+
+RISK_FREE_RATE = 0.065          # annualized, continuous
+EXPIRY_TIME = time(15, 30)      # IST
+YEAR_SECONDS = 365.0 * 86400
+_SQRT_2PI = np.sqrt(2.0 * np.pi)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """
+    Standard normal CDF, double precision (Hart 1968 / West 2005), vectorized.
+    Avoids a SciPy dependency for the erf.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    a = np.abs(x)
+    e = np.exp(-a * a / 2.0)
+    # |x| < 7.07
+    n = ((((((0.0352624965998911 * a + 0.700383064443688) * a + 6.37396220353165) * a
+            + 33.912866078383) * a + 112.079291497871) * a
+          + 221.213596169931) * a + 220.206867912376)
+    d = (((((((0.0883883476483184 * a + 1.75566716318264) * a + 16.064177579207) * a
+             + 86.7807322029461) * a + 296.564248779674) * a + 637.333633378831) * a
+          + 793.826512519948) * a + 440.413735824752)
+    near = e * n / d
+    # 7.07 <= |x| < 37
+    b = a + 0.65
+    b = a + 1.0 / (a + 2.0 / (a + 3.0 / (a + 4.0 / b)))
+    far = e / b / 2.506628274631
+    tail = np.where(a < 7.07106781186547, near, np.where(a < 37.0, far, 0.0))
+    return np.where(x > 0, 1.0 - tail, tail)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def _d1d2(S, K, T, r, sigma):
+    vt = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vt
+    return d1, d1 - vt
+
+
+def bs_price(S, K, T, r, sigma, is_call) -> np.ndarray:
+    """Black-Scholes price; all inputs broadcast (is_call: bool array)."""
+    d1, d2 = _d1d2(S, K, T, r, sigma)
+    df = np.exp(-r * T)
+    call = S * norm_cdf(d1) - K * df * norm_cdf(d2)
+    put = K * df * norm_cdf(-d2) - S * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_vol(price, S, K, T, r, is_call, lo: float = 1e-4, hi: float = 5.0,
+                tol: float = 1e-8, max_iter: int = 100,
+                min_price: float = 0.05) -> np.ndarray:
+    """
+    Vectorized IV: Newton steps safeguarded by a bisection bracket (falls
+    back to bisection whenever Newton leaves [lo, hi] or vega vanishes).
+    NaN where time value is below `min_price` (one tick; IV is unidentifiable
+    there - use the OTM side of the strike), outside no-arbitrage bounds, or T <= 0.
+    """
+    price, S, K, T, is_call = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (price, S, K, T, is_call)))
+    is_call = is_call.astype(bool)
+    df = np.exp(-r * np.maximum(T, 0.0))
+    intrinsic = np.where(is_call, np.maximum(S - K * df, 0.0),
+                         np.maximum(K * df - S, 0.0))
+    upper = np.where(is_call, S, K * df)
+    ok = (T > 0) & (price - intrinsic >= min_price) & (price < upper)
+
+    lo_a = np.full(price.shape, lo)
+    hi_a = np.full(price.shape, hi)
+    sigma = np.full(price.shape, 0.2)
+    active = ok.copy()
+    Tc = np.where(ok, T, 1.0)     # keep inactive lanes finite
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        d1, _d2 = _d1d2(S, K, Tc, r, sigma)
+        diff = bs_price(S, K, Tc, r, sigma, is_call) - price
+        vega = S * norm_pdf(d1) * np.sqrt(Tc)
+        # shrink the bracket using the sign of the pricing error
+        hi_a = np.where(active & (diff > 0), sigma, hi_a)
+        lo_a = np.where(active & (diff <= 0), sigma, lo_a)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = sigma - diff / vega
+        bad = ~np.isfinite(newton) | (newton <= lo_a) | (newton >= hi_a)
+        nxt = np.where(bad, 0.5 * (lo_a + hi_a), newton)
+        done = (np.abs(diff) < tol) | (np.abs(nxt - sigma) < tol)
+        sigma = np.where(active, nxt, sigma)
+        active &= ~done
+    return np.where(ok, sigma, np.nan)
+
+
+def bs_greeks(S, K, T, r, sigma, is_call) -> Dict[str, np.ndarray]:
+    """delta, gamma, vega (per 1.00 vol), theta (per calendar day)."""
+    d1, d2 = _d1d2(S, K, T, r, sigma)
+    sqrt_t = np.sqrt(T)
+    pdf = norm_pdf(d1)
+    df = np.exp(-r * T)
+    delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+    gamma = pdf / (S * sigma * sqrt_t)
+    vega = S * pdf * sqrt_t
+    decay = -S * pdf * sigma / (2.0 * sqrt_t)
+    theta = np.where(is_call, decay - r * K * df * norm_cdf(d2),
+                     decay + r * K * df * norm_cdf(-d2)) / 365.0
+    return {"delta": delta, "gamma": gamma, "vega": vega, "theta": theta}
+
+
+def years_to_expiry(expiry: Union[np.ndarray, str], now: datetime) -> np.ndarray:
+    """
+    Year fractions from `now` (tz-aware, any zone; naive is taken as IST) to expiry
+    date(s) at 15:30 IST.
+    """
+    exp = np.atleast_1d(np.asarray(expiry, dtype="datetime64[D]"))
+    if now.tzinfo is not None:
+        now = now.astimezone(IST)
+    now_naive = np.datetime64(now.replace(tzinfo=None), "s")
+    close = (exp.astype("datetime64[s]")
+             + np.timedelta64(EXPIRY_TIME.hour * 3600 + EXPIRY_TIME.minute * 60, "s"))
+    return np.maximum((close - now_naive).astype(np.float64), 0.0) / YEAR_SECONDS
+
+
+def chain_greeks(spot: float, strikes: np.ndarray, T: np.ndarray, prices: np.ndarray,
+                 is_call: np.ndarray,
+                 r: float = RISK_FREE_RATE) -> Dict[str, np.ndarray]:
+    """
+    IV + greeks for a whole chain in one pass. `strikes`, `T` (years), `prices`
+    and `is_call` are flat arrays of equal length (one row per contract).
+    """
+    iv = implied_vol(prices, spot, strikes, T, r, is_call)
+    sigma = np.where(np.isfinite(iv), iv, 0.2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g = bs_greeks(spot, strikes, np.maximum(T, 1e-9), r, sigma, is_call)
+    for k in g:
+        g[k] = np.where(np.isfinite(iv), g[k], np.nan)
+    g["iv"] = iv
+    return g
+
+
+def greeks_row(g: Dict[str, np.ndarray], i: int) -> Dict[str, Optional[float]]:
+    """One contract's greeks as a TradeDecision.greeks / audit dict (None for NaN)."""
+    return {k: (float(v[i]) if np.isfinite(v[i]) else None) for k, v in g.items()}
+
+
+def strike_for_delta(strikes: np.ndarray, deltas: np.ndarray,
+                     target: float) -> Optional[float]:
+    """Strike whose |delta| is closest to `target` (e.g. 0.5 for ATM, 0.3 for OTM)."""
+    d = np.abs(np.abs(deltas) - abs(target))
+    if not np.isfinite(d).any():
+        return None
+    return float(strikes[int(np.nanargmin(d))])
+
+
+def contract_greeks(spot: float, strike: float, expiry: str, now: datetime,
+                    option_ltp: Any, option_type: str = "CE",
+                    r: float = RISK_FREE_RATE) -> Dict[str, Optional[float]]:
+    """Greeks for a single contract (all None when the option price is unknown)."""
+    if not option_ltp:
+        return {"delta": None, "gamma": None, "vega": None, "theta": None, "iv": None}
+    g = chain_greeks(spot, np.array([float(strike)]), years_to_expiry(expiry, now),
+                     np.array([float(option_ltp)]),
+                     np.array([option_type.upper() == "CE"]), r)
+    return greeks_row(g, 0)
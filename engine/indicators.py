@@ -1,4 +1,5 @@
 from typing import List, Tuple
+import numpy as np
 
 def calc_vwap(prices: List[float], volumes: List[float]) -> float:
     assert len(prices) == len(volumes) and prices, "prices/volumes mismatch"
@@ -7,7 +8,312 @@ def calc_vwap(prices: List[float], volumes: List[float]) -> float:
     return num / den if den else prices[-1]
 
 def calc_cpr(ph: float, pl: float, pc: float) -> Tuple[float, float, float]:
+    # works element-wise when given NumPy arrays (backtest batch path)
     pivot = (ph + pl + pc) / 3.0
     bc = (ph + pl) / 2.0
     tc = 2 * pivot - bc
     return bc, pivot, tc
+
+
+# -- Batch versions for backtests ---------------------------------------------
+
+
+def session_starts(session_ids: np.ndarray) -> np.ndarray:
+    """Indices where a new session begins (session_ids must be sorted)."""
+    if len(session_ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, session_ids[1:] != session_ids[:-1]])
+
+
+def session_vwap(prices: np.ndarray, volumes: np.ndarray,
+                 starts: np.ndarray) -> np.ndarray:
+    """
+    Running VWAP reset at each session start. Equals calc_vwap() over the
+    session prefix at every bar (same summation order, so bit-identical).
+    """
+    out = np.empty(len(prices), dtype=np.float64)
+    bounds = np.r_[starts, len(prices)]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        num = np.cumsum(prices[a:b] * volumes[a:b])
+        den = np.cumsum(volumes[a:b])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[a:b] = np.where(den != 0, num / den, prices[a:b])
+    return out
+
+
+def session_hlc(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-session high/low/close (one value per session)."""
+    ends = np.r_[starts[1:], len(close)] - 1
+    return (np.maximum.reduceat(high, starts), np.minimum.reduceat(low, starts),
+            close[ends])
+
+
+# -- Streaming versions for the live loop ----------------------------------------
+
+
+class RunningVWAP:
+    """O(1) incremental VWAP; same result as calc_vwap() over all updates so far."""
+    __slots__ = ("num", "den", "last")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.num = 0.0
+        self.den = 0.0
+        self.last = None
+
+    def update(self, price: float, volume: float) -> float:
+        self.num += price * volume
+        self.den += volume
+        self.last = price
+        return self.value
+
+    @property
+    def value(self) -> float | None:
+        return self.num / self.den if self.den else self.last
+
+
+# -- Recursive indicators (EMA / Wilder ATR / RSI / SuperTrend) --------------------
+#
+# Each indicator has a batch function over NumPy arrays for backtests and an
+# O(1) streaming class for the live loop. The EMA/RMA recurrence behind ema(),
+# atr() and rsi() is evaluated blockwise with NumPy (_decay_scan), so it
+# agrees with the streaming update() to rounding (~1e-12 relative), not
+# bit-for-bit; NaN in the batch output where the streaming value is None, i.e.
+# during warm-up. supertrend() keeps one sequential pass over Python floats
+# (~1 us/bar): its bands ratchet on their own previous value, which has no
+# closed form. tests/test_indicators.py checks the parity.
+
+_SCAN_BLOCK = 64
+
+
+def _decay_scan(x: np.ndarray, alpha: float, v0: float) -> np.ndarray:
+    """
+    v[i] = v[i-1] + alpha * (x[i] - v[i-1]) with v[-1] = v0. Within a block of
+    _SCAN_BLOCK values this is a product with the kernel alpha * d**(i - j),
+    d = 1 - alpha; only the carry from one block to the next is sequential.
+    """
+    n, m = len(x), _SCAN_BLOCK
+    d = 1.0 - alpha
+    k = np.arange(m)
+    lag = k[:, None] - k[None, :]
+    kernel = np.where(lag >= 0, alpha * d ** np.maximum(lag, 0), 0.0)
+    blocks = np.zeros((-(-n // m), m))
+    blocks.ravel()[:n] = x
+    y = blocks @ kernel.T
+    carry = np.empty(len(y))
+    c, dm = v0, d ** m
+    for b, end in enumerate(y[:, -1].tolist()):
+        carry[b] = c
+        c = dm * c + end
+    y += carry[:, None] * d ** (k + 1)
+    return y.ravel()[:n]
+
+
+def _smooth(x: np.ndarray, out: np.ndarray, period: int, alpha: float,
+            first: int = 0) -> None:
+    """
+    SMA seed over x[first:first+period], then v += alpha * (x - v). Fills
+    out[first+period-1:]; NaN from the first non-finite input on.
+    """
+    s = first + period - 1
+    if len(x) <= s:
+        return
+    out[s] = v = x[first:s + 1].sum() / period
+    rest = x[s + 1:]
+    bad = np.flatnonzero(~np.isfinite(rest))
+    m = int(bad[0]) if len(bad) else len(rest)
+    if m:
+        out[s + 1:s + 1 + m] = _decay_scan(rest[:m], alpha, v)
+    out[s + 1 + m:] = np.nan
+
+
+def ema(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    EMA (alpha = 2 / (period + 1)) seeded with the SMA of the first `period` values.
+    """
+    out = np.full(len(x), np.nan)
+    _smooth(np.asarray(x, dtype=np.float64), out, period, 2.0 / (period + 1))
+    return out
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """True range; the first bar (no previous close) uses high - low."""
+    tr = high - low
+    if len(close) > 1:
+        pc = close[:-1]
+        tr[1:] = np.maximum(tr[1:],
+                            np.maximum(np.abs(high[1:] - pc), np.abs(low[1:] - pc)))
+    return tr
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+        period: int = 14) -> np.ndarray:
+    """Wilder ATR (RMA of true range); NaN for the first period - 1 bars."""
+    out = np.full(len(close), np.nan)
+    _smooth(true_range(high, low, close), out, period, 1.0 / period)
+    return out
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Wilder RSI; NaN until `period` price changes are seen. Flat markets read 50."""
+    n = len(close)
+    out = np.full(n, np.nan)
+    if n <= period:
+        return out
+    d = np.diff(close)
+    ag, al = np.full(n, np.nan), np.full(n, np.nan)
+    _smooth(np.r_[0.0, np.where(d > 0, d, 0.0)], ag, period, 1.0 / period, first=1)
+    _smooth(np.r_[0.0, np.where(d < 0, -d, 0.0)], al, period, 1.0 / period, first=1)
+    s = ag + al
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[period:] = np.where(s[period:] != 0, 100.0 * ag[period:] / s[period:], 50.0)
+    return out
+
+
+def supertrend(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 10,
+               multiple: float = 3.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    SuperTrend line and direction (+1 up / -1 down, 0 during warm-up).
+    The line is the ATR trailing stop: the lower band while up, the upper band while
+    down.
+    """
+    n = len(close)
+    line, direction = np.full(n, np.nan), np.zeros(n, dtype=np.int8)
+    a = atr(high, low, close, period)
+    hl2 = (high + low) / 2
+    ub, lb = (hl2 + multiple * a).tolist(), (hl2 - multiple * a).tolist()
+    cl = close.tolist()
+    up = dn = None
+    trend = 0
+    for i in range(period - 1, n):
+        if trend == 0:
+            up, dn, trend = lb[i], ub[i], 1
+        else:
+            pu, pd = up, dn
+            up = max(lb[i], pu) if cl[i - 1] > pu else lb[i]
+            dn = min(ub[i], pd) if cl[i - 1] < pd else ub[i]
+            if trend == -1 and cl[i] > pd:
+                trend = 1
+            elif trend == 1 and cl[i] < pu:
+                trend = -1
+        line[i] = up if trend == 1 else dn
+        direction[i] = trend
+    return line, direction
+
+
+class EMA:
+    """O(1) streaming ema(); value is None during warm-up."""
+    __slots__ = ("period", "alpha", "n", "acc", "value")
+
+    def __init__(self, period: int, alpha: float | None = None) -> None:
+        self.period = period
+        self.alpha = 2.0 / (period + 1) if alpha is None else alpha
+        self.reset()
+
+    def reset(self) -> None:
+        self.n = 0
+        self.acc = 0.0
+        self.value = None
+
+    def update(self, x: float) -> float | None:
+        v = self.value
+        if v is None:
+            self.acc += x
+            self.n += 1
+            if self.n == self.period:
+                self.value = self.acc / self.period
+            return self.value
+        self.value = v + self.alpha * (x - v)
+        return self.value
+
+
+def RMA(period: int) -> EMA:
+    """Wilder's moving average (alpha = 1 / period)."""
+    return EMA(period, 1.0 / period)
+
+
+class ATR:
+    """O(1) streaming atr(); feed finished bars."""
+    __slots__ = ("rma", "prev_close")
+
+    def __init__(self, period: int = 14) -> None:
+        self.rma = RMA(period)
+        self.prev_close = None
+
+    def reset(self) -> None:
+        self.rma.reset()
+        self.prev_close = None
+
+    def update(self, high: float, low: float, close: float) -> float | None:
+        pc = self.prev_close
+        tr = high - low
+        if pc is not None:
+            tr = max(tr, max(abs(high - pc), abs(low - pc)))
+        self.prev_close = close
+        return self.rma.update(tr)
+
+    @property
+    def value(self) -> float | None:
+        return self.rma.value
+
+
+class RSI:
+    """O(1) streaming rsi()."""
+    __slots__ = ("gain", "loss", "prev", "value")
+
+    def __init__(self, period: int = 14) -> None:
+        self.gain = RMA(period)
+        self.loss = RMA(period)
+        self.prev = None
+        self.value = None
+
+    def update(self, close: float) -> float | None:
+        prev, self.prev = self.prev, close
+        if prev is None:
+            return None
+        d = close - prev
+        ag = self.gain.update(d if d > 0 else 0.0)
+        al = self.loss.update(-d if d < 0 else 0.0)
+        if ag is not None:
+            s = ag + al
+            self.value = 100.0 * ag / s if s != 0 else 50.0
+        return self.value
+
+
+class SuperTrend:
+    """
+    O(1) streaming supertrend(); value is the trailing-stop line, direction +1 / -1 (0
+    in warm-up).
+    """
+    __slots__ = ("multiple", "atr", "up", "dn", "direction", "prev_close", "value")
+
+    def __init__(self, period: int = 10, multiple: float = 3.0) -> None:
+        self.multiple = multiple
+        self.atr = ATR(period)
+        self.up = self.dn = None
+        self.direction = 0
+        self.prev_close = None
+        self.value = None
+
+    def update(self, high: float, low: float, close: float) -> float | None:
+        a = self.atr.update(high, low, close)
+        pc, self.prev_close = self.prev_close, close
+        if a is None:
+            return None
+        hl2 = (high + low) / 2
+        ub, lb = hl2 + self.multiple * a, hl2 - self.multiple * a
+        if self.direction == 0:
+            self.up, self.dn, self.direction = lb, ub, 1
+        else:
+            pu, pd = self.up, self.dn
+            self.up = max(lb, pu) if pc > pu else lb
+            self.dn = min(ub, pd) if pc < pd else ub
+            if self.direction == -1 and close > pd:
+                self.direction = 1
+            elif self.direction == 1 and close < pu:
+                self.direction = -1
+        self.value = self.up if self.direction == 1 else self.dn
+        return self.value
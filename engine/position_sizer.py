@@ -1,6 +1,7 @@
 from typing import Tuple
 from utils.instruments import get_instrument
 import math
+import numpy as np
 
 def lots_for_risk(index: str, capital: float, per_trade_risk_pct: float, stop_pts: float, point_value: float) -> Tuple[int, float]:
     """
@@ -13,3 +14,15 @@ def lots_for_risk(index: str, capital: float, per_trade_risk_pct: float, stop_pt
     lots = math.floor(risk_budget / per_lot_risk) if per_lot_risk > 0 else 0
     lots = max(lots, 0)
     return lots, risk_budget
+
+
+def lots_for_risk_batch(index: str, capital: float, per_trade_risk_pct: float,
+                        stop_pts: np.ndarray,
+                        point_value: float) -> Tuple[np.ndarray, float]:
+    """Vectorized lots_for_risk() over an array of stop distances."""
+    inst = get_instrument(index)
+    risk_budget = capital * per_trade_risk_pct
+    per_lot_risk = stop_pts * inst.lot_size * point_value
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lots = np.where(per_lot_risk > 0, np.floor(risk_budget / per_lot_risk), 0)
+    return np.maximum(lots, 0).astype(np.int64), risk_budget
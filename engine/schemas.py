@@ -1,5 +1,8 @@
+import sys
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field, validator, conint, confloat
-from typing import List, Optional, Literal, Dict
+from typing import List, Optional, Literal, Dict, Any
+from utils.logger import dumps
 
 class Greeks(BaseModel):
     delta: Optional[confloat(ge=-1, le=1)] = None
@@ -36,12 +39,16 @@ class NoTrade(BaseModel):
     backtest: Optional[bool] = False
 
 class BrokerEvent(BaseModel):
-    stage: Literal["place","modify","cancel"]
-    broker: Literal["angel_one","zerodha_kite","upstox"]
+    stage: Literal["place", "modify", "cancel"]
+    # connector name as registered with ExecutionEngine (angel_one, sim, ...)
+    broker: str
     client_order_id: str
-    status: Literal["acknowledged","rejected","timeout","failover_triggered"]
+    status: Literal["acknowledged","rejected","timeout","failover_triggered","cancelled"]
     details: Optional[str] = None
     timestamp: str
+    # e.g. {"queue":.., "call":.., "total":..}
+    latency_ms: Optional[Dict[str, float]] = None
+
 
 class AgentEvent(BaseModel):
     type: Literal["config_error","heartbeat_lag","vol_spike_halt","cooldown_active","failover_complete"]
@@ -58,3 +65,71 @@ class AuditSnapshot(BaseModel):
     risk_state: Dict[str, object]
     timestamp: str
     debug: Optional[Dict[str, object]] = None
+
+
+# -- Fast path for per-tick emission ---------------------------------------------
+# Slotted records with no validation and no model construction; as_dict() is a
+# plain dict build and to_json() goes straight to the log encoder. Anything that
+# crosses a trust boundary (broker orders, external input) must go through
+# validated(), which runs the strict pydantic models above.
+
+
+_EMPTY_GREEKS = {"delta": None, "vega": None, "gamma": None, "theta": None, "iv": None}
+# keep the model's key order
+_TRADE_DECISION_FIELDS = tuple(TradeDecision.model_fields)
+# dataclass(slots=True) needs Python 3.10; CI runs 3.9, where these stay plain
+# dataclasses (same fields and behaviour, just a per-instance __dict__)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
+class NoTradeEvent:
+    reason: str
+    timestamp: str
+    backtest: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"reason": self.reason, "timestamp": self.timestamp,
+                "backtest": self.backtest}
+
+    def to_json(self) -> str:
+        return dumps(self.as_dict())
+
+    def validated(self) -> NoTrade:
+        return NoTrade.model_validate(self.as_dict())
+
+
+@dataclass(**_SLOTS)
+class TradeDecisionEvent:
+    index: str
+    action: str
+    strike: int
+    option_type: str
+    expiry: str
+    entry_type: str
+    entry: float
+    stop_loss: float
+    lots: int
+    confidence_pct: int
+    risk_check: str
+    broker: str
+    reason: str
+    timestamp: str
+    tsl: Optional[str] = None
+    target: Optional[float] = None
+    r_multiple: Optional[float] = None
+    signal_stack: List[str] = field(default_factory=list)
+    greeks: Dict[str, Any] = field(default_factory=dict)
+    backtest: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in _TRADE_DECISION_FIELDS}
+        d["greeks"] = {**_EMPTY_GREEKS, **self.greeks}
+        return d
+
+    def to_json(self) -> str:
+        return dumps(self.as_dict())
+
+    def validated(self) -> TradeDecision:
+        """Strict check; required before anything is sent to a broker."""
+        return TradeDecision.model_validate(self.as_dict())
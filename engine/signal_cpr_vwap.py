@@ -1,4 +1,7 @@
 from typing import Dict, Any
+import numpy as np
+
+STRENGTH = 75
 
 def detect(index: str, ltp: float, vwap: float, cpr: Dict[str, float], params: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -8,5 +11,14 @@ def detect(index: str, ltp: float, vwap: float, cpr: Dict[str, float], params: D
     above_vwap = ltp > vwap
     above_tc = ltp > cpr["tc"]
     if params.get("require_above_vwap_for_longs", True) and above_vwap and above_tc:
-        return {"side": "LONG", "strength": 75, "explain": "above VWAP & above CPR-TC"}
+        return {"side": "LONG", "strength": STRENGTH,
+                "explain": "above VWAP & above CPR-TC"}
     return {"side": None, "strength": 0, "explain": "no cpr/vwap alignment"}
+
+
+def detect_batch(ltp: np.ndarray, vwap: np.ndarray, tc: np.ndarray,
+                 params: Dict[str, Any]) -> np.ndarray:
+    """Vectorized detect(): boolean LONG mask per bar (backtest path)."""
+    if not params.get("require_above_vwap_for_longs", True):
+        return np.zeros(len(ltp), dtype=bool)
+    return (ltp > vwap) & (ltp > tc)
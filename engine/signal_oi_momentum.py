@@ -1,14 +1,35 @@
-from typing import Dict, Any
-from engine.schemas import TradeDecision, Greeks
+from typing import Dict, Any, Optional
+import numpy as np
 from utils.logger import log
 
-def detect(index: str, oc: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+STRENGTH = 70
+
+
+def detect(index: str, oc: Dict[str, Any], params: Dict[str, Any],
+           oi: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
     """
     Returns a signal dict with fields:
     { 'side': 'LONG'|'SHORT'|None, 'strength': 0-100, 'explain': str }
+    `oi` is OIStore.stats() for the index: LONG when aggregate CE OI fell by at
+    least min_oi_delta_5m_pct over 5 minutes (call writers covering). Until the
+    store has 5 minutes of history, the snapshot's oi_trend label is used.
     """
     min_oi_delta = float(params.get("min_oi_delta_5m_pct", 5.0))
-    # TODO: use real OI deltas. Here we mock a pass.
-    side = "LONG" if oc.get("oi_trend","").startswith("CE_unwind") else None
-    strength = 70 if side else 0
-    return {"side": side, "strength": strength, "explain": f"oi_delta>=~{min_oi_delta}%, trend={oc.get('oi_trend')}"}
+    ce_chg = oi.get("ce_oi_chg_5m_pct") if oi else None
+    if ce_chg is None:
+        trend = oc.get("oi_trend") or ""
+        side = "LONG" if trend.startswith("CE_unwind") else None
+        strength = STRENGTH if side else 0
+        return {"side": side, "strength": strength,
+                "explain": f"oi_delta>=~{min_oi_delta}%, trend={oc.get('oi_trend')}"}
+    side = "LONG" if ce_chg <= -min_oi_delta else None
+    pe_chg = oi.get("pe_oi_chg_5m_pct")
+    pe = f"{pe_chg:+.2f}%" if pe_chg is not None else "n/a"
+    return {"side": side, "strength": STRENGTH if side else 0,
+            "explain": (f"ce_oi_5m={ce_chg:+.2f}% (unwind>={min_oi_delta}%), "
+                        f"pe_oi_5m={pe}, pcr={oi.get('pcr')}")}
+
+
+def detect_batch(oi_trend: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+    """Vectorized detect(): boolean LONG mask per bar (backtest path)."""
+    return np.char.startswith(oi_trend.astype(str), "CE_unwind")
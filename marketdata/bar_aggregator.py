@@ -0,0 +1,220 @@
+# marketdata/bar_aggregator.py
+from datetime import datetime, timedelta
+from typing import Dict, Any, Tuple, Iterable, Optional
+import numpy as np
+from engine.indicators import ATR, RunningVWAP, calc_cpr
+from utils.instruments import HISTORY_TOKENS, IST
+from utils.logger import log
+
+# Bar columns in BarRing rows
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+DEFAULT_TIMEFRAMES = (60, 300, 900)   # 1m / 5m / 15m, in seconds
+_IST_OFFSET = 5 * 3600 + 30 * 60
+_DAY = 86400
+
+
+class BarRing:
+    """
+    Fixed-capacity ring of finished OHLCV bars backed by one float64 array.
+    Each row is written twice (i and i+cap) so the latest `cap` bars are
+    always one contiguous slice: view() returns a NumPy view, never a copy.
+    """
+    __slots__ = ("cap", "buf", "n", "_i")
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.cap = capacity
+        self.buf = np.zeros((2 * capacity, 6), dtype=np.float64)
+        self.n = 0
+        self._i = 0
+
+    def append(self, row: Iterable[float]) -> None:
+        i = self._i
+        self.buf[i] = row
+        self.buf[i + self.cap] = self.buf[i]
+        self._i = (i + 1) % self.cap
+        if self.n < self.cap:
+            self.n += 1
+
+    def view(self, last: int | None = None) -> np.ndarray:
+        """Read-only view of the most recent `last` bars (oldest first)."""
+        k = self.n if last is None else min(last, self.n)
+        end = self._i + self.cap if self.n == self.cap else self._i
+        v = self.buf[end - k:end]
+        v.flags.writeable = False
+        return v
+
+    def __len__(self) -> int:
+        return self.n
+
+
+class BarAggregator:
+    """
+    Incremental tick -> multi-timeframe OHLCV aggregator for one symbol.
+    Also keeps session VWAP, day high/low, previous-session HLC (for CPR) and a
+    Wilder ATR over finished `atr_tf` bars (for stops; not reset per session).
+    Sessions are IST calendar days. Each tick is O(1).
+
+    Tick volume: a cumulative day `volume` field (broker style) is differenced;
+    ticks without volume (index LTP feeds) count with weight 1.
+    """
+
+    def __init__(self, symbol: str, timeframes: Tuple[int, ...] = DEFAULT_TIMEFRAMES,
+                 capacity: int = 1024, atr_period: int = 14, atr_tf: int = 60) -> None:
+        self.symbol = symbol
+        self.timeframes = tuple(timeframes)
+        if atr_tf not in self.timeframes:
+            raise ValueError(
+                f"atr_tf {atr_tf}s is not one of the timeframes {self.timeframes}")
+        self.atr_tf = atr_tf
+        self._atr = ATR(atr_period)
+        self._rings = {tf: BarRing(capacity) for tf in self.timeframes}
+        self._forming: Dict[int, list] = {}      # tf -> [bucket, o, h, l, c, v]
+        self._vwap = RunningVWAP()
+        self._day = None
+        self._cum_vol = None
+        self.day_high = None
+        self.day_low = None
+        self.last = None
+        self.prev_hlc: Tuple[float, float, float] | None = None
+
+    def seed_prev_session(self, high: float, low: float, close: float) -> None:
+        """Provide previous-session HLC at startup (e.g. from broker history)."""
+        self.prev_hlc = (float(high), float(low), float(close))
+
+    def seed_bars(self, rows: Iterable[Iterable[float]]) -> None:
+        """
+        Finished `atr_tf` bars (ts, o, h, l, c, v) from broker history, oldest first:
+        appended to that timeframe's ring and fed to the ATR, so stops are sized
+        from the first tick instead of after `atr_period` live bars.
+        """
+        ring = self._rings[self.atr_tf]
+        for r in rows:
+            r = tuple(r)[:6]
+            ring.append(r)
+            self._atr.update(r[HIGH], r[LOW], r[CLOSE])
+
+    def _roll_session(self, day: int) -> None:
+        if self._day is not None and self.last is not None:
+            self.prev_hlc = (self.day_high, self.day_low, self.last)
+            for tf in self.timeframes:
+                self._close_bar(tf)
+        self._day = day
+        self._vwap.reset()
+        self._cum_vol = None
+        self.day_high = self.day_low = None
+
+    def _close_bar(self, tf: int) -> None:
+        b = self._forming.pop(tf, None)
+        if b is not None:
+            self._rings[tf].append(b)
+            if tf == self.atr_tf:
+                self._atr.update(b[HIGH], b[LOW], b[CLOSE])
+
+    def on_tick(self, tick: Dict[str, Any]) -> Tuple[int, ...]:
+        """Consume one tick; returns the timeframes whose bar just closed."""
+        ts = float(tick["ts"])
+        px = float(tick["ltp"])
+        day = int((ts + _IST_OFFSET) // _DAY)
+        if day != self._day:
+            self._roll_session(day)
+
+        cum = tick.get("volume")
+        if cum is None:
+            qty = 1.0
+        else:
+            cum = float(cum)
+            qty = (cum - self._cum_vol
+                   if self._cum_vol is not None and cum >= self._cum_vol else 0.0)
+            self._cum_vol = cum
+
+        self._vwap.update(px, qty)
+        self.last = px
+        if self.day_high is None or px > self.day_high:
+            self.day_high = px
+        if self.day_low is None or px < self.day_low:
+            self.day_low = px
+
+        closed = ()
+        for tf in self.timeframes:
+            bucket = ts - ts % tf
+            b = self._forming.get(tf)
+            if b is None or b[TS] != bucket:
+                if b is not None:
+                    self._close_bar(tf)
+                    closed += (tf,)
+                self._forming[tf] = [bucket, px, px, px, px, qty]
+                continue
+            if px > b[HIGH]:
+                b[HIGH] = px
+            if px < b[LOW]:
+                b[LOW] = px
+            b[CLOSE] = px
+            b[VOLUME] += qty
+        return closed
+
+    @property
+    def vwap(self) -> float | None:
+        return self._vwap.value
+
+    @property
+    def atr(self) -> float | None:
+        """
+        ATR of finished `atr_tf` bars, or None until `atr_period` bars have closed.
+        """
+        return self._atr.value
+
+    def cpr(self) -> Dict[str, float] | None:
+        """CPR from previous-session HLC, or None before one is known."""
+        if self.prev_hlc is None:
+            return None
+        bc, pivot, tc = calc_cpr(*self.prev_hlc)
+        return {"bc": bc, "pivot": pivot, "tc": tc}
+
+    def bars(self, tf: int, last: int | None = None) -> np.ndarray:
+        """
+        Finished bars for timeframe `tf` as a read-only (n, 6) view; see column
+        constants.
+        """
+        return self._rings[tf].view(last)
+
+    def forming(self, tf: int) -> list | None:
+        """The in-progress bar for `tf` as [ts, o, h, l, c, v] (not yet in bars())."""
+        return self._forming.get(tf)
+
+
+def warm_from_broker(connector: Any, bars: Dict[str, BarAggregator],
+                     now: Optional[datetime] = None,
+                     atr_bars: int = 60) -> Dict[str, Tuple[float, float, float]]:
+    """
+    Seed each index's previous-session HLC (CPR) and ATR from broker history
+    (`connector.candles`, e.g. SmartAPI getCandleData): daily candles of the last
+    ten days give the last completed session before today, and its final
+    `atr_bars` x `atr_tf` candles warm the ATR. Indices without a history token
+    or whose fetch fails are logged and left unseeded. Returns the seeded HLCs.
+    """
+    now = (now or datetime.now(IST)).astimezone(IST)
+    today = now.date()
+    seeded: Dict[str, Tuple[float, float, float]] = {}
+    for index, agg in bars.items():
+        token = HISTORY_TOKENS.get(index)
+        if token is None:
+            continue
+        try:
+            daily = connector.candles(token, 86400, now - timedelta(days=10), now)
+            prev = [r for r in daily
+                    if datetime.fromtimestamp(r[0], IST).date() < today]
+            if not prev:
+                raise RuntimeError("no completed session in the last 10 days")
+            ts, _, high, low, close, _ = prev[-1]
+            agg.seed_prev_session(high, low, close)
+            seeded[index] = agg.prev_hlc
+            d = datetime.fromtimestamp(ts, IST).date()
+            start = datetime(d.year, d.month, d.day, 9, 15, tzinfo=IST)
+            intraday = connector.candles(token, agg.atr_tf, start,
+                                         start.replace(hour=15, minute=30))
+            agg.seed_bars(intraday[-atr_bars:])
+        except Exception as e:
+            log.info("bars_history_failed",
+                     extra={"_extra": {"index": index, "error": repr(e)}})
+    log.info("bars_seeded", extra={"_extra": {"prev_hlc": seeded}})
+    return seeded
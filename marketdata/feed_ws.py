@@ -1,27 +1,206 @@
-import asyncio, time
-from typing import AsyncIterator, Dict, Any, Optional
+import asyncio
+import json
+import struct
+import uuid
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple, Union
+import websockets
+from utils.instruments import INDEX_TOKENS
 from utils.logger import log
 
+SMARTAPI_WS_URL = "wss://smartapisocket.angelone.in/smart-stream"
+
+# SmartAPI WebSocket 2.0 subscription modes and binary layouts (little-endian).
+MODE_LTP, MODE_QUOTE, MODE_SNAP = 1, 2, 3
+# mode, exchange type, token (25 bytes, NUL padded), sequence, exchange ts (ms), LTP
+# (paise)
+_LTP = "<BB25sqqq"
+# last traded qty, avg price, volume, total buy qty, total sell qty, open, high, low,
+# close
+_QUOTE = _LTP + "qqqddqqqq"
+# last traded ts, OI, OI change %, 5+5 depth rows (buy/sell flag, qty, price, orders),
+# circuits, 52w hi/lo
+_SNAP = _QUOTE + "qqd" + "hqqh" * 10 + "qqqq"
+FRAMES = {MODE_LTP: struct.Struct(_LTP), MODE_QUOTE: struct.Struct(_QUOTE),
+          MODE_SNAP: struct.Struct(_SNAP)}
+
+
+def decode_frame(buf: Union[bytes, memoryview],
+                 symbols: Dict[bytes, str]) -> Optional[Dict[str, Any]]:
+    """
+    One binary tick -> run_intraday tick dict. `symbols` maps the raw 25-byte
+    token field to our symbol, so the token is never decoded per frame.
+    Prices are converted from paise; volume is cumulative for the day.
+    """
+    mv = memoryview(buf)
+    if len(mv) < FRAMES[MODE_LTP].size:
+        return None
+    mode = mv[0]
+    s = FRAMES.get(mode)
+    if s is None or len(mv) < s.size:
+        return None
+    f = s.unpack_from(mv)
+    sym = symbols.get(f[2])
+    if sym is None:
+        return None
+    tick = {"ts": f[4] / 1000.0, "symbol": sym, "ltp": f[5] / 100.0}
+    if mode >= MODE_QUOTE:
+        tick["volume"] = float(f[8])
+        tick["last_qty"] = f[6]
+        tick["ohlc"] = (f[11] / 100.0, f[12] / 100.0, f[13] / 100.0, f[14] / 100.0)
+    if mode == MODE_SNAP:
+        tick["oi"] = float(f[16])
+        rows = f[18:58]
+        # flag 1 = buy, 0 = sell; (price, qty, orders)
+        tick["bids"] = [(rows[i + 2] / 100.0, rows[i + 1], rows[i + 3])
+                        for i in range(0, 40, 4) if rows[i] == 1]
+        tick["asks"] = [(rows[i + 2] / 100.0, rows[i + 1], rows[i + 3])
+                        for i in range(0, 40, 4) if rows[i] == 0]
+    return tick
+
+
+def encode_frame(mode: int, exchange_type: int, token: str, seq: int, ts_ms: int,
+                 ltp: float, volume: int = 0, oi: int = 0) -> bytes:
+    """Inverse of decode_frame for recorded-frame replay and local test servers."""
+    head = (mode, exchange_type, token.encode().ljust(25, b"\0"), seq, ts_ms,
+            round(ltp * 100))
+    if mode == MODE_LTP:
+        return FRAMES[MODE_LTP].pack(*head)
+    p = round(ltp * 100)
+    quote = head + (1, p, volume, 0.0, 0.0, p, p, p, p)
+    if mode == MODE_QUOTE:
+        return FRAMES[MODE_QUOTE].pack(*quote)
+    depth = []
+    for i in range(10):
+        depth += [1 if i < 5 else 0, 50 * (i + 1),
+                  p + (5 * (i - 4) if i >= 5 else -5 * (i + 1)), i + 1]
+    return FRAMES[MODE_SNAP].pack(*quote, ts_ms, oi, 0.0, *depth, 0, 0, 0, 0)
+
+
 class FeedWS:
-    """Broker/exchange websocket wrapper for ticks/LTP/depth"""
+    """
+    Broker websocket feed (SmartAPI WebSocket 2.0 binary ticks).
 
-    def __init__(self, symbols: list[str]):
+    - frames are decoded with precompiled structs straight from the message buffer
+    - decoded ticks go through a bounded queue; while the consumer keeps up every
+      tick is delivered in order. Once the queue is full, a new tick overwrites
+      that symbol's still-queued tick in place (conflation, cumulative volume
+      stays exact) and is only dropped if the symbol has nothing queued
+    - reconnects with capped exponential backoff and resubscribes; text
+      heartbeats ("ping") every `heartbeat` seconds
+    stats(): received, decoded, bad_frames, conflated, dropped, reconnects, high_water.
+    """
+
+    def __init__(self, symbols: list[str], url: str = SMARTAPI_WS_URL,
+                 headers: Optional[Dict[str, str]] = None,
+                 tokens: Optional[Dict[str, Tuple[int, str]]] = None,
+                 mode: int = MODE_QUOTE, queue_size: int = 4096,
+                 heartbeat: float = 30.0, max_backoff: float = 30.0):
         self.symbols = symbols
+        self.url = url
+        self.headers = headers or {}
+        # symbol -> (exchange type, token)
+        self.tokens = tokens or {s: INDEX_TOKENS[s] for s in symbols}
+        self.mode = mode
+        self.heartbeat = heartbeat
+        self.max_backoff = max_backoff
+        self._by_raw = {tok.encode().ljust(25, b"\0"): s
+                        for s, (_, tok) in self.tokens.items()}
+        self._q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # symbol -> its newest tick still in the queue
+        self._queued: Dict[str, Dict[str, Any]] = {}
+        self._reader: Optional[asyncio.Task] = None
         self._connected = False
+        self._counts = {"received": 0, "decoded": 0, "bad_frames": 0, "conflated": 0,
+                        "dropped": 0, "reconnects": 0, "high_water": 0}
+
+    def _subscription(self, action: int = 1) -> str:
+        by_exch: Dict[int, List[str]] = {}
+        for exch, tok in self.tokens.values():
+            by_exch.setdefault(int(exch), []).append(str(tok))
+        token_list = [{"exchangeType": e, "tokens": t} for e, t in by_exch.items()]
+        return json.dumps({"correlationID": uuid.uuid4().hex[:10], "action": action,
+                           "params": {"mode": self.mode, "tokenList": token_list}})
 
     async def connect(self) -> None:
-        # TODO: plug broker SDK here (Angel SmartAPI/Kite/Upstox)
-        log.info("connecting feed", extra={"_extra": {"symbols": self.symbols}})
+        log.info("connecting feed",
+                 extra={"_extra": {"symbols": self.symbols, "url": self.url}})
         self._connected = True
+        self._reader = asyncio.create_task(self._run(), name="feed:reader")
+
+    def _offer(self, tick: Dict[str, Any]) -> None:
+        c = self._counts
+        try:
+            self._q.put_nowait(tick)
+        except asyncio.QueueFull:
+            pending = self._queued.get(tick["symbol"])
+            if pending is None:
+                c["dropped"] += 1
+            else:
+                pending.update(tick)
+                c["conflated"] += 1
+            return
+        self._queued[tick["symbol"]] = tick
+        depth = self._q.qsize()
+        if depth > c["high_water"]:
+            c["high_water"] = depth
+
+    async def _pinger(self, ws) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await ws.send("ping")
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while self._connected:
+            try:
+                async with websockets.connect(self.url, additional_headers=self.headers,
+                                              ping_interval=None) as ws:
+                    await ws.send(self._subscription())
+                    log.info("feed_subscribed", extra={"_extra": {
+                        "tokens": self.tokens, "mode": self.mode}})
+                    backoff = 0.5
+                    pinger = asyncio.create_task(self._pinger(ws))
+                    try:
+                        by_raw, c = self._by_raw, self._counts
+                        async for msg in ws:
+                            if isinstance(msg, str):   # "pong" / control
+                                continue
+                            c["received"] += 1
+                            tick = decode_frame(msg, by_raw)
+                            if tick is None:
+                                c["bad_frames"] += 1
+                                continue
+                            c["decoded"] += 1
+                            self._offer(tick)
+                    finally:
+                        pinger.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.info("feed_disconnected",
+                         extra={"_extra": {"error": repr(e), "retry_in_s": backoff}})
+            if not self._connected:
+                break
+            self._counts["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
 
     async def ticks(self) -> AsyncIterator[Dict[str, Any]]:
         if not self._connected:
             await self.connect()
-        # TODO: yield real ticks. This is a heartbeat stub.
+        q, queued = self._q, self._queued
         while True:
-            ts = time.time()
-            yield {"ts": ts, "symbol": "NIFTY50", "ltp": 24572.3}  # replace with real data
-            await asyncio.sleep(1.0)
+            tick = await q.get()
+            if queued.get(tick["symbol"]) is tick:
+                del queued[tick["symbol"]]
+            yield tick
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts, queued=self._q.qsize())
 
     async def close(self) -> None:
         self._connected = False
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
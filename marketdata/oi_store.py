@@ -0,0 +1,225 @@
+# marketdata/oi_store.py
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.logger import log
+
+Key = Tuple[str, float, str]   # (expiry ISO date, strike, "CE"/"PE")
+WINDOWS = (300, 900)           # 5m / 15m
+
+
+class _Book:
+    """One index: contracts x time-bucket ring of OI (float32, forward-filled)."""
+    __slots__ = ("oi", "slot", "keys", "is_ce", "bucket", "first", "snap", "stats")
+
+    def __init__(self, max_contracts: int, n: int) -> None:
+        self.oi = np.full((max_contracts, n), np.nan, dtype=np.float32)
+        self.slot: Dict[Key, int] = {}
+        self.keys: List[Key] = []
+        self.is_ce = np.zeros(max_contracts, dtype=bool)
+        self.bucket = -1          # absolute bucket number of the newest column
+        # first bucket with data (deltas need history back to it)
+        self.first = -1
+        self.snap: Any = None     # last snapshot object ingested by observe()
+        self.stats: Dict[str, Optional[float]] = {}
+
+
+class OIStore:
+    """
+    Per-(index, expiry, strike, CE/PE) open-interest history.
+
+    Each index owns a fixed (max_contracts x horizon/resolution) float32 ring,
+    so memory is bounded for the whole session (defaults: 2 indices x 4096
+    contracts x 31 buckets ~ 1 MB). Updates write the newest column (carrying
+    the previous column forward for contracts missing from a snapshot);
+    window deltas compare two columns, so they are O(1) per contract and one
+    vector op for the chain. Aggregate deltas only sum contracts present at
+    both ends of the window, so strikes listed mid-window do not skew them.
+    """
+
+    def __init__(self, horizon: float = 1800.0, resolution: float = 60.0,
+                 max_contracts: int = 4096) -> None:
+        self.resolution = resolution
+        self.n = int(horizon // resolution) + 1
+        self.max_contracts = max_contracts
+        self.books: Dict[str, _Book] = {}
+        self.overflow = 0
+
+    # -- ingest ------------------------------------------------------------------------
+
+    def _advance(self, book: _Book, b: int) -> int:
+        n = self.n
+        # first update, or a gap longer than the ring
+        if book.bucket < 0 or b - book.bucket >= n:
+            book.oi[:] = np.nan
+            book.first = b
+        else:
+            prev = book.bucket % n
+            for k in range(book.bucket + 1, b + 1):
+                col = k % n
+                book.oi[:, col] = book.oi[:, prev]
+        book.bucket = b
+        return b % n
+
+    def update(self, index: str, ts: float, rows: Iterable[Tuple[Key, float]]) -> None:
+        """
+        Record OI for (key, oi) rows observed at `ts` (epoch seconds). Stale timestamps
+        are ignored.
+        """
+        book = self.books.get(index)
+        if book is None:
+            book = self.books[index] = _Book(self.max_contracts, self.n)
+        b = int(ts // self.resolution)
+        if b < book.bucket:
+            return
+        col = self._advance(book, b) if b > book.bucket else b % self.n
+        oi, slot = book.oi, book.slot
+        for key, value in rows:
+            i = slot.get(key)
+            if i is None:
+                if len(book.keys) >= self.max_contracts:
+                    self.overflow += 1
+                    continue
+                i = slot[key] = len(book.keys)
+                book.keys.append(key)
+                book.is_ce[i] = key[2] == "CE"
+            oi[i, col] = value
+        book.stats = {}
+
+    def update_snapshot(self, index: str, ts: float, oc: Dict[str, Any]) -> int:
+        """
+        Ingest a chain snapshot: `oc["_chain"]` rows like
+        {"strike", "expiry", "CE": {"oi"}, "PE": {"oi"}}; without a chain, the ATM
+        legs are used when they carry "oi". Returns rows ingested.
+        """
+        rows: List[Tuple[Key, float]] = []
+        chain = oc.get("_chain") or ([oc["atm"]] if oc.get("atm") else [])
+        for r in chain:
+            strike = r.get("strike")
+            if strike is None:
+                continue
+            expiry = str(r.get("expiry") or "")
+            for opt in ("CE", "PE"):
+                leg = r.get(opt) or {}
+                v = leg.get("oi") if isinstance(leg, dict) else None
+                if v is not None:
+                    rows.append(((expiry, float(strike), opt), float(v)))
+        if rows:
+            self.update(index, ts, rows)
+        return len(rows)
+
+    def observe(self, index: str, ts: float,
+                oc: Dict[str, Any]) -> Dict[str, Optional[float]]:
+        """
+        Per-tick entry point: ingests `oc` only when it is a new snapshot object
+        (providers return the cached object until they refresh), then returns stats().
+        """
+        book = self.books.get(index)
+        if book is None or book.snap is not oc:
+            self.update_snapshot(index, ts, oc)
+            book = self.books.get(index)
+            if book is None:
+                return {}
+            book.snap = oc
+        return self.stats(index)
+
+    # -- queries -----------------------------------------------------------------------
+
+    def _back(self, book: _Book, window: float) -> Optional[int]:
+        k = int(round(window / self.resolution))
+        if book.bucket < 0 or book.bucket - k < book.first:
+            return None
+        return (book.bucket - k) % self.n
+
+    def delta(self, index: str, window: float, key: Optional[Key] = None,
+              opt: str = "CE") -> Optional[Tuple[float, float]]:
+        """
+        (change, change %) over `window` seconds for one contract, or for all `opt`
+        contracts when key is None.
+        """
+        book = self.books.get(index)
+        if book is None:
+            return None
+        back = self._back(book, window)
+        if back is None:
+            return None
+        col = book.bucket % self.n
+        if key is None:
+            m = len(book.keys)
+            sel = book.is_ce[:m] if opt == "CE" else ~book.is_ce[:m]
+            a, b = book.oi[:m, col][sel], book.oi[:m, back][sel]
+            ok = np.isfinite(a) & np.isfinite(b)
+            now, then = (float(a[ok].sum(dtype=np.float64)),
+                         float(b[ok].sum(dtype=np.float64)))
+        else:
+            i = book.slot.get(key)
+            if i is None:
+                return None
+            now, then = float(book.oi[i, col]), float(book.oi[i, back])
+        if not then or then != then or now != now:
+            return None
+        return now - then, (now - then) / then * 100.0
+
+    def pcr(self, index: str) -> Optional[float]:
+        book = self.books.get(index)
+        if book is None or book.bucket < 0:
+            return None
+        m = len(book.keys)
+        cur = book.oi[:m, book.bucket % self.n]
+        ce = float(np.nansum(cur[book.is_ce[:m]], dtype=np.float64))
+        return (float(np.nansum(cur[~book.is_ce[:m]], dtype=np.float64)) / ce if ce
+                else None)
+
+    def chain(self, index: str, window: float = 300.0) -> Dict[str, np.ndarray]:
+        """
+        Whole-chain view: expiry, strike, opt, oi, chg_pct over `window`, rank
+        (0 = largest OI build-up) and per-strike PCR (PE/CE OI at the same
+        expiry/strike).
+        """
+        book = self.books.get(index)
+        m = len(book.keys) if book else 0
+        if not m or book.bucket < 0:
+            return {"expiry": np.zeros(0, dtype=str), "strike": np.zeros(0),
+                    "opt": np.zeros(0, dtype=str), "oi": np.zeros(0),
+                    "chg_pct": np.zeros(0), "rank": np.zeros(0, dtype=np.int64),
+                    "strike_pcr": np.zeros(0)}
+        col = book.bucket % self.n
+        now = book.oi[:m, col].astype(np.float64)
+        back = self._back(book, window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            chg = ((now / book.oi[:m, back] - 1.0) * 100.0 if back is not None
+                   else np.full(m, np.nan))
+        order = np.argsort(np.where(np.isfinite(chg), -chg, np.inf), kind="stable")
+        rank = np.empty(m, dtype=np.int64)
+        rank[order] = np.arange(m)
+        expiry = np.array([k[0] for k in book.keys])
+        strike = np.array([k[1] for k in book.keys])
+        opt = np.array([k[2] for k in book.keys])
+        other = np.array([book.slot.get((e, k, "PE" if o == "CE" else "CE"), -1)
+                          for e, k, o in book.keys])
+        other_oi = np.where(other >= 0, now[np.maximum(other, 0)], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spcr = np.where(book.is_ce[:m], other_oi / now, now / other_oi)
+        return {"expiry": expiry, "strike": strike, "opt": opt, "oi": now,
+                "chg_pct": chg, "rank": rank, "strike_pcr": spcr}
+
+    def stats(self, index: str) -> Dict[str, Optional[float]]:
+        """
+        Aggregate CE/PE OI change % over 5m/15m plus PCR; cached until the next update.
+        """
+        book = self.books.get(index)
+        if book is None:
+            return {}
+        if not book.stats:
+            s: Dict[str, Optional[float]] = {"pcr": self.pcr(index)}
+            for w in WINDOWS:
+                for opt in ("CE", "PE"):
+                    d = self.delta(index, w, opt=opt)
+                    s[f"{opt.lower()}_oi_chg_{w // 60}m_pct"] = (round(d[1], 3) if d
+                                                                 else None)
+            book.stats = s
+        return book.stats
+
+    def reset(self, index: Optional[str] = None) -> None:
+        for i in ([index] if index else list(self.books)):
+            self.books.pop(i, None)
+        log.info("oi_store_reset", extra={"_extra": {"index": index}})
@@ -1,9 +1,44 @@
 # marketdata/option_chain_provider.py
 import os
-import requests
-from typing import Dict, Any, Optional
+import time
+import asyncio
+from typing import Dict, Any, Optional, Callable
 from utils.logger import log
 
+MOCK_SNAPSHOT = {"pcr": 1.05, "max_pain": 24600, "oi_trend": "CE_unwind PE_build",
+                 "atm": None}
+EMPTY_SNAPSHOT = {"pcr": None, "max_pain": None, "oi_trend": None, "atm": None}
+
+
+def _api_symbol(index: str) -> str:
+    # Map NIFTY50 -> NIFTY for API
+    return "NIFTY" if index == "NIFTY50" else index
+
+
+def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Normalize to our minimal schema
+    return {
+        "pcr": data.get("pcr"),
+        "max_pain": data.get("maxPain") or data.get("max_pain"),
+        "oi_trend": data.get("oiTrend") or data.get("oi_trend"),
+        # expected like
+        # {"strike": 24600, "CE": {"ltp":.., "iv":.., "delta":..}, "PE": {...}}
+        "atm": data.get("atm"),
+        # per-strike rows {"strike", "expiry": "YYYY-MM-DD", "CE": {"oi"},
+        # "PE": {"oi"}}: a view for OIStore, never part of the logged summary (see
+        # risk.audit)
+        "_chain": data.get("chain") or data.get("strikes"),
+    }
+
+
+def _auth_headers(auth: str) -> Dict[str, str]:
+    if auth.startswith("cookie:"):
+        return {"Cookie": auth.split("cookie:", 1)[1].strip()}
+    elif auth.startswith("Bearer "):
+        return {"Authorization": auth}
+    return {}
+
+
 class OptionChainProvider:
     """
     OI/IV/Greeks provider. Source 'sensibull' (preferred) or 'mock'.
@@ -12,45 +47,155 @@ class OptionChainProvider:
       SENSIBULL_AUTH = "Bearer <token>" or "cookie: <cookieStr>"
     """
 
-    def __init__(self, source: str = "sensibull"):
+    def __init__(self, source: str = "sensibull", base: Optional[str] = None):
         self.source = source
-        self.base = os.environ.get("SENSIBULL_BASE", "https://api.sensibull.com")
+        self.base = base or os.environ.get("SENSIBULL_BASE",
+                                           "https://api.sensibull.com")
         self.auth = os.environ.get("SENSIBULL_AUTH", "")
 
     def _headers(self) -> Dict[str, str]:
-        if self.auth.startswith("cookie:"):
-            return {"Cookie": self.auth.split("cookie:", 1)[1].strip()}
-        elif self.auth.startswith("Bearer "):
-            return {"Authorization": self.auth}
-        return {}
+        return _auth_headers(self.auth)
 
     def get_snapshot(self, index: str) -> Dict[str, Any]:
         if self.source != "sensibull":
             # Fallback mock
             log.info("option_chain_snapshot", extra={"_extra": {"index": index, "source": "mock"}})
-            return {"pcr": 1.05, "max_pain": 24600, "oi_trend": "CE_unwind PE_build", "atm": None}
+            return dict(MOCK_SNAPSHOT)
 
-        # Map NIFTY50 -> NIFTY for API
-        symbol = "NIFTY" if index == "NIFTY50" else index
+        symbol = _api_symbol(index)
 
         # NOTE: The exact Sensibull path may differ; adjust if needed.
         # Try: /v1/option-chain?symbol=NIFTY OR /v2/option-chain/{symbol}
         url = f"{self.base}/v1/option-chain"
         try:
+            import requests
             resp = requests.get(url, params={"symbol": symbol}, headers=self._headers(), timeout=5)
             resp.raise_for_status()
-            data = resp.json()
-
-            # Normalize to our minimal schema
-            oc = {
-                "pcr": data.get("pcr"),
-                "max_pain": data.get("maxPain") or data.get("max_pain"),
-                "oi_trend": data.get("oiTrend") or data.get("oi_trend"),
-                "atm": data.get("atm")  # expected like {"strike": 24600, "CE": {"ltp":.., "iv":.., "delta":..}, "PE": {...}}
-            }
+            oc = _normalize(resp.json())
             log.info("option_chain_snapshot", extra={"_extra": {"index": index, "source": "sensibull"}})
             return oc
         except Exception as e:
             log.info("option_chain_snapshot_error", extra={"_extra": {"index": index, "err": str(e)}})
             # safe fallback to proceed
-            return {"pcr": None, "max_pain": None, "oi_trend": None, "atm": None}
+            return dict(EMPTY_SNAPSHOT)
+
+
+class AsyncOptionChainProvider:
+    """
+    Non-blocking variant of OptionChainProvider for the asyncio tick loop.
+
+    - one pooled aiohttp session (created lazily, closed by close())
+    - per-index snapshot cache with `ttl` seconds freshness
+    - stale-while-revalidate: a stale snapshot is returned immediately while a
+      background refresh runs; only the very first call per index waits
+    - concurrent requests for the same index share one in-flight fetch
+    - a failed fetch keeps the last good snapshot (and its fetch time) and is
+      retried after an exponential backoff (ttl, 2 x ttl, ... up to max_backoff);
+      on_snapshot only ever sees newly fetched snapshots
+    """
+
+    def __init__(self, source: str = "sensibull", base: Optional[str] = None,
+                 ttl: float = 3.0, timeout: float = 5.0, pool_size: int = 8,
+                 on_snapshot: Optional[
+                     Callable[[str, float, Dict[str, Any]], None]] = None,
+                 max_backoff: float = 60.0):
+        self.source = source
+        self.base = base or os.environ.get("SENSIBULL_BASE",
+                                           "https://api.sensibull.com")
+        self.auth = os.environ.get("SENSIBULL_AUTH", "")
+        self.ttl = ttl
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.on_snapshot = on_snapshot  # e.g. TickRecorder.record_chain
+        self._session = None
+        # index -> (fetched_at, snapshot)
+        self._cache: Dict[str, tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.max_backoff = max_backoff
+        self._failures: Dict[str, int] = {}
+        # index -> monotonic time of the next attempt
+        self._retry_at: Dict[str, float] = {}
+        # one object, so OIStore.observe() sees "unchanged"
+        self._empty = dict(EMPTY_SNAPSHOT)
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            # deferred: ~0.2 s of import time the replay/startup path does not need
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size,
+                                               keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=_auth_headers(self.auth))
+        return self._session
+
+    async def _fetch(self, index: str) -> Dict[str, Any]:
+        if self.source != "sensibull":
+            log.info("option_chain_snapshot",
+                     extra={"_extra": {"index": index, "source": "mock"}})
+            oc = dict(MOCK_SNAPSHOT)
+        else:
+            url = f"{self.base}/v1/option-chain"
+            try:
+                session = await self._get_session()
+                async with session.get(url,
+                                       params={"symbol": _api_symbol(index)}) as resp:
+                    resp.raise_for_status()
+                    oc = _normalize(await resp.json(content_type=None))
+                log.info("option_chain_snapshot",
+                         extra={"_extra": {"index": index, "source": "sensibull"}})
+            except Exception as e:
+                # keep serving the last good snapshot as it is (its age keeps growing);
+                # back off
+                n = self._failures[index] = self._failures.get(index, 0) + 1
+                delay = min(self.ttl * 2 ** (n - 1), self.max_backoff)
+                self._retry_at[index] = time.monotonic() + delay
+                log.info("option_chain_snapshot_error", extra={"_extra": {
+                    "index": index, "err": str(e), "failures": n, "retry_in_s": delay}})
+                cached = self._cache.get(index)
+                return cached[1] if cached else self._empty
+        self._failures.pop(index, None)
+        self._retry_at.pop(index, None)
+        self._cache[index] = (time.monotonic(), oc)
+        if self.on_snapshot is not None:
+            self.on_snapshot(index, time.time(), oc)
+        return oc
+
+    def refresh(self, index: str) -> asyncio.Task:
+        """Start (or join) the in-flight fetch for `index`."""
+        task = self._inflight.get(index)
+        if task is None:
+            task = asyncio.create_task(self._fetch(index))
+            self._inflight[index] = task
+            task.add_done_callback(lambda _t, i=index: self._inflight.pop(i, None))
+        return task
+
+    def peek(self, index: str) -> Optional[Dict[str, Any]]:
+        """Latest cached snapshot without waiting or triggering a fetch."""
+        cached = self._cache.get(index)
+        return cached[1] if cached else None
+
+    def age(self, index: str) -> Optional[float]:
+        """
+        Seconds since the cached snapshot was fetched (None before the first success).
+        """
+        cached = self._cache.get(index)
+        return time.monotonic() - cached[0] if cached else None
+
+    async def get_snapshot(self, index: str) -> Dict[str, Any]:
+        cached = self._cache.get(index)
+        now = time.monotonic()
+        if now < self._retry_at.get(index, 0.0):
+            return cached[1] if cached else self._empty
+        if cached is None:
+            return await asyncio.shield(self.refresh(index))
+        if now - cached[0] >= self.ttl:
+            self.refresh(index)
+        return cached[1]
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
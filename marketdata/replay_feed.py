@@ -0,0 +1,193 @@
+# marketdata/replay_feed.py
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Any, Optional
+import numpy as np
+from marketdata.tick_recorder import CHAIN_DTYPE, read_ticks
+from marketdata.option_chain_provider import EMPTY_SNAPSHOT
+from utils.logger import log
+
+
+def _memmap(path: str, dtype: np.dtype) -> np.ndarray:
+    if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r",
+                     shape=(os.path.getsize(path) // dtype.itemsize,))
+
+
+class _Day:
+    """Memory-mapped view of one recorded day directory."""
+
+    def __init__(self, day_dir: str):
+        self.dir = day_dir
+        with open(os.path.join(day_dir, "symbols.json"), "r", encoding="utf-8") as f:
+            self.names: list[str] = json.load(f)
+        self.ticks = read_ticks(day_dir)   # column -> memmap
+        self.n_ticks = len(self.ticks["ts"])
+        self.chain_idx = _memmap(os.path.join(day_dir, "chains.idx"), CHAIN_DTYPE)
+        self.chain_blob = _memmap(os.path.join(day_dir, "chains.blob"), np.dtype("u1"))
+
+
+class ReplayFeed:
+    """
+    Drop-in for FeedWS that replays TickRecorder day directories in order
+    (pass several consecutive days so bars/CPR have a previous session).
+    speed: 1.0 = real time, N = N x faster, None/0 = as fast as possible.
+    Files are memory-mapped and walked in chunks, so memory stays flat.
+    """
+
+    def __init__(self, day_dirs: str | list[str], speed: Optional[float] = 1.0,
+                 symbols: list[str] | None = None, chunk: int = 4096):
+        self.day_dirs = [day_dirs] if isinstance(day_dirs, str) else list(day_dirs)
+        self.speed = speed or None
+        self.symbols = symbols
+        self.chunk = chunk
+        self._connected = False
+        self.day: _Day | None = None      # day currently being replayed
+        self.clock: float | None = None   # ts of the last replayed tick
+
+    async def connect(self) -> None:
+        log.info("connecting feed",
+                 extra={"_extra": {"replay": self.day_dirs, "speed": self.speed}})
+        self._connected = True
+
+    async def _replay_day(self, day: _Day) -> AsyncIterator[Dict[str, Any]]:
+        names, cols = day.names, day.ticks
+        wanted = set(self.symbols) if self.symbols else set(names)
+        keep = np.array([n in wanted for n in names] or [False])
+        t0 = float(cols["ts"][0])
+        wall0 = time.monotonic()
+        for start in range(0, day.n_ticks, self.chunk):
+            end = start + self.chunk
+            sel = keep[cols["sym"][start:end]]
+            block = zip(*(np.asarray(cols[c][start:end])[sel].tolist()
+                          for c in ("ts", "sym", "ltp", "volume")))
+            for ts, sym, ltp, vol in block:
+                if self.speed:
+                    delay = wall0 + (ts - t0) / self.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                self.clock = ts
+                tick = {"ts": ts, "symbol": names[sym], "ltp": ltp}
+                if vol == vol:  # not NaN
+                    tick["volume"] = vol
+                yield tick
+            if not self.speed:
+                await asyncio.sleep(0)  # let consumers run between chunks
+
+    async def ticks(self) -> AsyncIterator[Dict[str, Any]]:
+        if not self._connected:
+            await self.connect()
+        for d in self.day_dirs:
+            self.day = _Day(d)
+            if self.day.n_ticks:
+                async for tick in self._replay_day(self.day):
+                    yield tick
+
+    def chain_provider(self) -> "ReplayOptionChainProvider":
+        return ReplayOptionChainProvider(self)
+
+    async def close(self) -> None:
+        self._connected = False
+
+
+class ReplayOptionChainProvider:
+    """Serves the recorded chain snapshot current at the replay clock (no network)."""
+
+    def __init__(self, feed: ReplayFeed):
+        self.feed = feed
+        self._day: _Day | None = None
+        # index -> (record no, snapshot)
+        self._last: Dict[str, tuple[int, Dict[str, Any]]] = {}
+        # index -> (ts, record nos)
+        self._by_index: Dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def _records(self, index: str) -> tuple[np.ndarray, np.ndarray]:
+        if self._day is not self.feed.day:
+            self._day, self._last, self._by_index = self.feed.day, {}, {}
+        recs = self._by_index.get(index)
+        if recs is None:
+            idx, names = self._day.chain_idx, self._day.names
+            nos = (np.flatnonzero(idx["sym"] == names.index(index)) if index in names
+                   else np.zeros(0, int))
+            recs = self._by_index[index] = (np.asarray(idx["ts"][nos]), nos)
+        return recs
+
+    def peek(self, index: str) -> Optional[Dict[str, Any]]:
+        if self.feed.clock is None or self.feed.day is None:
+            return None
+        ts, nos = self._records(index)
+        # latest record for this index at or before the replay clock
+        k = int(np.searchsorted(ts, self.feed.clock, side="right"))
+        if k == 0:
+            return None
+        rec_no = int(nos[k - 1])
+        last = self._last.get(index)
+        if last and last[0] == rec_no:
+            return last[1]
+        rec = self._day.chain_idx[rec_no]
+        off, n = int(rec["offset"]), int(rec["length"])
+        snap = json.loads(self._day.chain_blob[off:off + n].tobytes())
+        self._last[index] = (rec_no, snap)
+        return snap
+
+    async def get_snapshot(self, index: str) -> Dict[str, Any]:
+        return self.peek(index) or dict(EMPTY_SNAPSHOT)
+
+    async def close(self) -> None:
+        pass
+
+
+def warm_from_recordings(root: str, bars: Dict[str, Any], risk: Any = None,
+                         now: Optional[float] = None,
+                         atr_bars: int = 60) -> Dict[str, int]:
+    """
+    Restore per-index state after a restart from TickRecorder days under `root`:
+    the tail of the previous recorded day (`atr_bars` x `atr_tf`, so the ATR converges,
+    with that day's full high/low so the session roll gives the right CPR), then
+    today's ticks so far (VWAP, day range, bars). India VIX, when recorded,
+    re-primes the risk engine's day-open reference. Returns ticks replayed per symbol.
+    """
+    from marketdata.tick_recorder import day_of
+    from utils.instruments import VIX_SYMBOL
+    if not os.path.isdir(root):
+        return {}
+    today = day_of(now if now is not None else time.time())
+    days = sorted(d for d in os.listdir(root)
+                  if os.path.exists(os.path.join(root, d, "symbols.json")))
+    prev = [d for d in days if d < today]
+    replay = ([(_Day(os.path.join(root, prev[-1])), True)] if prev else []) + \
+             ([(_Day(os.path.join(root, today)), False)] if today in days else [])
+    counts: Dict[str, int] = {}
+    for day, is_prev in replay:
+        t = {c: np.asarray(v) for c, v in day.ticks.items()}
+        for sid, name in enumerate(day.names):
+            agg = bars.get(name)
+            mask = t["sym"] == sid
+            ts_, ltp_ = t["ts"][mask], t["ltp"][mask]
+            if not len(ts_):
+                continue
+            if agg is None:
+                if name == VIX_SYMBOL and risk is not None and not is_prev:
+                    risk.on_vix(float(ts_[0]), float(ltp_[0]))
+                    risk.on_vix(float(ts_[-1]), float(ltp_[-1]))
+                continue
+            vol_ = t["volume"][mask]
+            if is_prev:
+                hi, lo = float(ltp_.max()), float(ltp_.min())
+                tail = ts_ >= ts_[-1] - atr_bars * agg.atr_tf
+                ts_, ltp_, vol_ = ts_[tail], ltp_[tail], vol_[tail]
+            for ts, ltp, vol in zip(ts_.tolist(), ltp_.tolist(), vol_.tolist()):
+                tick = {"ts": ts, "symbol": name, "ltp": ltp}
+                if vol == vol:
+                    tick["volume"] = vol
+                agg.on_tick(tick)
+            if is_prev:
+                agg.day_high, agg.day_low = hi, lo
+            counts[name] = counts.get(name, 0) + len(ts_)
+    log.info("bars_warmed", extra={"_extra": {"root": root,
+                                              "days": [d.dir for d, _ in replay],
+                                              "ticks": counts}})
+    return counts
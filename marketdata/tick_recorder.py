@@ -0,0 +1,158 @@
+# marketdata/tick_recorder.py
+import asyncio
+import os
+import json
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+import numpy as np
+from utils.instruments import IST
+from utils.logger import log
+
+# On-disk layout, one directory per IST trading day:
+#   <root>/<YYYY-MM-DD>/ticks.<col>  one append-only column per TICK_COLUMNS field,
+#                                    row k of every column is tick k (np.memmap-able)
+#   <root>/<YYYY-MM-DD>/chains.idx   fixed-size CHAIN_DTYPE records pointing into
+#                                    chains.blob
+#   <root>/<YYYY-MM-DD>/chains.blob  concatenated JSON snapshots
+#   <root>/<YYYY-MM-DD>/symbols.json symbol-id -> symbol name
+TICK_COLUMNS = {"ts": np.dtype("<f8"), "sym": np.dtype("<u2"),
+                "ltp": np.dtype("<f8"), "volume": np.dtype("<f8")}
+CHAIN_DTYPE = np.dtype([("ts", "<f8"), ("sym", "<u2"), ("offset", "<u8"),
+                        ("length", "<u4")])
+
+
+def day_of(ts: float) -> str:
+    utc = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return utc.astimezone(IST).strftime("%Y-%m-%d")
+
+
+def _rows(path: str, dtype: np.dtype) -> int:
+    return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+
+def read_ticks(day_dir: str) -> Dict[str, np.ndarray]:
+    """
+    Memory-mapped tick columns of one recorded day, clipped to the rows that
+    every column holds in full (a flush interrupted by a crash can leave the
+    columns at different lengths).
+    """
+    paths = {c: os.path.join(day_dir, "ticks." + c) for c in TICK_COLUMNS}
+    n = min(_rows(paths[c], dt) for c, dt in TICK_COLUMNS.items())
+    return {c: (np.memmap(paths[c], dtype=dt, mode="r", shape=(n,)) if n
+                else np.zeros(0, dtype=dt))
+            for c, dt in TICK_COLUMNS.items()}
+
+
+class TickRecorder:
+    """
+    Appends feed ticks and option-chain snapshots to per-day columnar files.
+    Ticks are buffered in preallocated column arrays and written every
+    `flush_every` ticks, so memory stays flat for any session length; run
+    autoflush() alongside the feed so ticks and chain snapshots also reach
+    the files within `interval` seconds on a quiet feed.
+    """
+
+    def __init__(self, root: str = "data/ticks", flush_every: int = 4096) -> None:
+        self.root = root
+        self._buf = {c: np.zeros(flush_every, dtype=dt)
+                     for c, dt in TICK_COLUMNS.items()}
+        self._size = flush_every
+        self._n = 0
+        self._day = None
+        self._dir = None
+        self._ticks = self._idx = self._blob = None
+        self._blob_off = 0
+        self._symbols: List[str] = []
+        self._sym_ids: Dict[str, int] = {}
+
+    def _open(self, day: str) -> None:
+        self.close()
+        self._day = day
+        self._dir = os.path.join(self.root, day)
+        os.makedirs(self._dir, exist_ok=True)
+        sym_path = os.path.join(self._dir, "symbols.json")
+        self._symbols = []
+        if os.path.exists(sym_path):  # resume an existing day after restart
+            with open(sym_path, "r", encoding="utf-8") as f:
+                self._symbols = json.load(f)
+        self._sym_ids = {s: i for i, s in enumerate(self._symbols)}
+        # resume at the last complete row: a crash mid-flush can leave a partial
+        # record at the end of any file, and appending after it would misalign
+        # every later row
+        paths = {c: os.path.join(self._dir, "ticks." + c) for c in TICK_COLUMNS}
+        n = min(_rows(paths[c], dt) for c, dt in TICK_COLUMNS.items())
+        self._ticks = {c: open(p, "ab") for c, p in paths.items()}
+        for c, f in self._ticks.items():
+            f.truncate(n * TICK_COLUMNS[c].itemsize)
+        idx_path = os.path.join(self._dir, "chains.idx")
+        k = _rows(idx_path, CHAIN_DTYPE)
+        end = 0
+        if k:
+            last = np.fromfile(idx_path, dtype=CHAIN_DTYPE, count=1,
+                               offset=(k - 1) * CHAIN_DTYPE.itemsize)[0]
+            end = int(last["offset"]) + int(last["length"])
+        self._idx = open(idx_path, "ab")
+        self._idx.truncate(k * CHAIN_DTYPE.itemsize)
+        self._blob = open(os.path.join(self._dir, "chains.blob"), "ab")
+        self._blob.truncate(end)
+        self._blob_off = end
+        log.info("tick_recorder_open", extra={"_extra": {"dir": self._dir}})
+
+    def _sym(self, symbol: str) -> int:
+        sid = self._sym_ids.get(symbol)
+        if sid is None:
+            sid = self._sym_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            with open(os.path.join(self._dir, "symbols.json"), "w",
+                      encoding="utf-8") as f:
+                json.dump(self._symbols, f)
+        return sid
+
+    def _ensure_day(self, ts: float) -> None:
+        day = day_of(ts)
+        if day != self._day:
+            self._open(day)
+
+    def record_tick(self, tick: Dict[str, Any]) -> None:
+        ts = float(tick["ts"])
+        self._ensure_day(ts)
+        vol = tick.get("volume")
+        b, n = self._buf, self._n
+        b["ts"][n] = ts
+        b["sym"][n] = self._sym(tick["symbol"])
+        b["ltp"][n] = float(tick["ltp"])
+        b["volume"][n] = np.nan if vol is None else float(vol)
+        self._n = n + 1
+        if self._n == self._size:
+            self.flush()
+
+    def record_chain(self, index: str, ts: float, snapshot: Dict[str, Any]) -> None:
+        self._ensure_day(ts)
+        data = json.dumps(snapshot, separators=(",", ":"), default=str).encode()
+        self._blob.write(data)
+        rec = np.array([(ts, self._sym(index), self._blob_off, len(data))],
+                       dtype=CHAIN_DTYPE)
+        self._idx.write(rec.tobytes())
+        self._blob_off += len(data)
+
+    def flush(self) -> None:
+        if self._ticks is None:
+            return
+        if self._n:
+            for c, f in self._ticks.items():
+                f.write(self._buf[c][:self._n].tobytes())
+            self._n = 0
+        for f in (*self._ticks.values(), self._idx, self._blob):
+            f.flush()
+
+    async def autoflush(self, interval: float = 1.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for f in (*(self._ticks or {}).values(), self._idx, self._blob):
+            if f is not None:
+                f.close()
+        self._ticks = self._idx = self._blob = None
@@ -1,13 +1,47 @@
-from typing import Dict, Any
+from typing import Optional
+from risk.audit_journal import AuditJournal
 from utils.logger import log
 
-def emit_audit_snapshot(index: str, ltp: float, oc: dict, breadth: dict, signal_stack: list[str],
-                        greeks_at_decision: dict, risk_state: dict, ts: str) -> dict:
+_SCALARS = (str, int, float, bool)
+# per ATM leg: what an entry at that strike is justified by
+_ATM_LEG_FIELDS = ("ltp", "iv", "oi", "delta")
+
+
+def _atm(atm: Optional[dict]) -> Optional[dict]:
+    if not atm:
+        return None
+    out = {"strike": atm.get("strike")}
+    for side in ("CE", "PE"):
+        leg = atm.get(side)
+        if isinstance(leg, dict):
+            out[side] = {f: leg.get(f) for f in _ATM_LEG_FIELDS}
+    return out
+
+
+def oc_summary(oc: dict) -> dict:
+    """
+    Scalar fields of a chain snapshot (pcr, max_pain, oi_trend) plus the ATM strike
+    and its CE/PE ltp, iv, oi and delta; the per-strike `_chain` rows stay out.
+    """
+    out = {k: v for k, v in oc.items()
+           if not k.startswith("_") and (v is None or isinstance(v, _SCALARS))}
+    out["atm"] = _atm(oc.get("atm"))
+    return out
+
+
+def emit_audit_snapshot(index: str, ltp: float, oc: dict, breadth: dict,
+                        signal_stack: list[str], greeks_at_decision: dict,
+                        risk_state: dict, ts: str,
+                        journal: Optional[AuditJournal] = None) -> dict:
+    """
+    Log the snapshot, or append it to the deduplicated binary `journal` when one is
+    configured.
+    """
     snap = {
         "audit_snapshot": {
             "index": index,
             "ltp": ltp,
-            "oc_summary": oc,
+            "oc_summary": oc_summary(oc),
             "breadth": breadth,
             "signal_stack": signal_stack,
             "greeks_at_decision": greeks_at_decision,
@@ -15,5 +49,8 @@ def emit_audit_snapshot(index: str, ltp: float, oc: dict, breadth: dict, signal_
             "timestamp": ts,
         }
     }
-    log.info("audit_snapshot", extra={"_extra": snap})
+    if journal is not None:
+        journal.append(snap["audit_snapshot"])
+    else:
+        log.info("audit_snapshot", extra={"_extra": snap})
     return snap
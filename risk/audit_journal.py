@@ -0,0 +1,320 @@
+# risk/audit_journal.py
+"""
+Deduplicated binary audit journal.
+
+emit_audit_snapshot() fires on every no-trade tick while the chain summary,
+breadth, signals, greeks and risk state are mostly unchanged, so each
+component is stored once per segment (content-addressed) and a snapshot
+record is just (ts, index, ltp, component ids).
+
+On-disk layout under <root>/:
+  indices.json                 index-id -> index name
+  <YYYY-MM-DD>-<nnnn>.seg      zlib blocks: [u32 comp_len][u32 raw_len][payload]
+  <YYYY-MM-DD>-<nnnn>.idx      one BLOCK_DTYPE row per block: time range, index
+                               bitmask, file offset (np.memmap-able)
+  <YYYY-MM-DD>-<nnnn>.bix      one BLOB_DTYPE row per stored component: block, offset
+A block payload is a run of entries:
+  blob:   u8 1, u32 blob_id, u32 len, canonical JSON
+  record: u8 2, u16 index_id, f8 ts, f8 ltp, u32 blob_id x len(COMPONENTS)
+Blob ids restart in every segment, so each segment decodes on its own.
+Side-index rows are written only after their block, so a reader never sees a
+row pointing at unwritten data.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from marketdata.tick_recorder import day_of
+from utils.instruments import IST
+from utils.logger import log
+
+COMPONENTS = ("oc_summary", "breadth", "signal_stack", "greeks_at_decision",
+              "risk_state")
+BLOCK_DTYPE = np.dtype([("ts_first", "<f8"), ("ts_last", "<f8"), ("indices", "<u8"),
+                        ("block", "<u8"), ("records", "<u4")])
+BLOB_DTYPE = np.dtype([("block", "<u8"), ("off", "<u4")])
+_BLOCK = struct.Struct("<II")
+_BLOB = struct.Struct("<BII")
+_RECORD = struct.Struct("<BHdd" + "I" * len(COMPONENTS))
+
+try:  # optional fast encoder (same as utils.logger)
+    import orjson
+    _ORJSON_OPTS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_SERIALIZE_NUMPY)
+
+    def _canonical(v: Any) -> bytes:
+        return orjson.dumps(v, default=str, option=_ORJSON_OPTS)
+except ImportError:
+    def _canonical(v: Any) -> bytes:
+        return json.dumps(v, sort_keys=True, separators=(",", ":"),
+                          default=str).encode()
+
+
+def _to_epoch(ts: Any) -> float:
+    return datetime.fromisoformat(ts).timestamp() if isinstance(ts, str) else float(ts)
+
+
+def _load_indices(root: str) -> List[str]:
+    path = os.path.join(root, "indices.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class AuditJournal:
+    """
+    Append-only writer. Entries are buffered and compressed into a block every
+    `block_records` snapshots or `flush_interval` seconds; segments rotate at
+    `segment_bytes` or on a new IST day.
+    """
+
+    def __init__(self, root: str = "data/audit", segment_bytes: int = 64 * 1024 * 1024,
+                 block_records: int = 256, flush_interval: float = 1.0,
+                 level: int = 6) -> None:
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.level = level
+        os.makedirs(root, exist_ok=True)
+        self._indices = _load_indices(root)
+        self._index_ids = {s: i for i, s in enumerate(self._indices)}
+        self._seg = self._idx = self._bix = None
+        self._seg_name: Optional[str] = None
+        self._day: Optional[str] = None
+        self._day_start = float("-inf")   # epoch of the current segment's IST midnight
+        self._blob_ids: Dict[bytes, int] = {}
+        # (index, component) -> (bytes, id)
+        self._last: Dict[Tuple[int, int], Tuple[bytes, int]] = {}
+        self._buf = bytearray()
+        self._blob_offs: List[int] = []   # offsets of blobs added to the current block
+        self._ts_first = self._ts_last = 0.0
+        self._mask = 0
+        self._n_records = 0
+        self._t_flush = time.monotonic()
+        self._counts = {"snapshots": 0, "blobs": 0, "raw_bytes": 0, "written_bytes": 0,
+                        "segments": 0}
+
+    # -- segments ---------------------------------------------------------------------
+
+    def _open_segment(self, day: str) -> None:
+        self._close_segment()
+        n = sum(1 for f in os.listdir(self.root)
+                if f.startswith(day) and f.endswith(".seg"))
+        self._seg_name = f"{day}-{n:04d}"
+        self._day = day
+        self._seg = open(os.path.join(self.root, self._seg_name + ".seg"), "ab")
+        self._idx = open(os.path.join(self.root, self._seg_name + ".idx"), "ab")
+        self._bix = open(os.path.join(self.root, self._seg_name + ".bix"), "ab")
+        self._blob_ids.clear()
+        self._last.clear()
+        self._counts["segments"] += 1
+        log.info("audit_journal_segment", extra={"_extra": {"segment": self._seg_name}})
+
+    def _close_segment(self) -> None:
+        self.flush()
+        for f in (self._seg, self._idx, self._bix):
+            if f is not None:
+                f.close()
+        self._seg = self._idx = self._bix = None
+
+    def _index_id(self, index: str) -> int:
+        iid = self._index_ids.get(index)
+        if iid is None:
+            iid = self._index_ids[index] = len(self._indices)
+            self._indices.append(index)
+            with open(os.path.join(self.root, "indices.json"), "w",
+                      encoding="utf-8") as f:
+                json.dump(self._indices, f)
+        return iid
+
+    # -- writing -----------------------------------------------------------------------
+
+    def _blob(self, iid: int, comp: int, value: Any) -> int:
+        data = _canonical(value)
+        self._counts["raw_bytes"] += len(data)
+        last = self._last.get((iid, comp))
+        if last is not None and last[0] == data:
+            return last[1]
+        bid = self._blob_ids.get(data)
+        if bid is None:
+            bid = self._blob_ids[data] = len(self._blob_ids)
+            self._blob_offs.append(len(self._buf))
+            self._buf += _BLOB.pack(1, bid, len(data))
+            self._buf += data
+            self._counts["blobs"] += 1
+        self._last[(iid, comp)] = (data, bid)
+        return bid
+
+    def append(self, snap: Dict[str, Any]) -> None:
+        """Journal one audit_snapshot payload (emit_audit_snapshot's inner dict)."""
+        ts = _to_epoch(snap["timestamp"])
+        if (not self._day_start <= ts < self._day_start + 86400
+                or self._seg.tell() >= self.segment_bytes):
+            day = day_of(ts)
+            start = datetime.fromisoformat(day).replace(tzinfo=IST)
+            self._day_start = start.timestamp()
+            self._open_segment(day)
+        iid = self._index_id(snap["index"])
+        ids = [self._blob(iid, c, snap.get(k)) for c, k in enumerate(COMPONENTS)]
+        self._buf += _RECORD.pack(2, iid, ts, float(snap.get("ltp") or 0.0), *ids)
+        if not self._n_records:
+            self._ts_first = ts
+        self._ts_last = max(self._ts_last, ts)
+        self._mask |= 1 << min(iid, 63)
+        self._counts["snapshots"] += 1
+        self._n_records += 1
+        if (self._n_records >= self.block_records
+                or time.monotonic() - self._t_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        self._t_flush = time.monotonic()
+        if not self._buf or self._seg is None:
+            return
+        comp = zlib.compress(bytes(self._buf), self.level)
+        block_off = self._seg.tell()
+        self._seg.write(_BLOCK.pack(len(comp), len(self._buf)))
+        self._seg.write(comp)
+        self._seg.flush()
+        blobs = np.array([(block_off, off) for off in self._blob_offs],
+                         dtype=BLOB_DTYPE)
+        self._bix.write(blobs.tobytes())
+        self._bix.flush()
+        row = np.array([(self._ts_first, self._ts_last, self._mask, block_off,
+                         self._n_records)], dtype=BLOCK_DTYPE)
+        self._idx.write(row.tobytes())
+        self._idx.flush()
+        self._counts["written_bytes"] += (_BLOCK.size + len(comp) + blobs.nbytes
+                                          + row.nbytes)
+        self._buf.clear()
+        self._blob_offs.clear()
+        self._ts_last = 0.0
+        self._mask = 0
+        self._n_records = 0
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def close(self) -> None:
+        self._close_segment()
+        log.info("audit_journal_closed", extra={"_extra": self.stats()})
+
+
+def _memmap(path: str, dtype: np.dtype) -> np.ndarray:
+    n = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    return (np.memmap(path, dtype=dtype, mode="r", shape=(n,)) if n
+            else np.zeros(0, dtype=dtype))
+
+
+class _Segment:
+    def __init__(self, root: str, name: str) -> None:
+        self.name = name
+        self.path = os.path.join(root, name + ".seg")
+        self.blocks = _memmap(os.path.join(root, name + ".idx"), BLOCK_DTYPE)
+        # row k = blob id k
+        self.blobs = _memmap(os.path.join(root, name + ".bix"), BLOB_DTYPE)
+        self.ts_first = np.asarray(self.blocks["ts_first"])
+
+
+class AuditReader:
+    """
+    Random access over a journal: snapshot_at() binary-searches the per-block
+    side index and decodes only the blocks it needs (LRU-cached).
+    """
+
+    def __init__(self, root: str = "data/audit", cache_blocks: int = 64) -> None:
+        self.root = root
+        self.indices = _load_indices(root)
+        names = sorted(f[:-4] for f in os.listdir(root) if f.endswith(".idx"))
+        self.segments = [_Segment(root, n) for n in names]
+        self._blocks: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+
+    def _block(self, seg: _Segment, off: int) -> bytes:
+        key = (seg.name, off)
+        data = self._blocks.get(key)
+        if data is not None:
+            self._blocks.move_to_end(key)
+            return data
+        with open(seg.path, "rb") as f:
+            f.seek(off)
+            clen, _ = _BLOCK.unpack(f.read(_BLOCK.size))
+            data = zlib.decompress(f.read(clen))
+        self._blocks[key] = data
+        if len(self._blocks) > self._cache_blocks:
+            self._blocks.popitem(last=False)
+        return data
+
+    @staticmethod
+    def _records(data: bytes) -> Iterator[Tuple[Any, ...]]:
+        """Record tuples of one block payload, skipping blob entries."""
+        pos, n = 0, len(data)
+        while pos < n:
+            if data[pos] == 1:
+                pos += _BLOB.size + _BLOB.unpack_from(data, pos)[2]
+            else:
+                yield _RECORD.unpack_from(data, pos)
+                pos += _RECORD.size
+
+    def _blob(self, seg: _Segment, bid: int) -> Any:
+        row = seg.blobs[bid]
+        data = self._block(seg, int(row["block"]))
+        start = int(row["off"]) + _BLOB.size
+        length = _BLOB.unpack_from(data, int(row["off"]))[2]
+        return json.loads(data[start:start + length])
+
+    def _snapshot(self, seg: _Segment, f: Tuple[Any, ...]) -> Dict[str, Any]:
+        snap = {"index": self.indices[f[1]], "ltp": f[3]}
+        for k, bid in zip(COMPONENTS, f[4:]):
+            snap[k] = self._blob(seg, bid)
+        snap["timestamp"] = datetime.fromtimestamp(f[2], tz=IST).isoformat()
+        return {"audit_snapshot": snap}
+
+    def snapshot_at(self, index: str, ts: Any) -> Optional[Dict[str, Any]]:
+        """
+        Latest snapshot for `index` at or before `ts` (epoch seconds or ISO string).
+        """
+        if index not in self.indices:
+            return None
+        iid, t = self.indices.index(index), _to_epoch(ts)
+        bit = 1 << min(iid, 63)
+        for seg in reversed(self.segments):
+            k = int(np.searchsorted(seg.ts_first, t, side="right"))
+            for b in range(k - 1, -1, -1):
+                blk = seg.blocks[b]
+                if not int(blk["indices"]) & bit:
+                    continue
+                best = None
+                for f in self._records(self._block(seg, int(blk["block"]))):
+                    if f[1] == iid and f[2] <= t:
+                        best = f
+                if best is not None:
+                    return self._snapshot(seg, best)
+        return None
+
+    def iter(self, index: Optional[str] = None, start: Any = None,
+             end: Any = None) -> Iterator[Dict[str, Any]]:
+        """
+        Snapshots in write order, optionally for one index and within [start, end].
+        """
+        if index is not None and index not in self.indices:
+            return
+        iid = self.indices.index(index) if index is not None else None
+        lo = _to_epoch(start) if start is not None else -np.inf
+        hi = _to_epoch(end) if end is not None else np.inf
+        for seg in self.segments:
+            for blk in seg.blocks:
+                if blk["ts_last"] < lo or blk["ts_first"] > hi:
+                    continue
+                if iid is not None and not int(blk["indices"]) & (1 << min(iid, 63)):
+                    continue
+                for f in self._records(self._block(seg, int(blk["block"]))):
+                    if (iid is None or f[1] == iid) and lo <= f[2] <= hi:
+                        yield self._snapshot(seg, f)
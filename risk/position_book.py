@@ -0,0 +1,226 @@
+# risk/position_book.py
+from typing import Any, Callable, Dict, List, Optional
+from utils.logger import log
+
+_IST_OFFSET = 5 * 3600 + 30 * 60
+_DAY = 86400
+
+
+class Position:
+    """
+    One open leg. Prices are in the units of `ref` (the symbol whose ticks mark it).
+    """
+    __slots__ = ("tradingsymbol", "underlying", "ref", "opt_type", "side", "qty",
+                 "entry", "stop", "initial_stop", "risk_pts", "trail", "to_cost_r",
+                 "mark", "best", "opened_ts", "closed")
+
+    def __init__(self, tradingsymbol: str, underlying: str, ref: str, opt_type: str,
+                 side: int, qty: int, entry: float, stop: float, trail: float,
+                 to_cost_r: Optional[float], ts: float) -> None:
+        self.tradingsymbol = tradingsymbol
+        self.underlying = underlying
+        self.ref = ref
+        self.opt_type = opt_type
+        self.side = side
+        self.qty = qty
+        self.entry = entry
+        self.stop = stop
+        self.initial_stop = stop
+        self.risk_pts = abs(entry - stop)
+        self.trail = trail
+        self.to_cost_r = to_cost_r
+        self.mark = entry
+        self.best = entry
+        self.opened_ts = ts
+        self.closed = False
+
+    @property
+    def pnl(self) -> float:
+        return (self.mark - self.entry) * self.side * self.qty
+
+    @property
+    def r(self) -> float:
+        return ((self.mark - self.entry) * self.side / self.risk_pts if self.risk_pts
+                else 0.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"tradingsymbol": self.tradingsymbol, "underlying": self.underlying,
+                "opt_type": self.opt_type, "side": self.side, "qty": self.qty,
+                "entry": self.entry, "stop": self.stop, "mark": self.mark,
+                "pnl": round(self.pnl, 2), "r": round(self.r, 3)}
+
+
+class PositionBook:
+    """
+    Open legs keyed by tradingsymbol, marked to market from the tick feed.
+
+    Each leg subscribes to one `ref` symbol: its own option tradingsymbol when
+    option ticks are fed, or the underlying index (delta-1 proxy, as in the
+    backtester, with the stop on the underlying as in TradeDecision). on_tick()
+    touches only the legs on that symbol, O(1) each:
+      - unrealized PnL is adjusted by the mark change, so day PnL is a running sum
+      - the stop trails `trail` points behind the best price (tsl) and moves
+        to cost once the leg is `to_cost_r` R in profit
+      - a price through the stop closes the leg at that price and calls
+        on_close(position, reason, ts) with reason "stop" or "trailing_stop"
+    Day PnL restarts at each IST session; open legs carry their marks over.
+    """
+
+    def __init__(self, capital: float,
+                 on_close: Optional[Callable[[Position, str, float], None]] = None
+                 ) -> None:
+        self.capital = capital
+        self.on_close = on_close
+        self.positions: Dict[str, Position] = {}
+        self._by_ref: Dict[str, List[Position]] = {}
+        self.realized = 0.0        # today
+        self.unrealized = 0.0      # all open legs
+        self._base = 0.0           # unrealized carried in from the previous session
+        self._day = None
+
+    def _roll(self, ts: float) -> None:
+        day = int((ts + _IST_OFFSET) // _DAY)
+        if day != self._day:
+            if self._day is not None:
+                log.info("position_book_day_end", extra={"_extra": {
+                    "realized": round(self.realized, 2), "open": len(self.positions)}})
+            self._day = day
+            self.realized = 0.0
+            self._base = self.unrealized
+
+    # -- legs --------------------------------------------------------------------------
+
+    def open(self, tradingsymbol: str, underlying: str, qty: int, entry: float,
+             stop: float, ts: float, opt_type: str = "CE", ref: Optional[str] = None,
+             trail: float = 0.0, to_cost_r: Optional[float] = None) -> Position:
+        """
+        Book a filled leg; side follows the stop (stop below entry = long). Adds to an
+        existing leg's qty.
+        """
+        self._roll(ts)
+        pos = self.positions.get(tradingsymbol)
+        if pos is not None:
+            # average in: keep the leg's stop, re-mark the added qty at the fill price
+            self.unrealized += (pos.mark - entry) * pos.side * qty
+            pos.entry = (pos.entry * pos.qty + entry * qty) / (pos.qty + qty)
+            pos.qty += qty
+            pos.risk_pts = abs(pos.entry - pos.initial_stop)
+            return pos
+        side = 1 if stop < entry else -1
+        pos = Position(tradingsymbol, underlying, ref or underlying, opt_type, side,
+                       qty, entry, stop, trail, to_cost_r, ts)
+        self.positions[tradingsymbol] = pos
+        self._by_ref.setdefault(pos.ref, []).append(pos)
+        return pos
+
+    def close(self, tradingsymbol: str, price: float, ts: float,
+              reason: str = "exit") -> Optional[Position]:
+        pos = self.positions.pop(tradingsymbol, None)
+        if pos is None:
+            return None
+        self._roll(ts)
+        self.unrealized -= pos.pnl
+        pos.mark = price
+        self.realized += pos.pnl
+        pos.closed = True
+        legs = self._by_ref[pos.ref]
+        legs.remove(pos)
+        if not legs:
+            del self._by_ref[pos.ref]
+        log.info("position_closed", extra={"_extra": {
+            "position": pos.as_dict(), "reason": reason,
+            "day_pnl_pct": round(self.day_pnl_pct * 100, 3)}})
+        if self.on_close is not None:
+            self.on_close(pos, reason, ts)
+        return pos
+
+    # -- ticks -------------------------------------------------------------------------
+
+    def on_tick(self, symbol: str, price: float, ts: float) -> int:
+        """
+        Mark legs on `symbol`; returns how many were touched (0 = day PnL unchanged).
+        """
+        legs = self._by_ref.get(symbol)
+        if not legs:
+            return 0
+        if int((ts + _IST_OFFSET) // _DAY) != self._day:
+            self._roll(ts)
+        hits = []
+        du = 0.0
+        for pos in legs:
+            side = pos.side
+            du += (price - pos.mark) * side * pos.qty
+            pos.mark = price
+            if (price - pos.best) * side > 0:
+                pos.best = price
+                if pos.trail:
+                    s = price - pos.trail * side
+                    if (s - pos.stop) * side > 0:
+                        pos.stop = s
+                if (pos.to_cost_r is not None
+                        and (price - pos.entry) * side >= pos.to_cost_r * pos.risk_pts
+                        and (pos.entry - pos.stop) * side > 0):
+                    pos.stop = pos.entry
+            if (price - pos.stop) * side <= 0:
+                hits.append(pos)
+        self.unrealized += du
+        n = len(legs)
+        for pos in hits:
+            self.close(pos.tradingsymbol, price, ts,
+                       "trailing_stop" if pos.stop != pos.initial_stop else "stop")
+        return n
+
+    # -- persistence -------------------------------------------------------------------
+
+    def to_state(self) -> Dict[str, Any]:
+        """Open legs (stops, marks, trail state) and today's realized PnL, JSON-safe."""
+        return {"day": self._day, "realized": self.realized, "base": self._base,
+                "positions": [{k: getattr(p, k) for k in Position.__slots__
+                               if k != "closed"}
+                              for p in self.positions.values()]}
+
+    def restore(self, state: Dict[str, Any], ts: float) -> None:
+        """
+        Rebuild the book from to_state() after a restart; `ts` (now) rolls a stale day.
+        """
+        self.positions.clear()
+        self._by_ref.clear()
+        for d in state.get("positions", ()):
+            pos = Position(d["tradingsymbol"], d["underlying"], d["ref"], d["opt_type"],
+                           d["side"], d["qty"], d["entry"], d["initial_stop"],
+                           d["trail"], d["to_cost_r"], d["opened_ts"])
+            pos.stop, pos.risk_pts, pos.mark, pos.best = (d["stop"], d["risk_pts"],
+                                                          d["mark"], d["best"])
+            self.positions[pos.tradingsymbol] = pos
+            self._by_ref.setdefault(pos.ref, []).append(pos)
+        self.unrealized = sum(p.pnl for p in self.positions.values())
+        self._day = state.get("day")
+        self.realized = float(state.get("realized", 0.0))
+        self._base = float(state.get("base", 0.0))
+        self._roll(ts)
+
+    # -- views -------------------------------------------------------------------------
+
+    @property
+    def day_pnl(self) -> float:
+        return self.realized + self.unrealized - self._base
+
+    @property
+    def day_pnl_pct(self) -> float:
+        """
+        Day PnL as a fraction of capital (the unit of risk.yml max_daily_loss_pct).
+        """
+        return self.day_pnl / self.capital if self.capital else 0.0
+
+    def open_count(self, opt_type: Optional[str] = None) -> int:
+        if opt_type is None:
+            return len(self.positions)
+        return sum(1 for p in self.positions.values() if p.opt_type == opt_type)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [p.as_dict() for p in self.positions.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open": len(self.positions), "realized": round(self.realized, 2),
+                "unrealized": round(self.unrealized, 2),
+                "day_pnl_pct": round(self.day_pnl_pct * 100, 4)}
@@ -0,0 +1,248 @@
+# risk/risk_engine.py
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from risk.risk_guard import _secs
+from utils.logger import log
+
+_IST_OFFSET = 5 * 3600 + 30 * 60
+_DAY = 86400
+
+
+@dataclass(frozen=True)
+class RiskRules:
+    """
+    risk.yml compiled once: times as IST seconds-of-day, percentages as
+    fractions/thresholds.
+    """
+    # the raw config these rules came from (sizing, tsl, ...)
+    cfg: Dict[str, Any]
+    no_trade_before: Optional[int]
+    no_new_entry_after: Optional[int]
+    max_daily_loss_pct: float           # fraction, e.g. 0.03
+    max_positions: int
+    # |VIX change from day open| in %, None = disabled
+    vol_spike_pct: Optional[float]
+    cooldown_s: float
+    side_cap: Dict[str, int]            # "CE"/"PE" -> max open positions on that side
+    exchange_halt_respect: bool
+    slippage_limit_pct: Optional[float]
+    version: int = 0
+
+
+def compile_rules(cfg: Dict[str, Any], version: int = 0) -> RiskRules:
+    """Validate and precompute risk.yml; raises ValueError on a bad config."""
+    try:
+        tg = cfg.get("time_guards") or {}
+        vs = cfg.get("halt_on_vol_spike") or {}
+        cb = cfg.get("circuit_breakers") or {}
+        cap = cfg.get("single_side_cap") or {}
+        cd = cfg.get("cooldowns") or {}
+        max_positions = int(cfg.get("max_positions", 1))
+        rules = RiskRules(
+            cfg=cfg,
+            no_trade_before=(_secs(tg["no_trade_before"])
+                             if tg.get("no_trade_before") else None),
+            no_new_entry_after=(_secs(tg["no_new_entry_after"])
+                                if tg.get("no_new_entry_after") else None),
+            max_daily_loss_pct=abs(float(cfg.get("max_daily_loss_pct", 0.03))),
+            max_positions=max_positions,
+            vol_spike_pct=(float(vs.get("vix_change_pct", 8.0)) if vs.get("enabled")
+                           else None),
+            cooldown_s=float(cd.get("after_stop_minutes", 0)) * 60.0,
+            side_cap={"CE": int(cap.get("ce_max_positions", max_positions)),
+                      "PE": int(cap.get("pe_max_positions", max_positions))},
+            exchange_halt_respect=bool(cb.get("exchange_halt_respect", True)),
+            slippage_limit_pct=(float(cb["slippage_limit_pct"])
+                                if cb.get("slippage_limit_pct") is not None else None),
+            version=version,
+        )
+        # used by sizing; fail the reload rather than the next trade
+        float(cfg["per_trade_risk_pct"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid risk config: {e!r}") from e
+    return rules
+
+
+class RiskEngine:
+    """
+    Live pre-trade risk: risk.yml compiled into RiskRules plus incrementally
+    updated state, so check() is a handful of comparisons per tick.
+
+    State is fed by events rather than recomputed:
+      on_fill()      open / close a position (per CE/PE side); a stop-out starts
+                     the cooldown
+      on_vix()       India VIX ticks; halts new entries while
+                     |change from day open| >= vix_change_pct
+      set_day_pnl()  day PnL % from the position tracker
+      set_exchange_halt()
+    `state` is replaced (never mutated) on change, so it can be logged or
+    audited by reference. `rules` is swapped in one assignment by reload();
+    callers read it once per decision for a consistent view.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], path: Optional[str] = None) -> None:
+        self.path = path
+        self.rules = compile_rules(cfg)
+        self._mtime = os.stat(path).st_mtime_ns if path else None
+        self._by_side = {"CE": 0, "PE": 0}
+        self._cooldown_until = 0.0
+        self._vix_day = None
+        self._vix_open = None
+        self.day_pnl_pct = 0.0
+        self.state: Dict[str, Any] = {"open_positions": 0, "vol_spike_halt": False,
+                                      "cooldown_active": False, "exchange_halt": False,
+                                      "ce_positions": 0, "pe_positions": 0}
+
+    @classmethod
+    def from_file(cls, path: str) -> "RiskEngine":
+        import yaml   # ~20 ms at import time; only needed to read risk.yml
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(yaml.safe_load(f), path)
+
+    @property
+    def cfg(self) -> Dict[str, Any]:
+        return self.rules.cfg
+
+    def _set(self, **changes: Any) -> None:
+        self.state = {**self.state, **changes}
+
+    # -- per-tick check ----------------------------------------------------------------
+
+    def check_time(self, ts: float) -> Optional[str]:
+        r = self.rules
+        sod = (ts + _IST_OFFSET) % _DAY
+        if r.no_trade_before is not None and sod < r.no_trade_before:
+            return "time_guard:too_early"
+        if r.no_new_entry_after is not None and sod > r.no_new_entry_after:
+            return "time_guard:too_late"
+        return None
+
+    def check(self, ts: float, side: Optional[str] = None) -> Optional[str]:
+        """
+        Pre-trade blockers at epoch `ts`; `side` ("CE"/"PE") adds the single-side cap.
+        """
+        r, s = self.rules, self.state
+        if self._cooldown_until and ts >= self._cooldown_until:
+            self._cooldown_until = 0.0
+            self._set(cooldown_active=False)
+            s = self.state
+        if self.day_pnl_pct <= -r.max_daily_loss_pct:
+            return "risk_block:max_daily_loss"
+        if s["exchange_halt"] and r.exchange_halt_respect:
+            return "risk_block:exchange_halt"
+        if s["vol_spike_halt"] and r.vol_spike_pct is not None:
+            return "risk_block:vol_spike"
+        if s["cooldown_active"]:
+            return "risk_block:cooldown"
+        if s["open_positions"] >= r.max_positions:
+            return "risk_block:position_limit"
+        cap = r.side_cap.get(side, r.max_positions)
+        if side is not None and self._by_side.get(side, 0) >= cap:
+            return f"risk_block:side_cap_{side.lower()}"
+        return None
+
+    def slippage_ok(self, expected: float, price: float) -> bool:
+        """
+        circuit_breakers.slippage_limit_pct: is a fill/limit at `price` acceptable vs
+        `expected`?
+        """
+        lim = self.rules.slippage_limit_pct
+        return (lim is None or not expected
+                or abs(price - expected) / expected * 100.0 <= lim)
+
+    # -- state events ------------------------------------------------------------------
+
+    def on_fill(self, ts: float, side: str, opened: bool,
+                stop_hit: bool = False) -> None:
+        """
+        A position on `side` ("CE"/"PE") was opened, or closed (stop_hit: by its stop
+        loss).
+        """
+        n = self._by_side.get(side, 0) + (1 if opened else -1)
+        self._by_side[side] = max(n, 0)
+        changes: Dict[str, Any] = {"open_positions": sum(self._by_side.values()),
+                                   f"{side.lower()}_positions": self._by_side[side]}
+        if not opened and stop_hit and self.rules.cooldown_s > 0:
+            self._cooldown_until = ts + self.rules.cooldown_s
+            changes["cooldown_active"] = True
+        self._set(**changes)
+
+    def on_vix(self, ts: float, value: float) -> None:
+        day = int((ts + _IST_OFFSET) // _DAY)
+        if day != self._vix_day:
+            self._vix_day, self._vix_open = day, value
+        lim = self.rules.vol_spike_pct
+        halt = (lim is not None and bool(self._vix_open)
+                and abs(value / self._vix_open - 1.0) * 100.0 >= lim)
+        if halt != self.state["vol_spike_halt"]:
+            self._set(vol_spike_halt=halt)
+            log.info("risk_vol_spike", extra={"_extra": {"halt": halt, "vix": value,
+                                                         "vix_open": self._vix_open}})
+
+    def set_day_pnl(self, pct: float) -> None:
+        """Day PnL as a fraction of capital (-0.03 = -3%)."""
+        self.day_pnl_pct = pct
+
+    def set_exchange_halt(self, halted: bool) -> None:
+        if halted != self.state["exchange_halt"]:
+            self._set(exchange_halt=halted)
+
+    # -- persistence -------------------------------------------------------------------
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        Open positions per side and the stop-out cooldown; day PnL comes back from the
+        book.
+        """
+        return {"by_side": dict(self._by_side), "cooldown_until": self._cooldown_until}
+
+    def restore(self, state: Dict[str, Any], ts: float,
+                day_pnl_pct: float = 0.0) -> None:
+        """Re-apply to_state() after a restart at epoch `ts`."""
+        self._by_side = {"CE": 0, "PE": 0,
+                         **{k: int(v) for k, v in (state.get("by_side") or {}).items()}}
+        until = float(state.get("cooldown_until") or 0.0)
+        self._cooldown_until = until if until > ts else 0.0
+        self.day_pnl_pct = day_pnl_pct
+        self._set(open_positions=sum(self._by_side.values()),
+                  ce_positions=self._by_side["CE"], pe_positions=self._by_side["PE"],
+                  cooldown_active=bool(self._cooldown_until))
+
+    # -- hot reload --------------------------------------------------------------------
+
+    def reload(self, cfg: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Recompile from `cfg` (or re-read `path`); a bad config is logged and the old
+        rules kept.
+        """
+        import yaml
+        try:
+            if cfg is None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    cfg = yaml.safe_load(f)
+            rules = compile_rules(cfg, self.rules.version + 1)
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            log.info("risk_reload_failed",
+                     extra={"_extra": {"path": self.path, "error": repr(e)}})
+            return False
+        self.rules = rules
+        log.info("risk_reloaded",
+                 extra={"_extra": {"path": self.path, "version": rules.version}})
+        return True
+
+    async def watch(self, interval: float = 2.0) -> None:
+        """
+        Poll `path` and reload() when its mtime changes (editors replace files; no
+        inotify needed).
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
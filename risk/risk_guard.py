@@ -1,7 +1,10 @@
+from functools import lru_cache
 from typing import Dict, Any
 from datetime import datetime, time
+import numpy as np
 from utils.logger import log
 
+@lru_cache(maxsize=64)
 def _parse_t(hhmm: str) -> time:
     h, m = map(int, hhmm.split(":"))
     return time(hour=h, minute=m)
@@ -27,3 +30,51 @@ def pretrade_blockers(day_pnl_pct: float, risk_cfg: Dict[str, Any], state: Dict[
     if state.get("open_positions", 0) >= risk_cfg.get("max_positions", 1):
         return "risk_block:position_limit"
     return None
+
+
+# -- Batch (vectorized) versions for backtests ---------------------------------
+
+
+def _secs(hhmm: str) -> int:
+    t = _parse_t(hhmm)
+    return t.hour * 3600 + t.minute * 60
+
+
+def check_time_guards_batch(sec_of_day: np.ndarray, cfg: Dict[str, Any]) -> np.ndarray:
+    """
+    Vectorized check_time_guards() over IST seconds-of-day.
+    Returns an object array of reason strings (None where no guard fires).
+    """
+    tg = cfg.get("time_guards", {})
+    nnb = tg.get("no_trade_before")
+    nne = tg.get("no_new_entry_after")
+    out = np.full(len(sec_of_day), None, dtype=object)
+    if nne:
+        out[sec_of_day > _secs(nne)] = "time_guard:too_late"
+    if nnb:
+        out[sec_of_day < _secs(nnb)] = "time_guard:too_early"
+    return out
+
+
+def pretrade_blockers_batch(day_pnl_pct: np.ndarray, risk_cfg: Dict[str, Any],
+                            state: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Vectorized pretrade_blockers(); `state` values are per-bar arrays (or scalars).
+    """
+    n = len(day_pnl_pct)
+    out = np.full(n, None, dtype=object)
+    checks = [
+        (np.broadcast_to(state.get("open_positions", 0), n)
+         >= risk_cfg.get("max_positions", 1),
+         "risk_block:position_limit"),
+        (np.broadcast_to(state.get("cooldown_active", False), n).astype(bool),
+         "risk_block:cooldown"),
+        (np.broadcast_to(state.get("vol_spike_halt", False), n).astype(bool),
+         "risk_block:vol_spike"),
+        (day_pnl_pct <= -abs(risk_cfg.get("max_daily_loss_pct", 0.03)),
+         "risk_block:max_daily_loss"),
+    ]
+    # applied lowest-priority first so the scalar function's precedence wins
+    for mask, reason in checks:
+        out[mask] = reason
+    return out
@@ -0,0 +1,118 @@
+# risk/state_store.py
+"""
+Position book + risk engine state in one JSON file, so a restart resumes with
+the same open legs, per-side counts, stop-out cooldown and realized day PnL
+(the max_positions / max_daily_loss limits would otherwise start from zero).
+Written on every fill and close; tmp file + rename, so a crash mid-write
+leaves the previous state intact. The trading loop hands writes to a
+StateWriter so a slow disk never stalls a tick.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from risk.position_book import PositionBook
+from risk.risk_engine import RiskEngine
+from utils.logger import log
+
+
+def snapshot(book: PositionBook, risk: RiskEngine) -> Dict[str, Any]:
+    """JSON-safe copy of both states; later changes to either do not touch it."""
+    return {"saved_ts": time.time(), "book": book.to_state(), "risk": risk.to_state()}
+
+
+def save_state(path: str, book: PositionBook, risk: RiskEngine) -> bool:
+    """Synchronous write (startup, shutdown, tests); StateWriter on the hot path."""
+    return write_state(path, snapshot(book, risk))
+
+
+def write_state(path: str, state: Dict[str, Any]) -> bool:
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError as e:   # never take the feed down over a state write
+        log.info("state_save_failed",
+                 extra={"_extra": {"path": path, "error": repr(e)}})
+        return False
+    return True
+
+
+class StateWriter:
+    """
+    Coalescing background writer: save() snapshots the state on the calling
+    thread and returns; a daemon thread writes the newest snapshot. Saves that
+    arrive while a write is in progress replace each other (last state wins),
+    so a burst of fills costs one extra write and a disk stall costs nothing
+    on the event loop. close() writes whatever is still pending.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()    # close() may race a slow write
+        self._pending: Optional[Dict[str, Any]] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._counts = {"saved": 0, "written": 0, "coalesced": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="kp5-state-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def save(self, book: PositionBook, risk: RiskEngine) -> None:
+        state = snapshot(book, risk)
+        with self._lock:
+            if self._pending is not None:
+                self._counts["coalesced"] += 1
+            self._pending = state
+            self._counts["saved"] += 1
+        self._wake.set()
+
+    def _flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                state, self._pending = self._pending, None
+            if state is None:
+                return
+            ok = write_state(self.path, state)
+        with self._lock:
+            self._counts["written" if ok else "failed"] += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self._flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._flush()
+
+
+def load_state(path: str, book: PositionBook, risk: RiskEngine, ts: float) -> bool:
+    """
+    Restore `book` and `risk` from `path` at epoch `ts`; False when nothing was saved.
+    A corrupt file raises: trading on a guessed book is worse than not starting.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return False
+    book.restore(state.get("book") or {}, ts)
+    risk.restore(state.get("risk") or {}, ts, book.day_pnl_pct)
+    log.info("state_restored", extra={"_extra": {
+        "path": path, "saved_ts": state.get("saved_ts"), "positions": book.stats(),
+        "risk": risk.state}})
+    return True
@@ -1,104 +1,483 @@
-import os, time, yaml, asyncio
+import os, time, asyncio
+from concurrent.futures import Future
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any
-from utils.logger import log
-from utils.instruments import get_instrument
+from typing import Dict, Any, Optional
+from utils.logger import log, log_stats
+from utils.latency import Latency, serve_http
+from utils.instruments import (get_instrument, IST, VIX_SYMBOL, first_expiry_date,
+                               next_weekly_expiry, make_option_tradingsymbol)
 from marketdata.feed_ws import FeedWS
-from marketdata.option_chain_provider import OptionChainProvider
+from marketdata.bar_aggregator import BarAggregator, warm_from_broker
+from marketdata.tick_recorder import TickRecorder
+from marketdata.replay_feed import ReplayFeed, warm_from_recordings
+from marketdata.option_chain_provider import AsyncOptionChainProvider
+from marketdata.oi_store import OIStore
 from marketdata.sentiment_news import get_breadth
 from engine.signal_oi_momentum import detect as sig_oi
 from engine.signal_cpr_vwap import detect as sig_cpr
-from engine.indicators import calc_cpr, calc_vwap
 from engine.position_sizer import lots_for_risk
-from engine.schemas import TradeDecision, NoTrade
-from risk.risk_guard import pretrade_blockers, check_time_guards
+from engine.greeks import contract_greeks
+from risk.risk_engine import RiskEngine
+from risk.position_book import Position, PositionBook
 from risk.audit import emit_audit_snapshot
-from connectors.angel_one import AngelOneConnector
+from risk.audit_journal import AuditJournal
+from risk.state_store import StateWriter, load_state, save_state
+from utils.telegram import P_CRITICAL, P_ENTRY, TelegramNotifier, render_entry_decision
+from connectors.angel_one import AngelOneConnector, fetch_scrip_master
+from utils.instrument_master import InstrumentMaster
+from utils.startup import Startup, import_modules
 
 def load_yaml(path: str) -> Dict[str, Any]:
+    import yaml   # ~20 ms; deferred like the other heavy imports
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 def ist_now() -> datetime:
     return datetime.now(timezone.utc) + timedelta(hours=5, minutes=30)
 
-async def main():
-    # --- Load configs
-    risk_cfg = load_yaml("config/risk.yml")
-    strat_cfg = load_yaml("config/strategy.yml")
-    primary = strat_cfg["execution"]["primary_broker"]
-    index = strat_cfg["universe"]["indices"][0]  # choose first for demo
 
-    # --- Market data
-    feed = FeedWS([index])
-    ocp = OptionChainProvider("NSE")
-    connector = AngelOneConnector()  # TODO: map per primary
+def tick_time(tick: Dict[str, Any]) -> datetime:
+    """
+    IST time of a tick (equals ist_now() live; follows the recording during replay).
+    """
+    return datetime.fromtimestamp(float(tick["ts"]), tz=IST)
+
+
+def pick_contract(index: str, ltp: float, now: datetime,
+                  ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Nearest listed CE on the nearest listed expiry; falls back to rule-based
+    expiry/strike. Both follow first_expiry_date(): expiry-day contracts only before
+    same_day_expiry_until.
+    """
+    rules = ctx["strat_cfg"].get("expiry_rules", {})
+    same_day_until = rules.get("same_day_expiry_until")
+    master = ctx.get("instruments")
+    if master is not None:
+        expiry = master.nearest_expiry(index, first_expiry_date(now, same_day_until))
+        contract = master.contract(index, expiry, ltp, "CE") if expiry else None
+        if contract:
+            return contract
+    weekday = rules.get("nifty_weekly_day", "TUESDAY")
+    expiry_dt = next_weekly_expiry(index, now, weekday, same_day_until)
+    strike = int(round(ltp / 50) * 50)
+    return {"tradingsymbol": make_option_tradingsymbol(index, expiry_dt, strike, "CE"),
+            "token": None, "strike": strike, "expiry": expiry_dt.date().isoformat(),
+            "option_type": "CE"}
+
+
+def decision_greeks(oc: Dict[str, Any], spot: float, contract: Dict[str, Any],
+                    now: datetime) -> Dict[str, Any]:
+    """
+    IV/greeks for `contract`, priced from the chain's ATM leg when that is the same
+    strike.
+    """
+    atm = oc.get("atm") or {}
+    leg = atm.get(contract["option_type"]) or {}
+    same = (atm.get("strike") is not None
+            and float(atm["strike"]) == float(contract["strike"]))
+    return contract_greeks(spot, contract["strike"], contract["expiry"], now,
+                           leg.get("ltp") if same else None, contract["option_type"])
+
+
+# an unfilled decision (no paper booking) is not repeated for the same contract within
+# this window
+DECISION_HOLD_S = 300.0
+
+# engine.schemas pulls in pydantic (~0.15 s); it is imported where used and warmed on a
+# startup thread, so the runner's own import stays light.
+
 
-    capital = float(os.environ.get("CAPITAL", "17000"))  # rupees
-    day_pnl_pct = 0.0
-    risk_state = {"open_positions": 0, "vol_spike_halt": False, "cooldown_active": False}
+def _no_trade(reason: str, ts: str, index: str) -> None:
+    from engine.schemas import NoTradeEvent
+    payload = NoTradeEvent(reason, ts).as_dict()
+    payload["index"] = index
+    log.info("no_trade", extra={"_extra": payload})
 
+
+def _offer(q: asyncio.Queue, tick: Dict[str, Any]) -> bool:
+    """
+    Put `tick`, replacing any unconsumed one (conflation). Returns True if one was
+    dropped.
+    """
+    dropped = False
+    if q.full():
+        q.get_nowait()
+        q.task_done()
+        dropped = True
+    q.put_nowait(tick)
+    return dropped
+
+
+async def pump(feed: FeedWS, queues: Dict[str, asyncio.Queue],
+               bars: Dict[str, BarAggregator], stats: Dict[str, int],
+               recorder: TickRecorder | None = None, conflate: bool = True,
+               lat: Latency | None = None, risk: RiskEngine | None = None,
+               book: PositionBook | None = None) -> None:
+    """
+    Single reader of the multiplexed feed. Every tick updates that index's bars
+    (cheap, O(1)); the decision loop only ever sees the latest tick per index,
+    so a slow index conflates its own backlog instead of delaying the others.
+    conflate=False (replay) hands over every tick, waiting for the consumer.
+    India VIX ticks go straight to the risk engine; open positions are marked
+    (and stopped out) here, before the decision loop, and day PnL is pushed
+    to the risk engine.
+    """
+    stamp = lat is not None and lat.enabled
     async for tick in feed.ticks():
-        now = ist_now()
-        # Guards
-        tg = check_time_guards(now, risk_cfg)
-        if tg:
-            payload = NoTrade(reason=tg, timestamp=now.isoformat()).dict()
-            log.info("no_trade", extra={"_extra": payload})
-            continue
-        blk = pretrade_blockers(day_pnl_pct, risk_cfg, risk_state)
-        if blk:
-            payload = NoTrade(reason=blk, timestamp=now.isoformat()).dict()
-            log.info("no_trade", extra={"_extra": payload})
+        if recorder is not None:
+            recorder.record_tick(tick)
+        index = tick.get("symbol")
+        q = queues.get(index)
+        if q is None:
+            if index == VIX_SYMBOL and risk is not None:
+                risk.on_vix(float(tick["ts"]), float(tick["ltp"]))
             continue
+        if stamp:
+            tick["_rx_ns"] = lat.now()
+        bars[index].on_tick(tick)
+        if (book is not None
+                and book.on_tick(index, float(tick["ltp"]), float(tick["ts"]))
+                and risk is not None):
+            risk.set_day_pnl(book.day_pnl_pct)
+        if not conflate:
+            await q.put(tick)
+        elif _offer(q, tick):
+            stats[index] += 1
 
-        ltp = float(tick["ltp"])
-        oc = ocp.get_snapshot(index)
-        breadth = get_breadth()
 
-        # CPR/VWAP demo inputs — replace with rolling bars
-        day_high, day_low, prev_close = ltp+50, ltp-50, ltp-25
-        bc, pivot, tc = calc_cpr(day_high, day_low, prev_close)
-        vwap = ltp - 10  # stub
+async def handle_tick(index: str, tick: Dict[str, Any], bars: BarAggregator,
+                      ctx: Dict[str, Any]) -> None:
+    """
+    One pass of data -> signals -> risk -> decision. `ctx` holds configs and the shared
+    risk engine.
+    """
+    strat_cfg, ocp = ctx["strat_cfg"], ctx["ocp"]
+    risk = ctx["risk"]  # shared: max_positions / daily loss are cross-index
+    risk_cfg = risk.cfg  # one view of a hot-reloaded config per tick
+    lat = ctx["latency"]
+    t = lat.now()
+    tick_ts = float(tick["ts"])
+    now = tick_time(tick)
+    ts = now.isoformat()
+    # Guards
+    tg = risk.check_time(tick_ts)
+    t = lat.lap("time_guards", index, t)
+    if tg:
+        return _no_trade(tg, ts, index)
+    blk = risk.check(tick_ts, "CE")
+    t = lat.lap("pretrade_blockers", index, t)
+    if blk:
+        return _no_trade(blk, ts, index)
 
-        s1 = sig_oi(index, oc, strat_cfg["signals"]["oi_momentum"])
-        s2 = sig_cpr(index, ltp, vwap, {"bc": bc, "pivot": pivot, "tc": tc}, strat_cfg["signals"]["cpr_vwap"])
+    ltp = float(tick["ltp"])
+    cpr = bars.cpr()
+    if cpr is None:
+        return _no_trade("no_prev_session", ts, index)
+    t = lat.now()
+    oc = await ocp.get_snapshot(index)  # cached; refreshes in the background
+    t = lat.lap("chain_snapshot", index, t)
+    oi = ctx["oi_store"].observe(index, tick_ts, oc)  # ingests only refreshed snapshots
+    t = lat.lap("oi_store", index, t)
+    breadth = get_breadth()
+    t = lat.lap("breadth", index, t)
 
-        signal_stack = []
-        side = None
-        strength = 0
-        if s1["side"] == "LONG" and s2["side"] == "LONG":
-            side, strength = "BUY", int((s1["strength"] + s2["strength"]) / 2)
-            signal_stack = [f"oi_momentum:{s1['explain']}", f"cpr_vwap:{s2['explain']}"]
+    contract = pick_contract(index, ltp, now, ctx)
+    greeks = decision_greeks(oc, ltp, contract, now)
+    t = lat.lap("contract_greeks", index, t)
 
-        if not side:
-            snap = emit_audit_snapshot(index, ltp, oc, breadth, [s1, s2], {"delta": None, "iv": None}, risk_state, now.isoformat())
-            log.info("no_trade", extra={"_extra": {"no_trade": {"reason":"mixed_signals", "timestamp": now.isoformat()}}})
-            continue
+    s1 = sig_oi(index, oc, strat_cfg["signals"]["oi_momentum"], oi)
+    t = lat.lap("signal_oi", index, t)
+    s2 = sig_cpr(index, ltp, bars.vwap, cpr, strat_cfg["signals"]["cpr_vwap"])
+    t = lat.lap("signal_cpr", index, t)
 
-        # Sizing (assume 1% SL distance of LTP for demo; replace with ATR or rule)
-        stop_pts = max(ltp * 0.01, 5.0)
-        point_value = 1.0
-        lots, risk_budget = lots_for_risk(index, capital, risk_cfg["per_trade_risk_pct"], stop_pts, point_value)
-        if lots < 1:
-            payload = NoTrade(reason="under_min_size", timestamp=now.isoformat()).dict()
-            log.info("no_trade", extra={"_extra": payload})
-            continue
+    signal_stack = []
+    side = None
+    strength = 0
+    if s1["side"] == "LONG" and s2["side"] == "LONG":
+        side, strength = "BUY", int((s1["strength"] + s2["strength"]) / 2)
+        signal_stack = [f"oi_momentum:{s1['explain']}", f"cpr_vwap:{s2['explain']}"]
+
+    if not side:
+        emit_audit_snapshot(index, ltp, oc, breadth, [s1, s2], greeks,
+                            risk.state, ts, ctx.get("journal"))
+        lat.lap("audit", index, t)
+        log.info("no_trade", extra={"_extra": {"no_trade": {
+            "reason": "mixed_signals", "timestamp": ts, "index": index}}})
+        return
+
+    # Sizing: stop distance is atr_multiple x ATR of finished bars (tsl in risk.yml)
+    atr = bars.atr
+    if atr is None:
+        return _no_trade("atr_warmup", ts, index)
+    tsl = risk_cfg["tsl"]
+    stop_pts = tsl["atr_multiple"] * atr
+    point_value = 1.0
+    lots, risk_budget = lots_for_risk(index, ctx["capital"],
+                                      risk_cfg["per_trade_risk_pct"], stop_pts,
+                                      point_value)
+    t = lat.lap("sizing", index, t)
+    if lots < 1:
+        return _no_trade("under_min_size", ts, index)
+
+    # Shared risk state may have changed while we awaited the option chain
+    blk = risk.check(tick_ts, "CE")
+    if blk:
+        return _no_trade(blk, ts, index)
+
+    # Build decision
+    from engine.schemas import TradeDecisionEvent
+    td = TradeDecisionEvent(
+        index=index, action="BUY_CE", strike=int(contract["strike"]), option_type="CE",
+        expiry=contract["expiry"], entry_type="LIMIT", entry=ltp,
+        stop_loss=ltp - stop_pts, tsl=f"ATR({tsl['atr_multiple']})x", target=None,
+        r_multiple=1.5, lots=lots, confidence_pct=min(strength, 95),
+        signal_stack=signal_stack, greeks=greeks, risk_check="passed",
+        broker=ctx["primary"], reason="Confluence: OI momentum + CPR/VWAP", timestamp=ts
+    ).validated().model_dump()  # strict: this is what goes to the broker
+    t = lat.lap("schema", index, t)
+
+    # (Execution stub)
+    # fut = ctx["executor"].submit(OrderRequest(
+    #     symbol=contract["tradingsymbol"], side="BUY",
+    #     qty=lots*get_instrument(index).lot_size, price=ltp, order_type="LIMIT"))
+    # Positions are booked from fills only; paper mode fills every decision at its
+    # limit price. Without fills nothing is booked, so the same contract is not
+    # re-decided for a while.
+    sym = contract["tradingsymbol"]
+    book = ctx.get("positions")
+    paper = ctx.get("paper") and book is not None
+    decided = ctx.setdefault("decided", {})
+    last_sym, last_ts = decided.get(index, ("", 0.0))
+    if not paper and last_sym == sym and tick_ts - last_ts < DECISION_HOLD_S:
+        return _no_trade("decision_pending", ts, index)
+    decided[index] = (sym, tick_ts)
+    log.info("trade_decision",
+             extra={"_extra": {"trade_decision": td, "paper": bool(paper)}})
+    if paper:
+        book.open(sym, index, lots * get_instrument(index).lot_size, ltp,
+                  ltp - stop_pts, tick_ts, "CE",
+                  trail=stop_pts if tsl.get("enabled") else 0.0,
+                  to_cost_r=tsl.get("move_to_cost_after_r_multiple"))
+        risk.on_fill(tick_ts, "CE", opened=True)
+        if ctx.get("state") is not None:   # snapshot only; written off the loop
+            ctx["state"].save(book, risk)
+    if ctx.get("notifier") is not None:   # enqueue only; never waits on Telegram
+        ctx["notifier"].notify(("[paper] " if paper else "")
+                               + render_entry_decision(index, td["strike"], lots, ltp,
+                                                       td["stop_loss"],
+                                                       td["confidence_pct"],
+                                                       td["broker"]), P_ENTRY)
+    lat.lap("log", index, t)
+
+
+async def run_index(index: str, ticks: asyncio.Queue, bars: BarAggregator,
+                    ctx: Dict[str, Any]) -> None:
+    """Per-index decision loop; runs concurrently with the other indices."""
+    lat = ctx["latency"]
+    while True:
+        tick = await ticks.get()
+        t0 = lat.now()
+        try:
+            await handle_tick(index, tick, bars, ctx)
+        finally:
+            ticks.task_done()
+        if lat.enabled:
+            rx = tick.get("_rx_ns", t0)
+            lat.record("queue_wait", index, t0 - rx)
+            lat.lap("tick_to_decision", index, rx)
+
+
+def _connect_broker() -> AngelOneConnector:
+    return AngelOneConnector(load_instruments=False)  # TODO: map per primary
+
+
+def _warm_bars(bars: Dict[str, BarAggregator], risk: RiskEngine,
+               record_dir: Optional[str], login: Future) -> None:
+    """Restore bars from today's recordings; indices still without a previous session
+    (fresh install, no recorded previous day) are seeded from broker history."""
+    if record_dir:
+        warm_from_recordings(record_dir, bars, risk)
+    missing = {i: b for i, b in bars.items() if b.prev_hlc is None}
+    if missing:
+        warm_from_broker(login.result(), missing)
+
+
+async def _verify_broker_session(connector: AngelOneConnector, feed: FeedWS) -> None:
+    """
+    A cached broker session is used unverified at startup; check it off the hot path.
+    """
+    if not await asyncio.to_thread(connector.verify_session):
+        # the next reconnect uses the fresh session
+        feed.headers = connector.feed_headers()
+
+
+async def main():
+    # Warmups run concurrently (see utils.startup); `startup_timing` logs the per-phase
+    # breakdown.
+    st = Startup()
+    warm_imports = st.thread("imports", import_modules, "engine.schemas")
+
+    # --- Load configs (risk.yml is compiled and hot-reloaded by the risk engine)
+    with st.phase("config"):
+        risk = RiskEngine.from_file("config/risk.yml")
+        risk_cfg = risk.cfg
+        strat_cfg = load_yaml("config/strategy.yml")
+    indices = list(strat_cfg["universe"]["indices"])
+
+    # --- Market data: one multiplexed feed, one decision task per index
+    # KP5_REPLAY=<day dir>[,<day dir>...] replays recordings
+    #   (KP5_REPLAY_SPEED: 1, N, 0=max) with no broker/network;
+    # KP5_RECORD_DIR=<root> records live ticks and chain snapshots.
+    # KP5_AUDIT_DIR=<root> writes audit snapshots to the binary journal instead of
+    #   the log.
+    # TELEGRAM_BOT_TOKEN + TELEGRAM_CHAT_ID enable entry/error alerts (async, rate
+    #   limited).
+    # KP5_STATE_FILE (live; default data/state.json) keeps positions and risk state
+    #   across restarts.
+    # KP5_PAPER=1 books every decision as filled (paper trading); it is always on in
+    # replay and off by default live, where only execution fills may open positions.
+    replay_dir = os.environ.get("KP5_REPLAY")
+    paper = bool(replay_dir) or os.environ.get("KP5_PAPER") == "1"
+    state_path = (None if replay_dir
+                  else os.environ.get("KP5_STATE_FILE",
+                                      os.path.join("data", "state.json")))
+    record_dir = os.environ.get("KP5_RECORD_DIR")
+    audit_dir = os.environ.get("KP5_AUDIT_DIR")
+    recorder = TickRecorder(record_dir) if record_dir and not replay_dir else None
+    tsl = risk_cfg["tsl"]
+    bars = {i: BarAggregator(i, atr_period=int(tsl.get("atr_period", 14)),
+                             atr_tf=int(tsl.get("atr_bar_seconds", 60)))
+            for i in indices}
+    if replay_dir:
+        feed = ReplayFeed(replay_dir.split(","),
+                          speed=float(os.environ.get("KP5_REPLAY_SPEED", "0")),
+                          symbols=indices + [VIX_SYMBOL])
+        ocp = feed.chain_provider()
+        connector = instruments = None
+    else:
+        # login (or cached session), instrument master, first chain fetch and bar
+        # warm-up overlap
+        login = st.thread("broker_login", _connect_broker)
+        master = st.thread("instruments", InstrumentMaster.load, fetch_scrip_master,
+                           "NFO")
+        ocp = AsyncOptionChainProvider(
+            "NSE", on_snapshot=recorder.record_chain if recorder else None)
+        chains = st.task("option_chain",
+                         asyncio.gather(*(ocp.get_snapshot(i) for i in indices)))
+        warm = st.thread("bar_warmup", _warm_bars, bars, risk, record_dir, login)
+        connector = await asyncio.wrap_future(login)
+        feed = FeedWS(indices + [VIX_SYMBOL], headers=connector.feed_headers())
+        await st.task("feed_connect", feed.connect())
+        connector.instruments = instruments = await asyncio.wrap_future(master)
+        await chains
+        await asyncio.wrap_future(warm)
+    await asyncio.wrap_future(warm_imports)
+
+    ctx = {
+        "risk": risk,
+        "strat_cfg": strat_cfg,
+        "primary": strat_cfg["execution"]["primary_broker"],
+        "ocp": ocp,
+        "capital": float(os.environ.get("CAPITAL", "17000")),  # rupees
+        "instruments": instruments,
+        "latency": Latency.from_env(),
+        "journal": AuditJournal(audit_dir) if audit_dir else None,
+        "oi_store": OIStore(),   # per-strike OI history for real 5m/15m deltas
+        "positions": PositionBook(float(os.environ.get("CAPITAL", "17000"))),
+        "paper": paper,
+        "state": StateWriter(state_path) if state_path else None,
+        "notifier": (TelegramNotifier(os.environ["TELEGRAM_BOT_TOKEN"],
+                                      os.environ["TELEGRAM_CHAT_ID"])
+                     if os.environ.get("TELEGRAM_BOT_TOKEN")
+                     and os.environ.get("TELEGRAM_CHAT_ID") else None),
+    }
+    queues = {i: asyncio.Queue(maxsize=1) for i in indices}
+    conflated = {i: 0 for i in indices}
+
+    # --- Latency instrumentation (KP5_LATENCY=1): `latency_summary` every
+    #   KP5_LATENCY_REPORT_SECS;
+    # KP5_METRICS_PORT=<port> serves /metrics (Prometheus) and /profile/start|stop
+    #   on 127.0.0.1.
+    lat = ctx["latency"]
+    lat.add_gauge("feed_conflated_ticks", lambda: conflated)
+    lat.add_gauge("log_queue", log_stats)
+    if isinstance(feed, FeedWS):
+        lat.add_gauge("feed", feed.stats)
+    notifier = ctx["notifier"]
+    if notifier is not None:
+        notifier.start()
+        lat.add_gauge("telegram", notifier.stats)
+    book = ctx["positions"]
+    # before any tick: limits and the daily-loss halt carry over a restart
+    if state_path:
+        load_state(state_path, book, risk, time.time())
+        lat.add_gauge("state_writer", ctx["state"].stats)
+    lat.add_gauge("positions", book.stats)
+
+    def on_close(pos: Position, reason: str, ts: float) -> None:
+        risk.on_fill(ts, pos.opt_type, opened=False,
+                     stop_hit=reason in ("stop", "trailing_stop"))
+        risk.set_day_pnl(book.day_pnl_pct)
+        if ctx["state"] is not None:
+            ctx["state"].save(book, risk)
+        if notifier is not None:
+            notifier.notify(f"{'[paper] ' if paper else ''}*EXIT* {pos.tradingsymbol} "
+                            f"{reason} @ {pos.mark:.1f} | R {pos.r:+.2f} | "
+                            f"day {book.day_pnl_pct * 100:+.2f}%", P_CRITICAL)
+    book.on_close = on_close
+    metrics_port = os.environ.get("KP5_METRICS_PORT")
+    server = await serve_http(lat, port=int(metrics_port)) if metrics_port else None
 
-        # Build decision
-        strike = int(round(ltp / 50) * 50)
-        td = TradeDecision(
-            index=index, action="BUY_CE", strike=strike, option_type="CE",
-            expiry="2099-12-31", entry_type="LIMIT", entry=ltp, stop_loss=ltp - stop_pts,
-            tsl="ATR(1.5)x", target=None, r_multiple=1.5, lots=lots,
-            confidence_pct=min(strength, 95), signal_stack=signal_stack,
-            greeks={"delta": None, "iv": None}, risk_check="passed",
-            broker=primary, reason="Confluence: OI momentum + CPR/VWAP", timestamp=now.isoformat()
-        ).dict()
-
-        # (Execution stub)
-        # ack = connector.place_order(symbol=f"{index}{strike}CE", side="BUY", qty=lots*get_instrument(index).lot_size, price=ltp, order_type="LIMIT")
-        log.info("trade_decision", extra={"_extra": {"trade_decision": td}})
+    tasks = [asyncio.create_task(run_index(i, queues[i], bars[i], ctx),
+                                 name=f"index:{i}") for i in indices]
+    tasks.append(asyncio.create_task(pump(feed, queues, bars, conflated, recorder,
+                                          conflate=not replay_dir, lat=lat, risk=risk,
+                                          book=book), name="feed"))
+    aux = [asyncio.create_task(risk.watch(), name="risk_reload")]
+    if recorder is not None:
+        aux.append(asyncio.create_task(recorder.autoflush(1.0), name="recorder_flush"))
+    if connector is not None:
+        aux.append(asyncio.create_task(_verify_broker_session(connector, feed),
+                                       name="session_check"))
+    if lat.enabled:
+        every = float(os.environ.get("KP5_LATENCY_REPORT_SECS", "60"))
+        aux.append(asyncio.create_task(lat.report(every), name="latency_report"))
+    st.report(mode="replay" if replay_dir else "live", paper=paper)
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            t.result()  # surface a crashed index task / feed error
+        # feed ended (e.g. replay): let each index finish its last tick
+        await asyncio.gather(*(q.join() for q in queues.values()))
+    except Exception as e:
+        if notifier is not None:
+            notifier.notify(f"run_intraday stopped: {e!r}", P_CRITICAL)
+        raise
+    finally:
+        for t in tasks + aux:
+            t.cancel()
+        if server is not None:
+            server.close()
+        if lat.enabled:
+            log.info("latency_summary",
+                     extra={"_extra": {"latency": lat.summary(), "final": True}})
+        await ocp.close()
+        await feed.close()
+        if recorder is not None:
+            recorder.close()
+        if ctx["journal"] is not None:
+            ctx["journal"].close()
+        if ctx["state"] is not None:
+            ctx["state"].close()
+            save_state(state_path, book, risk)
+        log.info("positions_end",
+                 extra={"_extra": {"positions": book.stats(), "open": book.snapshot()}})
+        if notifier is not None:
+            await notifier.close()
+        log.info("feed_conflation", extra={"_extra": {
+            "conflated": conflated,
+            "feed": feed.stats() if isinstance(feed, FeedWS) else None}})
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,33 @@
+from marketdata.oi_store import OIStore
+from marketdata.option_chain_provider import _normalize
+from risk.audit import emit_audit_snapshot
+
+RAW = {"pcr": 0.95, "maxPain": 24600, "oiTrend": "CE_unwind",
+       "atm": {"strike": 24600,
+               "CE": {"ltp": 101.5, "iv": 0.131, "oi": 1.2e5, "delta": 0.52,
+                      "depth": [[101.4, 150]] * 5},
+               "PE": {"ltp": 98.0, "iv": 0.138, "oi": 9.5e4, "delta": -0.48}},
+       "chain": [{"strike": 24500 + 50 * k, "expiry": "2024-09-03",
+                  "CE": {"oi": 1e5}, "PE": {"oi": 9e4}} for k in range(40)]}
+
+
+def test_audit_summary_keeps_the_atm_legs_not_the_chain():
+    oc = _normalize(RAW)
+    ts = "2024-09-02T10:00:00+05:30"
+    snap = emit_audit_snapshot("NIFTY50", 24610.0, oc, {}, [], {}, {}, ts)
+    assert snap["audit_snapshot"]["oc_summary"] == {
+        "pcr": 0.95, "max_pain": 24600, "oi_trend": "CE_unwind",
+        "atm": {"strike": 24600,
+                "CE": {"ltp": 101.5, "iv": 0.131, "oi": 1.2e5, "delta": 0.52},
+                "PE": {"ltp": 98.0, "iv": 0.138, "oi": 9.5e4, "delta": -0.48}}}
+
+
+def test_audit_summary_without_atm():
+    oc = _normalize({"pcr": 1.1})
+    snap = emit_audit_snapshot("NIFTY50", 24610.0, oc, {}, [], {}, {}, "t")
+    assert snap["audit_snapshot"]["oc_summary"]["atm"] is None
+
+
+def test_oi_store_reads_the_chain_view():
+    store = OIStore()
+    assert store.update_snapshot("NIFTY50", 1.7e9, _normalize(RAW)) == 80
@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime
+
+from risk.audit_journal import AuditJournal, AuditReader
+from utils.instruments import IST
+
+T0 = 1725250200.0   # 2024-09-02 09:40 IST
+
+
+def _snap(i, t):
+    """Mostly unchanged no-trade snapshots; the chain summary moves every 50."""
+    oc = {"pcr": round(1.0 + (i // 50) / 100, 3), "max_pain": 24600,
+          "oi_trend": "CE_unwind PE_build",
+          "atm": {"strike": 24500,
+                  "CE": {"ltp": 101.5, "iv": 0.131, "oi": 1.2e5, "delta": 0.52},
+                  "PE": {"ltp": 98.0, "iv": 0.138, "oi": 9.5e4, "delta": -0.48}}}
+    return {"index": "NIFTY50" if i % 2 else "BANKNIFTY",
+            "ltp": 24500 + (i % 37) * 0.05, "oc_summary": oc,
+            "breadth": {"adv": 34, "dec": 16, "bias": "mild_bullish"},
+            "signal_stack": [{"side": None, "strength": 0, "explain": "no alignment"}],
+            "greeks_at_decision": {"delta": None, "iv": None},
+            "risk_state": {"open_positions": i // 1000, "cooldown_active": False},
+            "timestamp": datetime.fromtimestamp(t, tz=IST).isoformat()}
+
+
+def _write(root, n, t0=T0, **kw):
+    j = AuditJournal(root, **kw)
+    snaps = [_snap(i, t0 + i * 0.25) for i in range(n)]
+    for s in snaps:
+        j.append(s)
+    j.close()
+    return snaps, j.stats()
+
+
+def test_append_then_snapshot_at_round_trip(tmp_path):
+    root = str(tmp_path)
+    snaps, st = _write(root, 4000, block_records=128)
+    r = AuditReader(root)
+    for i in (1, 2, 127, 128, 129, 1001, 2500, 3998, 3999):
+        want = snaps[i]
+        got = r.snapshot_at(want["index"], T0 + i * 0.25)["audit_snapshot"]
+        assert got == {**want, "ltp": float(want["ltp"])}
+        # between two snapshots of this index, the earlier one is returned
+        mid = r.snapshot_at(want["index"], T0 + i * 0.25 + 0.3)["audit_snapshot"]
+        assert mid["timestamp"] == want["timestamp"]
+    assert r.snapshot_at("NIFTY50", T0 - 1) is None
+    assert r.snapshot_at("FINNIFTY", T0 + 10) is None
+    last = r.snapshot_at("NIFTY50", snaps[-1]["timestamp"])["audit_snapshot"]
+    assert last["timestamp"] == snaps[-1]["timestamp"]
+    # unchanged components are stored once per segment
+    assert st["blobs"] < 4000 // 50 * 2 + 20
+    disk = sum(os.path.getsize(os.path.join(root, f)) for f in os.listdir(root))
+    raw = sum(len(json.dumps(s)) for s in snaps)
+    assert disk * 20 < raw
+
+
+def test_iter_filters_and_days_roll_segments(tmp_path):
+    root = str(tmp_path)
+    _write(root, 100)
+    _write(root, 100, t0=T0 + 86400)         # next day, second writer: new segment
+    r = AuditReader(root)
+    assert len(r.segments) == 2
+    nifty = [s["audit_snapshot"] for s in r.iter("NIFTY50")]
+    assert len(nifty) == 100 and all(s["index"] == "NIFTY50" for s in nifty)
+    window = list(r.iter(start=T0 + 86400, end=T0 + 86400 + 4.75))
+    assert len(window) == 20
+    assert r.snapshot_at("BANKNIFTY", T0 + 86400 - 1)["audit_snapshot"]["timestamp"] \
+        == datetime.fromtimestamp(T0 + 98 * 0.25, tz=IST).isoformat()
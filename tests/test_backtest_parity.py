@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import yaml
+
+from backtest.backtest_engine import simulate, simulate_reference
+from bench.synthetic import SyntheticMarket
+
+
+def _cfg():
+    cfg = {}
+    for path in ("config/risk.yml", "config/strategy.yml"):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg.update(yaml.safe_load(f))
+    cfg["capital"] = 1e6
+    return cfg
+
+
+def _bars(seed, days=6):
+    bars = SyntheticMarket(seed=seed).bars(days)
+    # OI often drops >5% over the lookback, so the long path (and trades) is reached
+    rng = np.random.default_rng(seed)
+    bars["oi"] = rng.choice([1.0e6, 0.9e6, 0.8e6], len(bars["ts"]))
+    return bars
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_simulate_matches_reference(seed):
+    bars, cfg = _bars(seed), _cfg()
+    fast, ref = simulate(bars, cfg), simulate_reference(bars, cfg)
+
+    assert fast.reason.tolist() == ref.reason.tolist()
+    assert fast.trade_mask.sum() > 0
+    np.testing.assert_array_equal(fast.lots, ref.lots)
+    np.testing.assert_allclose(fast.stop_pts, ref.stop_pts, rtol=1e-12, equal_nan=True)
+    # the reference fills VWAP/TC/strength only on bars that reach the signals
+    seen = np.isfinite(ref.vwap)
+    assert seen.sum() > 0
+    np.testing.assert_allclose(fast.vwap[seen], ref.vwap[seen], rtol=1e-12)
+    np.testing.assert_allclose(fast.tc[seen], ref.tc[seen], rtol=1e-12)
+    np.testing.assert_array_equal(fast.strength[seen], ref.strength[seen])
+    assert fast.oi_trend[seen].tolist() == ref.oi_trend[seen].tolist()
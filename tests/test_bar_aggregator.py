@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from marketdata.bar_aggregator import BarAggregator, warm_from_broker
+from utils.instruments import IST
+
+NOW = datetime(2024, 9, 3, 9, 20, tzinfo=IST)   # Tuesday, just after the open
+
+
+class FakeHistory:
+    """
+    connector.candles() stand-in: Friday and Monday sessions plus today's partial day.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def candles(self, token, seconds, start, end, exchange="NSE"):
+        self.calls.append((token, seconds, start, end))
+        if seconds == 86400:
+            days = [(datetime(2024, 8, 30, tzinfo=IST), 24900.0, 24700.0, 24800.0),
+                    (datetime(2024, 9, 2, tzinfo=IST), 25000.0, 24600.0, 24650.0),
+                    (datetime(2024, 9, 3, tzinfo=IST), 24700.0, 24640.0, 24690.0)]
+            return [(d.timestamp(), c, h, lo, c, 0.0) for d, h, lo, c in days]
+        t0 = start.timestamp()
+        return [(t0 + seconds * k, 100.0, 102.0, 98.0, 100.0, 10.0) for k in range(375)]
+
+
+def test_warm_from_broker_seeds_previous_session_and_atr():
+    bars = {"NIFTY50": BarAggregator("NIFTY50", atr_period=14),
+            "INDIAVIX": BarAggregator("INDIAVIX")}
+    hist = FakeHistory()
+    seeded = warm_from_broker(hist, bars, now=NOW, atr_bars=60)
+    agg = bars["NIFTY50"]
+    # Monday, not today's partial day
+    assert seeded == {"NIFTY50": (25000.0, 24600.0, 24650.0)}
+    assert agg.cpr() is not None and bars["INDIAVIX"].prev_hlc is None
+    assert abs(agg.atr - 4.0) < 1e-9 and len(agg.bars(60)) == 60
+    _, seconds, start, _ = hist.calls[-1]
+    assert seconds == 60 and start == datetime(2024, 9, 2, 9, 15, tzinfo=IST)
+    # the first live tick opens today's session without discarding the seeded CPR
+    agg.on_tick({"ts": (NOW + timedelta(minutes=1)).timestamp(), "ltp": 24700.0})
+    assert agg.prev_hlc == (25000.0, 24600.0, 24650.0)
+
+
+def test_failed_history_leaves_index_unseeded():
+    class Down:
+        def candles(self, *a, **k):
+            raise RuntimeError("rate limited")
+
+    bars = {"NIFTY50": BarAggregator("NIFTY50")}
+    assert warm_from_broker(Down(), bars, now=NOW) == {}
+    assert bars["NIFTY50"].cpr() is None
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+from connectors.angel_one import AngelOneConnector
+from connectors.base import OrderNotSent
+from connectors.execution import ExecutionEngine, OrderRequest
+from connectors.sim_broker import SimBroker
+
+
+class NotSentOnce(SimBroker):
+    """Fails the first place with OrderNotSent, like a refused connection."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.refused = 0
+
+    def place_order(self, *args, **kw):
+        if not self.refused:
+            self.refused += 1
+            raise OrderNotSent("connection refused")
+        return super().place_order(*args, **kw)
+
+
+def _run(connectors, reqs, **kw):
+    async def go():
+        ex = ExecutionEngine(connectors, **kw)
+        await ex.start()
+        try:
+            return await asyncio.gather(*(ex.submit(r) for r in reqs))
+        finally:
+            await ex.stop()
+    return asyncio.run(go())
+
+
+def _live(*brokers):
+    return sum(b.stats()["open"] for b in brokers)
+
+
+def _buy(**kw):
+    return OrderRequest(symbol="X", side="BUY", qty=75, price=100.0, **kw)
+
+
+def test_timed_out_place_is_reconciled_not_resent():
+    slow, other = SimBroker(latency=0.3), SimBroker()
+    (res,) = _run({"angel_one": slow, "zerodha_kite": other}, [_buy()],
+                  primary="angel_one", failover=["zerodha_kite"], max_retries=1,
+                  timeout=0.1, reconcile_timeout=1.0)
+    assert res["status"] == "acknowledged" and res["broker"] == "angel_one"
+    assert slow.stats()["placed"] == 1 and other.stats()["placed"] == 0
+
+
+def test_unreconciled_late_order_is_cancelled():
+    slow = SimBroker(latency=0.3)
+
+    async def go():
+        ex = ExecutionEngine({"sim": slow}, primary="sim", timeout=0.05,
+                             reconcile_timeout=0.05, reconcile_lookups=1)
+        await ex.start()
+        res = await ex.submit(_buy())
+        for _ in range(300):            # the late order lands, then gets cancelled
+            if slow.stats()["placed"] and not _live(slow):
+                break
+            await asyncio.sleep(0.01)
+        await ex.stop()
+        return res
+
+    res = asyncio.run(go())
+    assert res["status"] == "timeout"
+    assert slow.stats()["placed"] == 1 and _live(slow) == 0
+
+
+def test_found_by_tag_after_error():
+    class LostReply(SimBroker):
+        def place_order(self, *args, **kw):
+            super().place_order(*args, **kw)
+            raise RuntimeError("read timeout")
+
+    b = LostReply()
+    (res,) = _run({"sim": b}, [_buy()], primary="sim", max_retries=2)
+    assert res["status"] == "acknowledged" and res["details"] == "reconciled_by_tag"
+    assert b.stats()["placed"] == 1
+
+
+class LaggingBook(SimBroker):
+    """Loses the place reply; order_by_tag misses the order for `lag` lookups."""
+
+    def __init__(self, lag, **kw):
+        super().__init__(**kw)
+        self.lag = lag
+
+    def place_order(self, *args, **kw):
+        super().place_order(*args, **kw)
+        raise RuntimeError("read timeout")
+
+    def order_by_tag(self, tag):
+        if self.lag:
+            self.lag -= 1
+            return None
+        return super().order_by_tag(tag)
+
+
+def test_lagging_order_book_is_looked_up_again():
+    b = LaggingBook(lag=2)
+    (res,) = _run({"sim": b}, [_buy()], primary="sim", reconcile_interval=0.01)
+    assert res["status"] == "acknowledged" and res["details"] == "reconciled_by_tag"
+    assert b.stats()["placed"] == 1
+
+
+def test_unknown_outcome_is_never_rejected_and_is_cancelled_later():
+    b = LaggingBook(lag=5)
+
+    async def go():
+        ex = ExecutionEngine({"sim": b}, primary="sim", reconcile_lookups=2,
+                             reconcile_interval=0.01, reconcile_window=1.0)
+        await ex.start()
+        res = await ex.submit(_buy())
+        await asyncio.sleep(0.2)        # the re-check finds the order and cancels it
+        await ex.stop()
+        return res
+
+    res = asyncio.run(go())
+    assert res["status"] == "timeout" and "unreconciled" in res["details"]
+    assert b.stats()["placed"] == 1 and _live(b) == 0
+
+
+def test_stop_resolves_pending_orders():
+    slow = SimBroker(latency=0.3)
+
+    async def go():
+        ex = ExecutionEngine({"sim": slow}, primary="sim", workers=1, timeout=5.0)
+        await ex.start()
+        futs = [ex.submit(_buy()) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await ex.stop()
+        assert all(f.done() for f in futs)
+        return [f.result() for f in futs]
+
+    res = asyncio.run(go())
+    assert [r["status"] for r in res] == ["timeout", "cancelled", "cancelled"]
+    assert {r["details"] for r in res} == {"engine_stopped"}
+
+
+def test_rejection_goes_to_caller_without_failover():
+    rejecting, other = SimBroker(reject_rate=1.0), SimBroker()
+    (res,) = _run({"angel_one": rejecting, "upstox": other}, [_buy()],
+                  primary="angel_one", failover=["upstox"])
+    assert res["status"] == "rejected" and res["details"] == "sim_reject"
+    assert other.stats()["placed"] == 0
+
+
+def test_not_sent_fails_over():
+    refusing, other = NotSentOnce(), SimBroker()
+    (res,) = _run({"angel_one": refusing, "upstox": other}, [_buy()],
+                  primary="angel_one", failover=["upstox"], max_retries=0)
+    assert res["status"] == "acknowledged" and res["broker"] == "upstox"
+    assert _live(refusing, other) == 1
+
+
+def test_any_broker_name_and_unknown_broker():
+    b = SimBroker()
+    res = _run({"sim": b}, [_buy(), _buy(broker="nope")], primary="sim")
+    assert [r["status"] for r in res] == ["acknowledged", "rejected"]
+
+
+def test_unresolved_symbol_is_not_sent():
+    conn = AngelOneConnector.__new__(AngelOneConnector)   # no login, no instruments
+    conn.instruments = None
+    with pytest.raises(OrderNotSent):
+        conn.place_order("NIFTY25SEP24700CE", "BUY", 75, 100.0, "LIMIT", tag="t1")
@@ -0,0 +1,101 @@
+import asyncio
+
+import websockets
+
+from marketdata.feed_ws import (MODE_LTP, MODE_QUOTE, MODE_SNAP, FeedWS, decode_frame,
+                                encode_frame)
+
+TOKENS = {"NIFTY50": "26000", "BANKNIFTY": "26009"}
+RAW = {tok.encode().ljust(25, b"\0"): sym for sym, tok in TOKENS.items()}
+
+
+def _frames(n):
+    toks = list(TOKENS.values())
+    return [encode_frame(MODE_SNAP if i % 10 == 0 else MODE_QUOTE, 1, toks[i % 2], i,
+                         1725250000000 + i, 24500 + i % 50, volume=i * 10, oi=10 ** 6)
+            for i in range(n)]
+
+
+def _run(frames, consume, **kw):
+    """Serve `frames` once per connection from a local websocket server to a FeedWS."""
+    subs = []
+
+    async def serve(ws):
+        subs.append(await ws.recv())
+        for f in frames:
+            await ws.send(f)
+        await ws.close()
+
+    async def go():
+        async with websockets.serve(serve, "127.0.0.1", 0, max_size=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            url = f"ws://127.0.0.1:{port}"
+            feed = FeedWS(list(TOKENS), url=url, max_backoff=0.5, **kw)
+            try:
+                return await asyncio.wait_for(consume(feed), 10), subs
+            finally:
+                await feed.close()
+
+    return asyncio.run(go())
+
+
+def test_decode_round_trip():
+    f = encode_frame(MODE_LTP, 1, "26000", 7, 1725250000123, 24512.35)
+    t = decode_frame(f, RAW)
+    assert t == {"ts": 1725250000.123, "symbol": "NIFTY50", "ltp": 24512.35}
+    t = decode_frame(encode_frame(MODE_SNAP, 1, "26009", 7, 1725250000000, 51000.5,
+                                  volume=1200, oi=3000), RAW)
+    assert t["volume"] == 1200 and t["oi"] == 3000 and t["ohlc"] == (51000.5,) * 4
+    assert len(t["bids"]) == 5 and len(t["asks"]) == 5
+    assert max(p for p, _, _ in t["bids"]) < min(p for p, _, _ in t["asks"])
+    assert decode_frame(b"\x01\x01", RAW) is None
+    assert decode_frame(encode_frame(MODE_LTP, 1, "99999", 1, 0, 1.0), RAW) is None
+
+
+def test_every_tick_in_order_when_consumer_keeps_up():
+    n = 2000
+
+    async def consume(feed):
+        got = []
+        async for tick in feed.ticks():
+            got.append(tick)
+            if len(got) == n:
+                return got
+
+    got, subs = _run(_frames(n), consume)
+    assert [t["volume"] for t in got] == [i * 10.0 for i in range(n)]
+    assert sum("oi" in t for t in got) == n // 10
+    assert '"tokens": ["26000", "26009"]' in subs[0]
+
+
+def test_slow_consumer_conflates_without_losing_cumulative_volume():
+    n = 20000
+
+    async def consume(feed):
+        last, seen = {}, 0
+        async for tick in feed.ticks():
+            seen += 1
+            last[tick["symbol"]] = tick["volume"]
+            await asyncio.sleep(0.0005 if seen % 4 == 0 else 0)
+            st = feed.stats()
+            if st["decoded"] >= n and st["queued"] == 0:
+                return last, seen, st
+
+    (last, seen, st), _ = _run(_frames(n), consume, queue_size=64)
+    assert st["received"] == st["decoded"] == n and st["bad_frames"] == 0
+    assert st["high_water"] <= 64
+    assert seen + st["conflated"] + st["dropped"] == n
+    # the newest tick per symbol always survives conflation
+    assert last == {"NIFTY50": (n - 2) * 10.0, "BANKNIFTY": (n - 1) * 10.0}
+
+
+def test_reconnects_and_resubscribes():
+    async def consume(feed):
+        seen = 0
+        async for _ in feed.ticks():
+            seen += 1
+            if seen == 30:
+                return feed.stats()
+
+    st, subs = _run(_frames(10), consume)
+    assert st["reconnects"] >= 2 and len(subs) >= 3
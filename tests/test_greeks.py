@@ -0,0 +1,53 @@
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+from engine.greeks import (RISK_FREE_RATE, bs_price, chain_greeks, contract_greeks,
+                           norm_cdf, years_to_expiry)
+from utils.instruments import IST
+
+NOW = datetime(2024, 9, 2, 10, 0, tzinfo=IST)
+
+
+def test_expiry_time_is_zone_independent():
+    utc = NOW.astimezone(timezone.utc)
+    t = years_to_expiry("2024-09-03", NOW)
+    assert years_to_expiry("2024-09-03", utc) == t
+    assert years_to_expiry("2024-09-03", NOW.replace(tzinfo=None)) == t   # naive: IST
+    assert t[0] * 365 * 24 == 29.5                  # Mon 10:00 -> Tue 15:30 IST
+    after_close = datetime(2024, 9, 2, 16, 0, tzinfo=IST)
+    assert years_to_expiry("2024-09-02", after_close)[0] == 0.0
+
+
+def test_norm_cdf_matches_erf():
+    x = np.linspace(-38.0, 38.0, 2001)
+    ref = np.array([0.5 * math.erfc(-v / math.sqrt(2.0)) for v in x])
+    assert np.max(np.abs(norm_cdf(x) - ref)) < 1e-14
+
+
+def test_chain_iv_recovers_a_smile():
+    """200 strikes x 4 expiries x CE/PE priced off a known smile, solved back."""
+    spot = 24500.0
+    strikes = np.arange(spot - 5000, spot + 5000, 50.0)
+    exps = np.array(["2024-09-03", "2024-09-10", "2024-09-17", "2024-09-24"],
+                    dtype="datetime64[D]")
+    grid = np.meshgrid(strikes, exps, [True, False], indexing="ij")
+    K, E, C = (a.ravel() for a in grid)
+    T = years_to_expiry(E, NOW)
+    true_iv = 0.12 + 0.15 * np.abs(np.log(K / spot))
+    prices = bs_price(spot, K, T, RISK_FREE_RATE, true_iv, C)
+    g = chain_greeks(spot, K, T, prices, C)
+    ok = np.isfinite(g["iv"])
+    # far wings have under a tick of time value and stay unsolved (NaN)
+    assert ok[np.abs(K - spot) <= 250].all() and ok.sum() > len(K) // 3
+    assert np.nanmax(np.abs(g["iv"][ok] - true_iv[ok])) < 1e-6
+    assert np.all((g["delta"][ok & C] > 0) & (g["delta"][ok & ~C] < 0))
+
+
+def test_contract_greeks():
+    assert contract_greeks(24500.0, 24500, "2024-09-05", NOW, None)["iv"] is None
+    T = years_to_expiry("2024-09-05", NOW)
+    ltp = float(bs_price(24500.0, 24500.0, T, RISK_FREE_RATE, 0.14, True)[0])
+    g = contract_greeks(24500.0, 24500, "2024-09-05", NOW, ltp, "CE")
+    assert abs(g["iv"] - 0.14) < 1e-8 and 0.5 < g["delta"] < 0.55 and g["theta"] < 0
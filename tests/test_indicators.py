@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from engine.indicators import ATR, EMA, RSI, SuperTrend, atr, ema, rsi, supertrend
+
+
+@pytest.fixture(scope="module")
+def walk():
+    rng = np.random.default_rng(0)
+    n = 20000
+    c = 24500.0 + np.cumsum(rng.normal(0.0, 8.0, n))
+    c[5000:5100] = c[4999]   # flat stretch: RSI 50, zero true range
+    h = c + np.abs(rng.normal(0.0, 5.0, n))
+    lo = c - np.abs(rng.normal(0.0, 5.0, n))
+    return h, lo, c
+
+
+def _nan(v):
+    return np.nan if v is None else v
+
+
+def test_streaming_matches_batch(walk):
+    h, lo, c = walk
+    e, a, r, st = EMA(20), ATR(14), RSI(14), SuperTrend(10, 3.0)
+    rows = []
+    for hi, li, ci in zip(h.tolist(), lo.tolist(), c.tolist()):
+        rows.append((_nan(e.update(ci)), _nan(a.update(hi, li, ci)), _nan(r.update(ci)),
+                     _nan(st.update(hi, li, ci)), st.direction))
+    stream = np.array(rows)
+    line, direction = supertrend(h, lo, c, 10, 3.0)
+    batch = {"ema": ema(c, 20), "atr": atr(h, lo, c, 14), "rsi": rsi(c, 14),
+             "supertrend": line}
+    for col, (name, values) in enumerate(batch.items()):
+        # the batch recurrences are blockwise NumPy: equal up to rounding
+        assert np.allclose(values, stream[:, col], rtol=1e-12, atol=1e-9,
+                           equal_nan=True), name
+        assert np.array_equal(np.isnan(values), np.isnan(stream[:, col])), name
+    assert np.array_equal(direction, stream[:, 4])
+
+
+@pytest.mark.parametrize("period", [1, 2, 7, 63, 64, 65, 500])
+def test_ema_across_scan_blocks(walk, period):
+    c = walk[2][:3000]
+    e = EMA(period)
+    stream = np.array([_nan(e.update(x)) for x in c.tolist()])
+    assert np.allclose(ema(c, period), stream, rtol=1e-12, equal_nan=True)
+
+
+def test_non_finite_input_poisons_the_rest():
+    x = np.r_[np.arange(1.0, 11.0), np.nan, np.arange(12.0, 200.0)]
+    out = ema(x, 3)
+    assert not np.isnan(out[2:10]).any() and np.isnan(out[10:]).all()
+
+
+def test_warmup_lengths(walk):
+    h, lo, c = walk
+    assert np.isnan(ema(c, 20)[:19]).all() and not np.isnan(ema(c, 20)[19])
+    a = atr(h, lo, c, 14)
+    assert np.isnan(a[:13]).all() and not np.isnan(a[13])
+    assert np.isnan(rsi(c, 14)[:14]).all() and not np.isnan(rsi(c, 14)[14])
+    line, direction = supertrend(h, lo, c, 10, 3.0)
+    assert (direction[:9] == 0).all() and set(np.unique(direction[9:])) <= {-1, 1}
+
+
+def test_flat_market_rsi_is_50():
+    assert rsi(np.full(40, 100.0), 14)[-1] == 50.0
@@ -0,0 +1,46 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from run_intraday import pick_contract
+from utils.instrument_master import InstrumentMaster
+from utils.instruments import IST, first_expiry_date, next_weekly_expiry
+
+EXPIRIES = ["2024-09-03", "2024-09-10", "2024-09-17"]   # Tuesdays
+
+
+def _master():
+    rows = [{"name": "NIFTY", "tradingsymbol": f"NIFTY{e}{k}CE",
+             "instrument_type": "CE", "expiry": e, "strike": k, "token": f"{i}{k}",
+             "lot_size": 75}
+            for i, e in enumerate(EXPIRIES) for k in (24400, 24450, 24500, 24550)]
+    return InstrumentMaster.from_rows(rows)
+
+
+def _ctx(master, until=None):
+    rules = {"nifty_weekly_day": "TUESDAY"}
+    if until:
+        rules["same_day_expiry_until"] = until
+    return {"instruments": master, "strat_cfg": {"expiry_rules": rules}}
+
+
+@pytest.mark.parametrize("now, until, expected", [
+    (datetime(2024, 9, 2, 14, 0, tzinfo=IST), None, "2024-09-03"),     # Monday
+    (datetime(2024, 9, 3, 9, 30, tzinfo=IST), None, "2024-09-10"),     # expiry day
+    (datetime(2024, 9, 3, 9, 30, tzinfo=IST), "11:00", "2024-09-03"),
+    (datetime(2024, 9, 3, 11, 0, tzinfo=IST), "11:00", "2024-09-10"),
+    (datetime(2024, 9, 3, 4, 0), "11:00", "2024-09-03"),               # naive: IST
+])
+def test_listed_and_rule_based_expiry_agree(now, until, expected):
+    listed = pick_contract("NIFTY50", 24510.0, now, _ctx(_master(), until))
+    fallback = pick_contract("NIFTY50", 24510.0, now, _ctx(None, until))
+    assert listed["expiry"] == fallback["expiry"] == expected
+    assert listed["strike"] == fallback["strike"] == 24500
+
+
+def test_first_expiry_date_converts_to_ist():
+    utc = datetime(2024, 9, 2, 20, 0, tzinfo=timezone.utc)    # Tue 01:30 IST
+    assert first_expiry_date(utc, "11:00") == date(2024, 9, 3)
+    assert first_expiry_date(utc) == date(2024, 9, 4)
+    sunday = datetime(2024, 9, 8, 12, 0, tzinfo=IST)
+    assert next_weekly_expiry("NIFTY50", sunday).date() == date(2024, 9, 10)
@@ -0,0 +1,105 @@
+import io
+import json
+import logging
+import threading
+
+from utils.logger import BatchingQueueHandler, JsonFormatter
+
+
+def _logger(handler, name):
+    handler.setFormatter(JsonFormatter())
+    lg = logging.getLogger(name)
+    lg.handlers[:] = [handler]
+    lg.propagate = False
+    lg.setLevel(logging.INFO)
+    return lg
+
+
+def test_call_time_values_are_frozen_before_enqueue():
+    out = io.StringIO()
+    h = BatchingQueueHandler(stream=out, flush_interval=0.01)
+    lg = _logger(h, "kp5.test.capture")
+    legs = [1]
+    extra = {"k": 0, "state": {"open_positions": 0}}
+    for k in range(100):
+        lg.info("legs %s", legs, extra={"_extra": extra})
+        legs.append(k)                     # message args are resolved at the call
+        extra["k"] += 1                    # top-level _extra keys are copied
+        extra["state"] = {"open_positions": k + 1}   # replaced, not mutated
+    h.close()
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["k"] for r in rows] == list(range(100))
+    assert [r["state"]["open_positions"] for r in rows] == list(range(100))
+    assert rows[2]["msg"] == "legs [1, 0, 1]"
+
+
+def test_records_are_formatted_on_the_writer_thread():
+    threads = []
+
+    class Spy(JsonFormatter):
+        def format(self, record):
+            threads.append(threading.current_thread().name)
+            return super().format(record)
+
+    out = io.StringIO()
+    h = BatchingQueueHandler(stream=out, flush_interval=0.01)
+    h.setFormatter(Spy())
+    lg = logging.getLogger("kp5.test.writer")
+    lg.handlers[:] = [h]
+    lg.propagate = False
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        lg.exception("failed")
+    lg.warning("x")
+    h.close()
+    assert threads == ["kp5-log-writer"] * 2
+    first = json.loads(out.getvalue().splitlines()[0])
+    assert "ValueError: boom" in first["exc"]
+
+
+def test_rotation_counts_bytes_not_characters(tmp_path):
+    path = tmp_path / "kp5.log"
+    h = BatchingQueueHandler(path=str(path), max_bytes=4096, backup_count=3,
+                             batch_size=1, flush_interval=0.01)
+    lg = _logger(h, "kp5.test.rotate")
+    for k in range(60):
+        lg.info("\u20b9" * 40, extra={"_extra": {"k": k}})   # 3 bytes per char
+    h.close()
+    files = [path] + [tmp_path / f"kp5.log.{i}" for i in (1, 2, 3)]
+    sizes = [f.stat().st_size for f in files if f.exists()]
+    assert len(sizes) > 1 and max(sizes) <= 4096
+
+
+def test_counters_are_exact_across_threads():
+    out = io.StringIO()
+    h = BatchingQueueHandler(stream=out, queue_size=64, flush_interval=0.01)
+    lg = _logger(h, "kp5.test.threads")
+    n, per = 8, 2000
+
+    def spam(t):
+        for k in range(per):
+            lg.info("x", extra={"_extra": {"t": t, "k": k}})
+
+    threads = [threading.Thread(target=spam, args=(t,)) for t in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    h.close()
+    st = h.stats()
+    assert st["enqueued"] + st["dropped"] == n * per
+    assert st["written"] == st["enqueued"] == len(out.getvalue().splitlines())
+    assert 0 < st["high_water"] <= 65
+
+
+def test_blocking_mode_loses_nothing():
+    out = io.StringIO()
+    h = BatchingQueueHandler(stream=out, queue_size=4, batch_size=2, block=True,
+                             flush_interval=0.01)
+    lg = _logger(h, "kp5.test.block")
+    for k in range(500):
+        lg.info("x", extra={"_extra": {"k": k}})
+    h.close()
+    assert [json.loads(s)["k"] for s in out.getvalue().splitlines()] == list(range(500))
+    assert h.stats()["dropped"] == 0 and h.stats()["written"] == 500
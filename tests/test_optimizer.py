@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+import yaml
+
+from backtest import optimizer
+from backtest.optimizer import optimize, rank
+from bench.synthetic import SyntheticMarket
+
+
+def _cfg():
+    cfg = {}
+    for path in ("config/risk.yml", "config/strategy.yml"):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg.update(yaml.safe_load(f))
+    cfg["capital"] = 1e6
+    return cfg
+
+
+def _npz(tmp_path, drop=()):
+    bars = SyntheticMarket(seed=0).bars(4)
+    bars["oi"] = np.random.default_rng(0).choice([1.0e6, 0.9e6, 0.8e6], len(bars["ts"]))
+    path = str(tmp_path / "bars.npz")
+    np.savez(path, **{k: v for k, v in bars.items() if k not in drop})
+    return path
+
+
+@pytest.fixture
+def tmpdirs(monkeypatch):
+    made = []
+
+    def mkdtemp(**kw):
+        made.append(real(**kw))
+        return made[-1]
+
+    real = tempfile.mkdtemp
+    monkeypatch.setattr(optimizer.tempfile, "mkdtemp", mkdtemp)
+    return made
+
+
+def test_thin_parameter_sets_rank_last():
+    m = [{"trades": 2, "total_r": 9.0}, {"trades": 40, "total_r": 3.0},
+         {"trades": 35, "total_r": 5.0}, {"trades": 0, "total_r": 0.0}]
+    assert rank(m, "total_r", 30) == [2, 1, 0, 3]
+    assert rank(m, "total_r", 0) == [0, 2, 1, 3]
+
+
+def test_min_trades_gates_the_pick_and_temp_bars_are_removed(tmp_path, tmpdirs):
+    spec = {"bars": _npz(tmp_path), "params": {"tsl.atr_multiple": [1.0, 2.0]}}
+    rows = optimize(dict(spec, min_trades=1), _cfg(), workers=1)
+    assert [r["rank"] for r in rows] == [1, 2] and rows[0]["eligible"]
+    assert rows[0]["train:trades"] >= 1
+    rows = optimize(dict(spec, min_trades=10 ** 6), _cfg(), workers=1)
+    assert not any(r["eligible"] for r in rows)
+    assert len(tmpdirs) == 2 and not any(os.path.exists(d) for d in tmpdirs)
+
+
+def test_temp_bars_are_removed_on_error(tmp_path, tmpdirs):
+    spec = {"bars": _npz(tmp_path, drop=("ts",)), "params": {"tsl.atr_multiple": [1.0]}}
+    with pytest.raises(KeyError):
+        optimize(spec, _cfg(), workers=1)
+    assert len(tmpdirs) == 1 and not os.path.exists(tmpdirs[0])
@@ -0,0 +1,104 @@
+import asyncio
+
+from aiohttp import web
+
+from marketdata.option_chain_provider import EMPTY_SNAPSHOT, AsyncOptionChainProvider
+
+
+class StandIn:
+    """Local stand-in for the option-chain API: counts requests, can be slow or fail."""
+
+    def __init__(self):
+        self.requests = 0
+        self.delay = 0.0
+        self.fail = False
+        self.pcr = 1.0
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return web.Response(status=503)
+        return web.json_response({"pcr": self.pcr, "oiTrend": "CE_unwind",
+                                  "symbol": request.query["symbol"]})
+
+
+async def _serve(api):
+    app = web.Application()
+    app.router.add_get("/v1/option-chain", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _run(test, **kw):
+    async def go():
+        api = StandIn()
+        runner, base = await _serve(api)
+        seen = []
+        ocp = AsyncOptionChainProvider(base=base, on_snapshot=lambda *a: seen.append(a),
+                                       **kw)
+        try:
+            await test(api, ocp, seen)
+        finally:
+            await ocp.close()
+            await runner.cleanup()
+    asyncio.run(go())
+
+
+def test_concurrent_cold_requests_share_one_fetch():
+    async def test(api, ocp, seen):
+        api.delay = 0.05
+        snaps = await asyncio.gather(*(ocp.get_snapshot("NIFTY50") for _ in range(20)))
+        assert api.requests == 1 and len(seen) == 1
+        assert all(s is snaps[0] for s in snaps) and snaps[0]["pcr"] == 1.0
+    _run(test)
+
+
+def test_stale_snapshot_served_while_revalidating():
+    async def test(api, ocp, seen):
+        first = await ocp.get_snapshot("NIFTY50")
+        await asyncio.sleep(0.25)               # past ttl
+        api.delay, api.pcr = 0.1, 2.0
+        assert await ocp.get_snapshot("NIFTY50") is first   # immediately, stale
+        # joins the in-flight refresh
+        assert await ocp.get_snapshot("NIFTY50") is first
+        await asyncio.sleep(0.3)
+        assert (await ocp.get_snapshot("NIFTY50"))["pcr"] == 2.0
+        assert api.requests == 2 and len(seen) == 2
+    _run(test, ttl=0.2)
+
+
+def test_errors_keep_last_good_snapshot_and_back_off():
+    async def test(api, ocp, seen):
+        good = await ocp.get_snapshot("NIFTY50")
+        await asyncio.sleep(0.25)
+        api.fail = True
+        # triggers the failing refresh
+        assert await ocp.get_snapshot("NIFTY50") is good
+        await asyncio.sleep(0.05)
+        age = ocp.age("NIFTY50")
+        assert age >= 0.25          # not re-stamped by the failure
+        for _ in range(10):         # backing off: no new requests
+            assert await ocp.get_snapshot("NIFTY50") is good
+        assert api.requests == 2 and len(seen) == 1
+        api.fail = False
+        await asyncio.sleep(0.25)   # backoff (ttl) elapsed
+        await ocp.get_snapshot("NIFTY50")
+        await asyncio.sleep(0.05)
+        assert api.requests == 3 and len(seen) == 2
+        assert ocp.age("NIFTY50") < 0.2
+    _run(test, ttl=0.2)
+
+
+def test_first_fetch_failure_returns_empty_snapshot():
+    async def test(api, ocp, seen):
+        api.fail = True
+        snap = await ocp.get_snapshot("BANKNIFTY")
+        assert snap == EMPTY_SNAPSHOT and ocp.age("BANKNIFTY") is None
+        assert await ocp.get_snapshot("BANKNIFTY") is snap and api.requests == 1
+        assert seen == []
+    _run(test, ttl=0.2)
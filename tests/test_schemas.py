@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from engine.schemas import (BrokerEvent, NoTrade, NoTradeEvent, TradeDecision,
+                            TradeDecisionEvent)
+
+TS = "2024-09-02T10:00:00+05:30"
+TD = dict(index="NIFTY50", action="BUY_CE", strike=24500, option_type="CE",
+          expiry="2024-09-03", entry_type="LIMIT", entry=24510.5, stop_loss=24265.4,
+          tsl="ATR(1.5)x", r_multiple=1.5, lots=1, confidence_pct=72,
+          signal_stack=["oi_momentum", "cpr_vwap"], greeks={"delta": 0.5, "iv": 0.13},
+          risk_check="passed", broker="angel_one", reason="Confluence", timestamp=TS)
+
+
+def test_fast_records_match_the_models():
+    fast = TradeDecisionEvent(**TD).as_dict()
+    model = TradeDecision(**TD).model_dump()
+    assert fast == model and list(fast) == list(model)
+    assert json.loads(TradeDecisionEvent(**TD).to_json()) == json.loads(
+        TradeDecision(**TD).model_dump_json())
+    assert NoTradeEvent("mixed_signals", TS).as_dict() == NoTrade(
+        reason="mixed_signals", timestamp=TS).model_dump()
+
+
+def test_validated_round_trip_and_rejects():
+    validated = TradeDecisionEvent(**TD).validated()
+    assert validated.model_dump() == TradeDecision(**TD).model_dump()
+    assert NoTradeEvent("atr_warmup", TS).validated().reason == "atr_warmup"
+    for bad in ({"lots": 0}, {"broker": "sim"}, {"greeks": {"delta": 1.5}},
+                {"confidence_pct": 101}, {"index": "FINNIFTY"}):
+        with pytest.raises(ValidationError):
+            TradeDecisionEvent(**{**TD, **bad}).validated()
+
+
+def test_broker_event_takes_any_connector_name():
+    ev = BrokerEvent(stage="place", broker="sim", client_order_id="c1",
+                     status="acknowledged", timestamp=TS)
+    assert ev.broker == "sim"
+    with pytest.raises(ValidationError):
+        BrokerEvent(stage="place", broker="sim", client_order_id="c1", status="filled",
+                    timestamp=TS)
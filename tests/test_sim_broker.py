@@ -0,0 +1,39 @@
+from connectors.sim_broker import SimBroker
+
+
+def test_price_time_priority_and_tick_fills():
+    fills = []
+    sim = SimBroker(on_fill=fills.append)
+    a = sim.place_order("NIFTY50", "BUY", 50, 100.0, "LIMIT")["order_id"]
+    b = sim.place_order("NIFTY50", "BUY", 50, 100.5, "LIMIT")["order_id"]
+    sim.place_order("NIFTY50", "SELL", 60, 100.0, "LIMIT")
+    assert sim.order(b)["status"] == "complete" and sim.order(a)["filled_qty"] == 10
+    # the best bid fills first, at its own (resting) price, as maker
+    f = fills[0]
+    assert (f["order_id"], f["price"], f["liquidity"]) == (b, 100.5, "maker")
+    sim.on_tick("NIFTY50", 99.5, 1.0)
+    assert sim.order(a)["status"] == "complete"
+    assert sim.depth("NIFTY50") == {"bids": [], "asks": []}
+
+
+def test_finished_orders_and_tags_are_pruned():
+    sim = SimBroker(keep_done=3)
+    sim.on_tick("NIFTY50", 100.0, 1.0)
+    ids = []
+    for k in range(10):
+        tag = f"c{k}"
+        oid = sim.place_order("NIFTY50", "BUY", 1, 90.0, "LIMIT", tag=tag)["order_id"]
+        ids.append(oid)
+        if k % 2:
+            sim.cancel_order(oid)
+    resting = [oid for k, oid in enumerate(ids) if k % 2 == 0]
+    sim.modify_order(resting[0], price=91.0)    # replaced in place: keeps its tag
+    # open orders are never pruned; only the newest 3 finished ones are kept
+    assert sorted(sim.orders) == sorted(resting + ids[5:10:2])
+    kept = [f"c{k}" for k in range(0, 10, 2)] + ["c5", "c7", "c9"]
+    assert sorted(sim.tags) == sorted(kept)
+    assert sim.order_by_tag("c0")["order_id"] == resting[0]
+    assert sim.order_by_tag("c1") is None and sim.order(ids[1]) is None
+    sim.on_tick("NIFTY50", 89.0, 2.0)           # fills every resting buy
+    assert len(sim.orders) == len(sim.tags) == 3
+    assert sim.stats()["open"] == 0
@@ -0,0 +1,95 @@
+import os
+import threading
+from datetime import datetime
+
+from risk.position_book import PositionBook
+from risk.risk_engine import RiskEngine
+from risk.state_store import StateWriter, load_state, save_state
+from utils.instruments import IST
+
+T0 = datetime(2024, 9, 3, 10, 0, tzinfo=IST).timestamp()
+
+
+def _session(path):
+    """Open two legs, trail one, stop the other out; state saved after each event."""
+    book, risk = PositionBook(100000.0), RiskEngine.from_file("config/risk.yml")
+
+    def on_close(pos, reason, ts):
+        risk.on_fill(ts, pos.opt_type, opened=False, stop_hit=reason == "stop")
+        risk.set_day_pnl(book.day_pnl_pct)
+        save_state(path, book, risk)
+
+    book.on_close = on_close
+    book.open("NIFTY03SEP2424500CE", "NIFTY50", 75, 24500.0, 24460.0, T0, trail=40.0)
+    book.open("BANKNIFTY03SEP2451000PE", "BANKNIFTY", 30, 51000.0, 51100.0, T0,
+              "PE")
+    risk.on_fill(T0, "CE", opened=True)
+    risk.on_fill(T0, "PE", opened=True)
+    save_state(path, book, risk)
+    book.on_tick("NIFTY50", 24560.0, T0 + 60)          # trails the stop to 24520
+    book.on_tick("BANKNIFTY", 51120.0, T0 + 90)        # stop-out at -3600: cooldown
+    return book, risk
+
+
+def test_restart_restores_book_limits_cooldown_and_day_pnl(tmp_path):
+    path = str(tmp_path / "state" / "state.json")
+    book, risk = _session(path)
+    now = T0 + 120
+    book2, risk2 = PositionBook(100000.0), RiskEngine.from_file("config/risk.yml")
+    assert load_state(path, book2, risk2, now)
+
+    assert book2.snapshot() == book.snapshot()
+    pos = book2.positions["NIFTY03SEP2424500CE"]
+    assert pos.stop == 24520.0 and pos.initial_stop == 24460.0 and pos.best == 24560.0
+    assert book2.realized == book.realized == -3600.0
+    assert book2.day_pnl == book.day_pnl
+    assert risk2.day_pnl_pct == book.day_pnl_pct
+    assert risk2.state["open_positions"] == 1 and risk2.state["cooldown_active"]
+    assert risk2.check(now, "CE") == "risk_block:cooldown"
+    # the restored leg keeps trailing and stops out from its trailed stop
+    assert book2.on_tick("NIFTY50", 24519.0, now + 1) == 1
+    assert not book2.positions and book2.realized == -3600.0 + 19 * 75
+
+
+def test_stale_state_rolls_the_day_and_expires_the_cooldown(tmp_path):
+    path = str(tmp_path / "state.json")
+    _session(path)
+    tomorrow = T0 + 86400
+    book, risk = PositionBook(100000.0), RiskEngine.from_file("config/risk.yml")
+    assert load_state(path, book, risk, tomorrow)
+    assert book.realized == 0.0 and book.day_pnl == 0.0
+    assert len(book.positions) == 1 and not risk.state["cooldown_active"]
+    assert risk.check(tomorrow, "PE") == "risk_block:position_limit"
+
+
+def test_no_saved_state(tmp_path):
+    book, risk = PositionBook(1.0), RiskEngine.from_file("config/risk.yml")
+    assert not load_state(str(tmp_path / "missing.json"), book, risk, T0)
+    assert risk.state["open_positions"] == 0
+
+
+def test_writer_coalesces_and_keeps_the_last_state(tmp_path, monkeypatch):
+    import risk.state_store as store
+    path = str(tmp_path / "state.json")
+    gate = threading.Event()
+    write = store.write_state
+
+    def slow_write(p, state):          # a stalled disk: the first write blocks
+        gate.wait(5)
+        return write(p, state)
+
+    monkeypatch.setattr(store, "write_state", slow_write)
+    book, risk = PositionBook(100000.0), RiskEngine.from_file("config/risk.yml")
+    w = StateWriter(path)
+    for k in range(50):                # returns at once while the writer is stuck
+        book.open(f"LEG{k}", "NIFTY50", 75, 24500.0, 24460.0, T0 + k)
+        w.save(book, risk)
+    assert not os.path.exists(path)
+    gate.set()
+    w.close()
+    st = w.stats()
+    assert st["saved"] == 50 and st["written"] + st["coalesced"] == 50
+    assert st["written"] <= 3
+    book2, risk2 = PositionBook(100000.0), RiskEngine.from_file("config/risk.yml")
+    assert load_state(path, book2, risk2, T0 + 60)
+    assert len(book2.positions) == 50
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from utils.telegram import P_CRITICAL, P_ENTRY, P_INFO, TelegramNotifier
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_post("/botTEST/sendMessage", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_bursts_coalesce_and_survive_429_and_5xx():
+    got, hits = [], {"n": 0}
+
+    async def send_message(request):
+        hits["n"] += 1
+        if hits["n"] % 7 == 0:
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "parameters": {"retry_after": 0.2}}, status=429)
+        if hits["n"] % 11 == 0:
+            return web.Response(status=502)
+        got.append((await request.json())["text"])
+        return web.json_response({"ok": True})
+
+    async def go():
+        runner, base = await _serve(send_message)
+        tg = TelegramNotifier("TEST", "1", base_url=base, rate=20.0, burst=2,
+                              linger=0.3)
+        tg.start()
+        for i in range(200):
+            tg.notify(f"no_trade NIFTY50 mixed_signals #{i}", P_INFO, key="no_trade")
+        for i in range(5):
+            tg.notify(f"*NIFTY50* BUY 24500 x{i + 1}", P_ENTRY)
+        tg.notify("EXIT NIFTY50 stop hit", P_CRITICAL)
+        await tg.close(drain=10.0)
+        await runner.cleanup()
+        return tg.stats()
+
+    st = asyncio.run(go())
+    assert got[0] == "EXIT NIFTY50 stop hit"
+    assert got[1:6] == [f"*NIFTY50* BUY 24500 x{i + 1}" for i in range(5)]
+    assert st["failed"] == 0 and st["dropped"] == 0 and st["queued"] == 0
+    assert st["coalesced"] == 200 - (len(got) - 6)
+    assert sum(t.count("#") for t in got[6:]) == 200
+
+
+def test_failing_info_does_not_hold_back_critical():
+    sent = []
+
+    async def send_message(request):
+        text = (await request.json())["text"]
+        if text.startswith("info"):
+            return web.Response(status=502)
+        sent.append((time.monotonic(), text))
+        return web.json_response({"ok": True})
+
+    async def go():
+        runner, base = await _serve(send_message)
+        tg = TelegramNotifier("TEST", "1", base_url=base, rate=50.0, burst=5,
+                              linger=0.0, max_retries=3)
+        tg.start()
+        tg.notify("info heartbeat", P_INFO)
+        await asyncio.sleep(0.1)            # first attempt failed, now backing off
+        t0 = time.monotonic()
+        tg.notify("EXIT NIFTY50 stop hit", P_CRITICAL)
+        await asyncio.sleep(0.1)
+        mid = dict(tg.stats())
+        await tg.close(drain=10.0)
+        await runner.cleanup()
+        return t0, mid, tg.stats()
+
+    t0, mid, st = asyncio.run(go())
+    assert [t for _, t in sent] == ["EXIT NIFTY50 stop hit"]
+    assert sent[0][0] - t0 < 0.1
+    # the info message is still retrying
+    assert mid["sent"] == 1 and mid["queued"] == 1
+    assert st["failed"] == 1 and st["retries"] == 3
+
+
+def test_markup_error_resends_plain_and_4xx_is_dropped():
+    modes = []
+
+    async def send_message(request):
+        body = await request.json()
+        modes.append(body.get("parse_mode"))
+        if body["text"] == "forbidden":
+            return web.json_response({"ok": False, "description": "Forbidden"},
+                                     status=403)
+        if body.get("parse_mode"):
+            desc = "Bad Request: can't parse entities"
+            return web.json_response({"ok": False, "description": desc}, status=400)
+        return web.json_response({"ok": True})
+
+    async def go():
+        runner, base = await _serve(send_message)
+        tg = TelegramNotifier("TEST", "1", base_url=base, rate=50.0, burst=5,
+                              linger=0.0)
+        tg.start()
+        tg.notify("NIFTY_50 *unbalanced", P_ENTRY)
+        tg.notify("forbidden", P_INFO)
+        await tg.close(drain=5.0)
+        await runner.cleanup()
+        return tg.stats()
+
+    st = asyncio.run(go())
+    assert modes == ["Markdown", None, "Markdown"]
+    assert st["sent"] == 1 and st["failed"] == 1 and st["retries"] == 1
+
+
+def test_close_waits_for_the_send_in_flight():
+    async def send_message(request):
+        await asyncio.sleep(0.3)
+        return web.json_response({"ok": True})
+
+    async def go():
+        runner, base = await _serve(send_message)
+        tg = TelegramNotifier("TEST", "1", base_url=base, linger=0.0)
+        tg.start()
+        tg.notify("EXIT NIFTY50 stop hit", P_CRITICAL)
+        await asyncio.sleep(0.05)           # popped from its lane, reply pending
+        await tg.close(drain=5.0)
+        await runner.cleanup()
+        return tg.stats()
+
+    st = asyncio.run(go())
+    assert st["sent"] == 1 and st["queued"] == 0
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+
+from marketdata.replay_feed import ReplayFeed
+from marketdata.tick_recorder import CHAIN_DTYPE, TickRecorder, day_of, read_ticks
+
+TS = 1725339600.0   # 2024-09-03 10:30 IST
+
+
+def test_quiet_feed_reaches_disk_on_the_timer(tmp_path):
+    rec = TickRecorder(str(tmp_path))
+    day = os.path.join(str(tmp_path), day_of(TS))
+
+    async def go():
+        flusher = asyncio.create_task(rec.autoflush(0.05))
+        rec.record_tick({"ts": TS, "symbol": "NIFTY50", "ltp": 24500.5, "volume": 10.0})
+        rec.record_tick({"ts": TS + 1, "symbol": "BANKNIFTY", "ltp": 51000.0})
+        rec.record_chain("NIFTY50", TS + 2, {"pcr": 1.1})
+        await asyncio.sleep(0.2)
+        flusher.cancel()
+
+    asyncio.run(go())
+    # read while the recorder is still open: nothing waited for close()
+    ticks = read_ticks(day)
+    idx = np.fromfile(os.path.join(day, "chains.idx"), dtype=CHAIN_DTYPE)
+    with open(os.path.join(day, "chains.blob"), "rb") as f:
+        blob = f.read()
+    assert ticks["ltp"].tolist() == [24500.5, 51000.0]
+    assert ticks["volume"][0] == 10.0 and np.isnan(ticks["volume"][1])
+    off, n = int(idx["offset"][0]), int(idx["length"][0])
+    assert json.loads(blob[off:off + n]) == {"pcr": 1.1}
+    rec.close()
+
+
+def test_full_buffer_flushes_without_the_timer(tmp_path):
+    rec = TickRecorder(str(tmp_path), flush_every=4)
+    for k in range(6):
+        rec.record_tick({"ts": TS + k, "symbol": "NIFTY50", "ltp": 100.0 + k})
+    day = os.path.join(str(tmp_path), day_of(TS))
+    assert len(read_ticks(day)["ts"]) == 4
+    rec.close()
+    assert len(read_ticks(day)["ts"]) == 6
+
+
+def test_reopen_after_a_truncated_write_keeps_rows_aligned(tmp_path):
+    rec = TickRecorder(str(tmp_path))
+    for k in range(3):
+        rec.record_tick({"ts": TS + k, "symbol": "NIFTY50", "ltp": 100.0 + k})
+    rec.record_chain("NIFTY50", TS, {"pcr": 1.0})
+    rec.close()
+    day = os.path.join(str(tmp_path), day_of(TS))
+    # crash mid-flush: a fourth row reached two columns, one of them only in part
+    with open(os.path.join(day, "ticks.ts"), "ab") as f:
+        f.write(np.float64(TS + 3).tobytes())
+    with open(os.path.join(day, "ticks.ltp"), "ab") as f:
+        f.write(np.float64(103.0).tobytes()[:5])
+    with open(os.path.join(day, "chains.idx"), "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert len(read_ticks(day)["ts"]) == 3
+
+    rec = TickRecorder(str(tmp_path))
+    rec.record_tick({"ts": TS + 4, "symbol": "BANKNIFTY", "ltp": 51000.0,
+                     "volume": 5.0})
+    rec.record_chain("NIFTY50", TS + 4, {"pcr": 1.2})
+    rec.close()
+
+    async def replay():
+        feed = ReplayFeed([day], speed=None)
+        out = [t async for t in feed.ticks()]
+        chains = feed.chain_provider()
+        return out, chains.peek("NIFTY50")
+
+    ticks, chain = asyncio.run(replay())
+    assert [(t["symbol"], t["ltp"]) for t in ticks] == [
+        ("NIFTY50", 100.0), ("NIFTY50", 101.0), ("NIFTY50", 102.0),
+        ("BANKNIFTY", 51000.0)]
+    assert ticks[-1]["volume"] == 5.0
+    assert chain == {"pcr": 1.2}
+    assert len(np.fromfile(os.path.join(day, "chains.idx"), dtype=CHAIN_DTYPE)) == 2
@@ -0,0 +1,189 @@
+# utils/instrument_master.py
+import os
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.instruments import INDEX_SYMBOL_ROOT, IST
+from utils.logger import log
+
+# Columns persisted as one .npy each under <root_dir>/<EXCH>-<YYYY-MM-DD>/ and
+# loaded with mmap_mode="r". Rows are sorted by (root, expiry, opt, strike);
+# `by_symbol` is the argsort of `tradingsymbol` for token lookups.
+_COLUMNS = ("root", "expiry", "opt", "strike", "tradingsymbol", "token", "lot_size",
+            "by_symbol")
+_OPT_CODES = {"CE": 0, "PE": 1}
+_MONTHS = {m: i + 1 for i, m in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+     "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"])}
+
+
+def _parse_expiry(v: Any) -> Optional[date]:
+    if not v:
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v).strip()
+    if len(s) == 9 and s[2:5].upper() in _MONTHS:   # Angel scrip master: 26SEP2024
+        return date(int(s[5:]), _MONTHS[s[2:5].upper()], int(s[:2]))
+    return date.fromisoformat(s[:10])
+
+
+def _normalize_row(
+        row: Dict[str, Any]) -> Optional[Tuple[str, date, int, float, str, str, int]]:
+    """
+    Map broker instrument rows (Angel scrip master or Kite-style) to our columns;
+    options only.
+    """
+    sym = row.get("tradingsymbol") or row.get("symbol")
+    opt = (row.get("instrument_type") or "").upper() or (sym or "")[-2:].upper()
+    if not sym or opt not in _OPT_CODES:
+        return None
+    expiry = _parse_expiry(row.get("expiry"))
+    if expiry is None:
+        return None
+    strike = float(row.get("strike") or 0)
+    if "instrumenttype" in row:  # Angel quotes strikes in paise
+        strike /= 100.0
+    token = str(row.get("token") or row.get("instrument_token") or "")
+    lot = int(float(row.get("lotsize") or row.get("lot_size") or 0))
+    return (str(row.get("name") or ""), expiry, _OPT_CODES[opt], strike,
+            sym, token, lot)
+
+
+class InstrumentMaster:
+    """
+    Daily-cached, memory-mapped option contract master.
+    Indexed by (root, expiry, CE/PE) -> contiguous slice with sorted strikes,
+    so nearest-strike and listed-expiry queries are binary searches.
+    """
+
+    def __init__(self, cols: Dict[str, np.ndarray]):
+        self.cols = cols
+        self._groups: Dict[Tuple[str, int, int], Tuple[int, int]] = {}
+        root, expiry, opt = cols["root"], cols["expiry"], cols["opt"]
+        n = len(root)
+        if n:
+            brk = np.flatnonzero((root[1:] != root[:-1])
+                                 | (expiry[1:] != expiry[:-1])
+                                 | (opt[1:] != opt[:-1])) + 1
+            starts = np.r_[0, brk]
+            ends = np.r_[brk, n]
+            for a, b in zip(starts.tolist(), ends.tolist()):
+                self._groups[(str(root[a]), int(expiry[a]), int(opt[a]))] = (a, b)
+        self._expiries: Dict[str, List[date]] = {}
+        for r, e, _ in self._groups:
+            self._expiries.setdefault(r, []).append(np.datetime64(e, "D").astype(date))
+        for r in self._expiries:
+            self._expiries[r] = sorted(set(self._expiries[r]))
+
+    # -- build / persist -----------------------------------------------------------
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "InstrumentMaster":
+        recs = [r for r in map(_normalize_row, rows) if r]
+        root = np.array([r[0] for r in recs], dtype=str)
+        expiry = np.array([r[1] for r in recs], dtype="datetime64[D]").astype(np.int32)
+        opt = np.array([r[2] for r in recs], dtype=np.int8)
+        strike = np.array([r[3] for r in recs], dtype=np.float64)
+        order = np.lexsort((strike, opt, expiry, root))
+        cols = {
+            "root": root[order], "expiry": expiry[order], "opt": opt[order],
+            "strike": strike[order],
+            "tradingsymbol": np.array([recs[i][4] for i in order], dtype=str),
+            "token": np.array([recs[i][5] for i in order], dtype=str),
+            "lot_size": np.array([recs[i][6] for i in order], dtype=np.int32),
+        }
+        cols["by_symbol"] = np.argsort(cols["tradingsymbol"], kind="stable")
+        return cls(cols)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for k in _COLUMNS:
+            np.save(os.path.join(path, f"{k}.npy"), self.cols[k])
+
+    @classmethod
+    def open(cls, path: str) -> "InstrumentMaster":
+        return cls({k: np.load(os.path.join(path, f"{k}.npy"), mmap_mode="r")
+                    for k in _COLUMNS})
+
+    @classmethod
+    def load(cls, fetch: Callable[[], Iterable[Dict[str, Any]]], exchange: str = "NFO",
+             root_dir: str = "data/instruments",
+             day: Optional[date] = None) -> "InstrumentMaster":
+        """Open today's cached master, or call `fetch()` once and persist it."""
+        day = day or datetime.now(IST).date()
+        path = os.path.join(root_dir, f"{exchange}-{day.isoformat()}")
+        if os.path.exists(os.path.join(path, "by_symbol.npy")):
+            m = cls.open(path)
+            log.info("instrument_master_cached",
+                     extra={"_extra": {"path": path, "rows": len(m)}})
+            return m
+        m = cls.from_rows(fetch())
+        m.save(path)
+        log.info("instrument_master_built",
+                 extra={"_extra": {"path": path, "rows": len(m)}})
+        return m
+
+    # -- queries --------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.cols["root"])
+
+    @staticmethod
+    def _root(index: str) -> str:
+        return INDEX_SYMBOL_ROOT.get(index, index)
+
+    def token(self, tradingsymbol: str) -> Optional[str]:
+        syms, order = self.cols["tradingsymbol"], self.cols["by_symbol"]
+        lo, hi = 0, len(order)
+        while lo < hi:   # binary search through the argsort (no sorted copy in memory)
+            mid = (lo + hi) // 2
+            if syms[order[mid]] < tradingsymbol:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and syms[order[lo]] == tradingsymbol:
+            return str(self.cols["token"][order[lo]])
+        return None
+
+    def expiries(self, index: str) -> List[date]:
+        """Listed expiries for an index/root, ascending."""
+        return self._expiries.get(self._root(index), [])
+
+    def nearest_expiry(self, index: str, on_or_after: date) -> Optional[date]:
+        """
+        First listed expiry on or after `on_or_after` (see
+        utils.instruments.first_expiry_date).
+        """
+        for e in self.expiries(index):
+            if e >= on_or_after:
+                return e
+        return None
+
+    def strikes(self, index: str, expiry: date, option_type: str) -> np.ndarray:
+        g = self._groups.get((self._root(index),
+                              int(np.datetime64(expiry, "D").astype(np.int32)),
+                              _OPT_CODES[option_type.upper()]))
+        return self.cols["strike"][g[0]:g[1]] if g else self.cols["strike"][:0]
+
+    def contract(self, index: str, expiry: date, price: float,
+                 option_type: str) -> Optional[Dict[str, Any]]:
+        """Listed contract with the strike nearest to `price`."""
+        key = (self._root(index), int(np.datetime64(expiry, "D").astype(np.int32)),
+               _OPT_CODES[option_type.upper()])
+        g = self._groups.get(key)
+        if not g:
+            return None
+        strikes = self.cols["strike"][g[0]:g[1]]
+        k = int(np.searchsorted(strikes, price))
+        if (k == len(strikes)
+                or (k > 0 and price - strikes[k - 1] <= strikes[k] - price)):
+            k -= 1
+        i = g[0] + k
+        return {"tradingsymbol": str(self.cols["tradingsymbol"][i]),
+                "token": str(self.cols["token"][i]),
+                "strike": float(self.cols["strike"][i]), "expiry": expiry.isoformat(),
+                "option_type": option_type.upper(),
+                "lot_size": int(self.cols["lot_size"][i])}
@@ -1,7 +1,7 @@
 # utils/instruments.py
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
-from typing import Dict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional
 
 # Lot sizes — per your instruction
 LOT_SIZES: Dict[str, int] = {
@@ -15,6 +15,20 @@ INDEX_SYMBOL_ROOT = {
     "BANKNIFTY": "BANKNIFTY",
 }
 
+# Spot index feed tokens: internal name -> (SmartAPI exchange type, token); 1 = NSE cash
+INDEX_TOKENS = {
+    "NIFTY50": (1, "26000"),
+    "BANKNIFTY": (1, "26009"),
+    "INDIAVIX": (1, "26017"),   # not traded; feeds the risk engine's vol-spike halt
+}
+VIX_SYMBOL = "INDIAVIX"
+
+# Scrip-master tokens of the spot indices (SmartAPI historical candles, exchange NSE)
+HISTORY_TOKENS = {
+    "NIFTY50": "99926000",
+    "BANKNIFTY": "99926009",
+}
+
 IST = timezone(timedelta(hours=5, minutes=30))
 
 @dataclass(frozen=True)
@@ -37,16 +51,33 @@ _WEEKDAY_MAP = {
     "FRIDAY": 4, "SATURDAY": 5, "SUNDAY": 6
 }
 
-def next_weekly_expiry(index: str, from_dt: datetime | None = None, weekday_name: str = "TUESDAY") -> datetime:
-    """Return next weekly expiry date at the given weekday (IST)."""
+
+def first_expiry_date(now: datetime, same_day_until: Optional[str] = None) -> date:
+    """
+    Earliest expiry a new entry may use (the one rule for listed and rule-based
+    expiries):
+    today's contracts only before `same_day_until` ("HH:MM" IST), never when it is None.
+    """
+    if now.tzinfo is not None:
+        now = now.astimezone(IST)
+    if same_day_until and now.time() < time.fromisoformat(same_day_until):
+        return now.date()
+    return now.date() + timedelta(days=1)
+
+
+def next_weekly_expiry(index: str, from_dt: Optional[datetime] = None,
+                       weekday_name: str = "TUESDAY",
+                       same_day_until: Optional[str] = None) -> datetime:
+    """
+    Return next weekly expiry date at the given weekday (IST), on or after
+    first_expiry_date().
+    """
     wd_target = _WEEKDAY_MAP[weekday_name.upper()]
-    now = (from_dt or datetime.now(IST)).date()
-    # find next occurrence of target weekday (today+0..6)
-    days_ahead = (wd_target - now.weekday()) % 7
-    if days_ahead == 0:  # if today is the day, move to next week (avoid 'today' expiry in intraday runs)
-        days_ahead = 7
-    dt = datetime.combine(now + timedelta(days=days_ahead), datetime.min.time(), IST)
-    return dt
+    start = first_expiry_date(from_dt or datetime.now(IST), same_day_until)
+    days_ahead = (wd_target - start.weekday()) % 7
+    return datetime.combine(start + timedelta(days=days_ahead), datetime.min.time(),
+                            IST)
+
 
 # -- Tradingsymbol formatter (Angel One) ---------------------------------------
 # Angel typically uses: ROOT + DDMMMYY + STRIKE + CE/PE, e.g. NIFTY25SEP24700CE
@@ -1,31 +1,230 @@
-import json, logging, sys
-from typing import Any, Dict
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from typing import Any, Dict, List, Optional
 
-def setup_logger(name: str = "kp5", level: int = logging.INFO) -> logging.Logger:
+try:  # optional fast encoder
+    import orjson
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(payload: Dict[str, Any]) -> str:
+        return orjson.dumps(payload, default=str, option=_ORJSON_OPTS).decode()
+except ImportError:
+    def dumps(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    # formatTime is per-second resolution; cache (second, string), swapped as one tuple
+    # so threads formatting concurrently never pair one second with another's string
+    _ts_cache = (-1, "")
+
+    def _ts(self, record: logging.LogRecord) -> str:
+        sec = int(record.created)
+        cached = self._ts_cache
+        if cached[0] != sec:
+            stamp = self.formatTime(record, datefmt="%Y-%m-%d %H:%M:%S")
+            cached = self._ts_cache = (sec, stamp)
+        return cached[1]
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "lvl": record.levelname,
+            "msg": record.getMessage(),
+            "name": record.name,
+            "ts": self._ts(record),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        extra = getattr(record, "_extra", None)
+        if isinstance(extra, dict):
+            payload.update(extra)
+        return dumps(payload)
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+class BatchingQueueHandler(logging.Handler):
+    """
+    The calling thread only freezes the record (message args resolved, the
+    traceback rendered, a shallow copy of `_extra`) and enqueues it; a daemon
+    thread formats records to JSON lines and writes them in batches to a
+    size-rotated file (or a stream), so neither encoding nor file I/O runs on
+    the hot path. Values nested inside `_extra` are read when the writer gets
+    to them: log objects that are replaced on change (risk state, snapshots),
+    not ones mutated in place.
+
+    Counters (see stats(); updated under a lock, callers may be on any thread):
+      enqueued / written / batches
+      dropped      - queue full and block=False
+      blocked      - queue full and the caller waited (block=True)
+      high_water   - max queue depth observed by the writer
+    """
+
+    def __init__(self, path: Optional[str] = None, stream=None,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 queue_size: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.2, block: bool = False) -> None:
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block = block
+        self._q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stream = stream
+        self._size = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._stream = open(path, "a", encoding="utf-8")
+            self._size = self._stream.tell()
+        elif stream is None:
+            self._stream = sys.stdout
+        self._counts = {"enqueued": 0, "written": 0, "batches": 0, "dropped": 0,
+                        "blocked": 0, "high_water": 0}
+        self._counts_lock = threading.Lock()   # never held while blocking on the queue
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kp5-log-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._counts_lock:
+            self._counts[key] += n
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Pin what the caller could change after the log call returns."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (self.formatter or _EXC_FORMATTER).formatException(
+                record.exc_info)
+            record.exc_info = None
+        extra = getattr(record, "_extra", None)
+        if isinstance(extra, dict):
+            record._extra = dict(extra)
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            record = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            if not self.block:
+                self._count("dropped")
+                return
+            self._count("blocked")
+            self._q.put(record)
+        self._count("enqueued")
+
+    def _rotate(self) -> None:
+        self._stream.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self._stream = open(self.path, "w", encoding="utf-8")
+        self._size = 0
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        data = "\n".join(lines) + "\n"
+        if self.path:
+            n = len(data.encode("utf-8"))    # max_bytes is bytes on disk, not chars
+            if self._size + n > self.max_bytes and self._size:
+                self._rotate()
+            self._size += n
+        self._stream.write(data)
+        self._stream.flush()
+        with self._counts_lock:
+            self._counts["written"] += len(lines)
+            self._counts["batches"] += 1
+
+    def _drain(self, first: logging.LogRecord) -> List[logging.LogRecord]:
+        depth = self._q.qsize() + 1
+        with self._counts_lock:
+            if depth > self._counts["high_water"]:
+                self._counts["high_water"] = depth
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._q.empty()):
+            try:
+                first = self._q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return dict(counts, queued=self._q.qsize())
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if self.path and self._stream:
+            self._stream.close()
+        super().close()
+
+
+def setup_logger(name: str = "kp5", level: int = logging.INFO,
+                 mode: Optional[str] = None,
+                 path: Optional[str] = None) -> logging.Logger:
+    """
+    mode: "stdout" (synchronous, default) or "queue" (background batched writer).
+    Defaults come from env KP5_LOG_MODE / KP5_LOG_FILE.
+    """
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
-    handler = logging.StreamHandler(sys.stdout)
-
-    class JsonFormatter(logging.Formatter):
-        def format(self, record: logging.LogRecord) -> str:
-            payload: Dict[str, Any] = {
-                "lvl": record.levelname,
-                "msg": record.getMessage(),
-                "name": record.name,
-                "ts": self.formatTime(record, datefmt="%Y-%m-%d %H:%M:%S"),
-            }
-            if record.exc_info:
-                payload["exc"] = self.formatException(record.exc_info)
-            extra = getattr(record, "_extra", None)
-            if isinstance(extra, dict):
-                payload.update(extra)
-            return json.dumps(payload, ensure_ascii=False)
-
+    mode = mode or os.environ.get("KP5_LOG_MODE", "stdout")
+    path = path or os.environ.get("KP5_LOG_FILE")
+    if mode == "queue":
+        handler: logging.Handler = BatchingQueueHandler(path=path)
+        atexit.register(handler.close)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JsonFormatter())
     logger.addHandler(handler)
     logger.setLevel(level)
     logger.propagate = False
     return logger
 
+
+def log_stats(logger: Optional[logging.Logger] = None) -> Dict[str, int]:
+    """Counters of the queue handler (empty dict in stdout mode)."""
+    for h in (logger or log).handlers:
+        if isinstance(h, BatchingQueueHandler):
+            return h.stats()
+    return {}
+
+
 log = setup_logger()
@@ -0,0 +1,83 @@
+# utils/startup.py
+import asyncio
+import importlib
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Tuple
+from utils.logger import log
+
+
+class Startup:
+    """
+    Startup phases with a per-phase timing breakdown.
+
+    Blocking phases (broker login, heavy imports, disk loads) run on a small
+    thread pool; async phases (first chain fetch, feed connect) run as tasks.
+    Both start immediately, so independent warmups overlap; a blocking phase
+    may wait on another with `.result()` (e.g. a download that needs the login).
+    report() logs `startup_timing`: each phase's start offset and duration in ms.
+    """
+
+    def __init__(self, workers: int = 4) -> None:
+        self.t0 = time.perf_counter()
+        # name -> (start offset s, duration s)
+        self.phases: Dict[str, Tuple[float, float]] = {}
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="startup")
+
+    def _record(self, name: str, start: float) -> None:
+        self.phases[name] = (start - self.t0, time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time an inline (sequential) phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start)
+
+    def thread(self, name: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Start a blocking phase on the pool; `await asyncio.wrap_future(f)` or f.result()
+        in another phase.
+        """
+        start = time.perf_counter()
+
+        def run() -> Any:
+            try:
+                return fn(*args)
+            finally:
+                self._record(name, start)
+        return self._pool.submit(run)
+
+    def task(self, name: str, aw: Awaitable[Any]) -> asyncio.Task:
+        """Start an async phase."""
+        start = time.perf_counter()
+
+        async def run() -> Any:
+            try:
+                return await aw
+            finally:
+                self._record(name, start)
+        return asyncio.create_task(run(), name=f"startup:{name}")
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        ready = time.perf_counter() - self.t0
+        out = {"ready_ms": round(ready * 1e3, 1),
+               "phases": {k: {"start_ms": round(s * 1e3, 1), "ms": round(d * 1e3, 1)}
+                          for k, (s, d) in sorted(self.phases.items(),
+                                                  key=lambda kv: kv[1][0])}}
+        out.update(extra)
+        log.info("startup_timing", extra={"_extra": {"startup": out}})
+        self._pool.shutdown(wait=False)
+        return out
+
+
+def import_modules(*names: str) -> None:
+    """
+    Import modules off the event loop (their import-time cost then overlaps network
+    waits).
+    """
+    for n in names:
+        importlib.import_module(n)
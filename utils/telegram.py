@@ -1,14 +1,25 @@
-import requests
-from typing import Optional, Dict, Any
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from utils.logger import log
+
+TELEGRAM_API = "https://api.telegram.org"
+MAX_TEXT = 4096                    # Telegram sendMessage limit (characters)
+# Priority lanes, highest first: exits/errors skip ahead of entries, entries of info.
+P_CRITICAL, P_ENTRY, P_INFO = 0, 1, 2
 
 class TelegramClient:
-    def __init__(self, bot_token: str, chat_id: str, base_url: str = "https://api.telegram.org"):
+    def __init__(self, bot_token: str, chat_id: str, base_url: str = TELEGRAM_API):
         self.base_url = base_url
         self.bot_token = bot_token
         self.chat_id = chat_id
 
     def send(self, text: str, disable_web_page_preview: bool = True) -> None:
-        # NOTE: handle exceptions in caller for reliability
+        # NOTE: handle exceptions in caller for reliability (blocking; use
+        # TelegramNotifier from async code)
+        import requests
         url = f"{self.base_url}/bot{self.bot_token}/sendMessage"
         requests.post(url, timeout=5, json={
             "chat_id": self.chat_id,
@@ -17,5 +28,264 @@ class TelegramClient:
             "parse_mode": "Markdown"
         })
 
+
+class TokenBucket:
+    """
+    `rate` tokens/s, up to `burst` saved; wait() returns seconds until one is available.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def wait(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def pause(self, seconds: float) -> None:
+        """Server-imposed cool-down (429 retry_after): no tokens until it passes."""
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class _Pending:
+    __slots__ = ("key", "lines", "size", "first", "attempts", "backoff", "retry_at",
+                 "plain")
+
+    def __init__(self, key: Optional[str], text: str) -> None:
+        self.key = key
+        self.lines = [text]
+        self.size = len(text)
+        self.first = time.monotonic()
+        self.attempts = 0
+        self.backoff = 0.5
+        # monotonic time before which a failed send is not retried
+        self.retry_at = 0.0
+        self.plain = False      # resend without parse_mode after a markup error
+
+    def text(self) -> str:
+        if len(self.lines) == 1:
+            return self.lines[0]
+        return f"({len(self.lines)} alerts)\n" + "\n".join(self.lines)
+
+
+class TelegramNotifier:
+    """
+    Non-blocking Telegram alerts for the trading loop.
+
+    - notify() only enqueues (O(1), never awaits); one sender task posts over a
+      pooled aiohttp session
+    - priority lanes: P_CRITICAL (exits, errors) > P_ENTRY > P_INFO; the queue is
+      bounded across lanes and a full queue evicts the oldest lower-priority
+      message before refusing a new one
+    - coalescing: a message whose `key` matches one still queued in the same lane
+      is appended to it (up to MAX_TEXT), so bursts become one message
+    - a token bucket keeps under Telegram's per-chat limit (~1 msg/s); a 429
+      pauses the bucket for `retry_after`, network errors and 5xx retry with
+      capped exponential backoff, markup errors resend as plain text, other 4xx
+      are dropped
+    - a failed message goes back to the head of its lane and waits out its backoff
+      there, so retries never hold the sender: a higher lane is still sent first
+    - P_INFO messages linger `linger` seconds so similar follow-ups can coalesce
+    stats(): queued, sent, coalesced, dropped, failed, retries, rate_limited.
+    """
+
+    def __init__(self, bot_token: str, chat_id: str, base_url: str = TELEGRAM_API,
+                 rate: float = 1.0, burst: float = 3.0, queue_size: int = 256,
+                 linger: float = 2.0, max_retries: int = 5, max_backoff: float = 30.0,
+                 timeout: float = 5.0, parse_mode: Optional[str] = "Markdown"):
+        self.url = f"{base_url}/bot{bot_token}/sendMessage"
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(rate, burst)
+        self.queue_size = queue_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.parse_mode = parse_mode
+        self._lanes: List[Deque[_Pending]] = [deque(), deque(), deque()]
+        # (lane, key) -> its still-queued message
+        self._open: Dict[tuple, _Pending] = {}
+        self._sending: Optional[_Pending] = None   # popped, attempt in flight
+        self._wake = asyncio.Event()
+        self._session = None   # aiohttp.ClientSession, created on the first send
+        self._task: Optional[asyncio.Task] = None
+        self._counts = {"sent": 0, "coalesced": 0, "dropped": 0, "failed": 0,
+                        "retries": 0, "rate_limited": 0}
+
+    # -- producer side (called from the trading loop) ----------------------------------
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._lanes)
+
+    def notify(self, text: str, priority: int = P_INFO,
+               key: Optional[str] = None) -> bool:
+        """Queue `text`; returns False if it was dropped because the queue is full."""
+        text = text[:MAX_TEXT]
+        p = self._open.get((priority, key)) if key is not None else None
+        if p is not None and p.size + len(text) + 16 <= MAX_TEXT:
+            p.lines.append(text)
+            p.size += len(text) + 1
+            self._counts["coalesced"] += 1
+            return True
+        if self._queued() >= self.queue_size and not self._evict(priority):
+            self._counts["dropped"] += 1
+            return False
+        p = _Pending(key, text)
+        self._lanes[priority].append(p)
+        if key is not None:
+            self._open[(priority, key)] = p
+        self._wake.set()
+        return True
+
+    def _evict(self, priority: int) -> bool:
+        for lane in range(len(self._lanes) - 1, priority, -1):
+            if self._lanes[lane]:
+                self._forget(lane, self._lanes[lane].popleft())
+                self._counts["dropped"] += 1
+                return True
+        return False
+
+    def _forget(self, lane: int, p: _Pending) -> None:
+        if p.key is not None and self._open.get((lane, p.key)) is p:
+            del self._open[(lane, p.key)]
+
+    # -- sender ------------------------------------------------------------------------
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="telegram")
+        return self._task
+
+    def _next(self) -> tuple[int, Optional[_Pending], float]:
+        """
+        (lane, message, 0) for the next sendable message, else (-1, None, seconds to
+        wait).
+        """
+        wait = None
+        now = time.monotonic()
+        for lane, q in enumerate(self._lanes):
+            if not q:
+                continue
+            ready = q[0].retry_at
+            if lane == P_INFO and self.linger:
+                ready = max(ready, q[0].first + self.linger)
+            if ready > now:
+                wait = ready - now if wait is None else min(wait, ready - now)
+                continue
+            return lane, q[0], 0.0
+        return -1, None, wait if wait is not None else -1.0
+
+    async def _run(self) -> None:
+        while True:
+            lane, p, wait = self._next()
+            if p is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(),
+                                           wait if wait >= 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = self.bucket.wait()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                # a higher-priority message may have arrived meanwhile
+                continue
+            # freeze the message: later notify() calls with its key start a new one
+            self._lanes[lane].popleft()
+            self._forget(lane, p)
+            self.bucket.take()
+            self._sending = p
+            try:
+                await self._deliver(lane, p)
+            finally:
+                self._sending = None
+
+    async def _post(self, text: str,
+                    parse_mode: Optional[str]) -> tuple[int, Dict[str, Any]]:
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=2, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        payload = {"chat_id": self.chat_id, "text": text,
+                   "disable_web_page_preview": True}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        async with self._session.post(self.url, json=payload) as resp:
+            try:
+                body = await resp.json(content_type=None)
+            except ValueError:
+                body = {}
+            return resp.status, body or {}
+
+    async def _deliver(self, lane: int, p: _Pending) -> bool:
+        """One attempt; a retryable failure puts `p` back at the head of its lane."""
+        c = self._counts
+        text = p.text()
+        parse_mode = None if p.plain else self.parse_mode
+        try:
+            status, body = await self._post(text, parse_mode)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, body = 0, {"description": repr(e)}
+        if status == 200 and body.get("ok", True):
+            c["sent"] += 1
+            return True
+        retry = p.attempts < self.max_retries
+        if status == 429:
+            c["rate_limited"] += 1
+            params = body.get("parameters") or {}
+            self.bucket.pause(float(params.get("retry_after", p.backoff)))
+        elif (status == 400 and parse_mode
+              and "parse" in str(body.get("description", ""))):
+            # e.g. an unbalanced "_" in a symbol: resend as plain text
+            p.plain = True
+        elif status and status < 500:
+            retry = False       # bad request / auth: retrying will not help
+        else:
+            p.retry_at = time.monotonic() + p.backoff * (0.5 + random.random())
+            p.backoff = min(p.backoff * 2, self.max_backoff)
+        if retry:
+            p.attempts += 1
+            c["retries"] += 1
+            self._lanes[lane].appendleft(p)
+            return False
+        c["failed"] += 1
+        log.info("telegram_send_failed", extra={"_extra": {
+            "status": status, "error": body.get("description"), "text": text[:200]}})
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts, queued=self._queued())
+
+    async def close(self, drain: float = 5.0) -> None:
+        """
+        Stop the sender after up to `drain` seconds of flushing, including an attempt
+        already in flight (lingering P_INFO is sent at once).
+        """
+        if self._task is not None:
+            self.linger = 0.0
+            self._wake.set()
+            deadline = time.monotonic() + drain
+            while ((self._queued() or self._sending is not None)
+                   and time.monotonic() < deadline and not self._task.done()):
+                await asyncio.sleep(0.05)
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
 def render_entry_decision(idx: str, strike: int, lots: int, price: float, sl: float, conf: int, broker: str) -> str:
     return (f"*{idx}* BUY {strike} x{lots} @ {price:.1f} | SL {sl:.1f} | Conf {conf}% | Broker: {broker}")